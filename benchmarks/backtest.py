@@ -0,0 +1,275 @@
+"""
+Replay a historical price series through the alert crossing rules for every subscriber.
+
+Thresholds, hysteresis and minimum intervals are read from a bot.db snapshot into
+NumPy arrays and evaluated for the whole series at once, so sizing rate limits and
+worker counts does not require running the bot. NumPy is installed from requirements-dev.txt,
+since the bot itself does not need it.
+
+Usage:
+  python -m benchmarks.backtest --db data/bot.db --csv prices.csv
+  python -m benchmarks.backtest --db data/bot.db --days 7 --output backtest.json
+"""
+import argparse
+import csv
+import json
+import sqlite3
+import time
+from datetime import datetime, timezone
+
+import numpy as np
+
+def load_series_csv(path):
+  """
+  Load a price series from a CSV file.
+
+  The file needs a price column and a time column named ts or timestamp (UNIX seconds)
+  or millisUTC (as exported from ComEd's 5-minute feed).
+
+  Args:
+    path (str): The path of the CSV file.
+
+  Returns:
+    tuple: Arrays (timestamps, prices) sorted by time, with timestamps in UNIX seconds.
+  """
+  with open(path, newline='', encoding='utf-8') as file:
+    rows = list(csv.DictReader(file))
+  if rows and 'millisUTC' in rows[0]:
+    timestamps = np.array([int(row['millisUTC']) // 1000 for row in rows], dtype=np.int64)
+  else:
+    column = 'ts' if rows and 'ts' in rows[0] else 'timestamp'
+    timestamps = np.array([int(float(row[column])) for row in rows], dtype=np.int64)
+  prices = np.array([float(row['price']) for row in rows])
+  order = np.argsort(timestamps, kind='stable')
+  return timestamps[order], prices[order]
+
+def load_series_db(db_path, since):
+  """
+  Load the bot's own price history.
+
+  Args:
+    db_path (str): The path of the bot database.
+    since (int): The earliest UNIX timestamp to include.
+
+  Returns:
+    tuple: Arrays (timestamps, prices) sorted by time.
+  """
+  with sqlite3.connect(f'file:{db_path}?mode=ro', uri=True) as conn:
+    rows = conn.execute('SELECT ts, price FROM price_history WHERE ts >= ? ORDER BY ts', (since,)).fetchall()
+  series = np.array(rows, dtype=float).reshape(-1, 2)
+  return series[:, 0].astype(np.int64), series[:, 1]
+
+def load_subscribers(db_path, now):
+  """
+  Load the alert settings of every subscriber who is not suspended.
+
+  Args:
+    db_path (str): The path of the bot database.
+    now (int): The UNIX timestamp used to decide which suspensions are still active.
+
+  Returns:
+    tuple: Arrays (thresholds, hysteresis, min_intervals); thresholds are NaN for users on the default.
+  """
+  with sqlite3.connect(f'file:{db_path}?mode=ro', uri=True) as conn:
+    rows = conn.execute(
+      'SELECT threshold, hysteresis, min_interval FROM subscribed_users '
+      'WHERE suspended_until IS NULL OR suspended_until <= ?', (now,)).fetchall()
+  settings = np.array(rows, dtype=float).reshape(-1, 3)
+  return settings[:, 0], np.nan_to_num(settings[:, 1]), np.nan_to_num(settings[:, 2]).astype(np.int64)
+
+def _crossed_pairs(levels, low, high, ticks):
+  """
+  Expand the levels crossed in each tick into (tick, level index) pairs.
+
+  Args:
+    levels (np.ndarray): The trigger level of each group.
+    low (np.ndarray): The inclusive lower bound of each tick's range.
+    high (np.ndarray): The exclusive upper bound of each tick's range.
+    ticks (np.ndarray): The tick index of each range.
+
+  Returns:
+    tuple: Arrays (ticks, groups) with one entry per crossed level.
+  """
+  order = np.argsort(levels, kind='stable')
+  start = np.searchsorted(levels[order], low, 'left')
+  counts = np.searchsorted(levels[order], high, 'left') - start
+  offsets = np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts)
+  return np.repeat(ticks, counts), order[np.repeat(start, counts) + offsets]
+
+def backtest(timestamps, prices, thresholds, hysteresis, min_intervals, price_to_compare):
+  """
+  Count the alerts each tick and each user would have produced over a price series.
+
+  This follows process_price: each tick compares the price with the previous one; a rising
+  price alerts users where last <= threshold + hysteresis < current and a falling price
+  alerts users where current <= threshold - hysteresis < last. An alert is skipped when the
+  user's last alert reported the same side of the threshold or was sent less than their
+  minimum interval ago. Every user starts with no alert history and every alert is
+  assumed to be delivered.
+
+  Users with neither hysteresis nor a minimum interval alert on every crossing, because
+  crossings of one threshold alternate direction, so they are counted with a difference
+  array over their sorted thresholds. Other users are grouped by identical settings and
+  their crossing events are deduplicated per group.
+
+  Args:
+    timestamps (np.ndarray): The UNIX timestamp of each price.
+    prices (np.ndarray): The price series.
+    thresholds (np.ndarray): Each user's threshold, NaN for the default.
+    hysteresis (np.ndarray): Each user's hysteresis.
+    min_intervals (np.ndarray): Each user's minimum seconds between alerts.
+    price_to_compare (float): The default threshold.
+
+  Returns:
+    tuple: Arrays (per_tick, per_user) of alert counts.
+  """
+  effective = np.where(np.isnan(thresholds), price_to_compare, thresholds)
+  last, current = prices[:-1], prices[1:]
+  per_tick = np.zeros(len(prices), dtype=np.int64)
+  per_user = np.zeros(len(effective), dtype=np.int64)
+
+  plain = (hysteresis == 0) & (min_intervals == 0)
+  levels, inverse, multiplicity = np.unique(effective[plain], return_inverse=True, return_counts=True)
+  start = np.searchsorted(levels, np.minimum(last, current), 'left')
+  end = np.searchsorted(levels, np.maximum(last, current), 'left')
+  cumulative = np.concatenate(([0], np.cumsum(multiplicity)))
+  per_tick[1:] += cumulative[end] - cumulative[start]
+  crossings = np.cumsum(np.bincount(start, minlength=len(levels) + 1) - np.bincount(end, minlength=len(levels) + 1))
+  per_user[plain] = crossings[:-1][inverse.reshape(-1)]
+
+  stateful = ~plain
+  if not stateful.any():
+    return per_tick, per_user
+  # Number each distinct (threshold, hysteresis, min_interval) combination; one flat unique beats unique(axis=0).
+  columns = [np.unique(values[stateful], return_inverse=True) for values in (effective, hysteresis, min_intervals)]
+  codes = np.zeros(stateful.sum(), dtype=np.int64)
+  for distinct, inverse in columns:
+    codes = codes * len(distinct) + inverse.reshape(-1)
+  _, first_user, group_of_user, group_sizes = np.unique(codes, return_index=True, return_inverse=True,
+                                                        return_counts=True)
+  group_thresholds, group_hysteresis, group_intervals = (
+    values[stateful][first_user] for values in (effective, hysteresis, min_intervals))
+
+  rising = np.nonzero(current > last)[0]
+  falling = np.nonzero(current < last)[0]
+  up_ticks, up_groups = _crossed_pairs(group_thresholds + group_hysteresis, last[rising], current[rising], rising + 1)
+  down_ticks, down_groups = _crossed_pairs(
+    group_thresholds - group_hysteresis, current[falling], last[falling], falling + 1)
+  ticks = np.concatenate([up_ticks, down_ticks])
+  event_groups = np.concatenate([up_groups, down_groups])
+  above = np.concatenate([np.ones(len(up_ticks), dtype=bool), np.zeros(len(down_ticks), dtype=bool)])
+  order = np.lexsort((ticks, event_groups))
+  ticks, event_groups, above = ticks[order], event_groups[order], above[order]
+
+  # Without an interval, an event alerts exactly when it is on the other side from the group's previous event.
+  first = np.ones(len(ticks), dtype=bool)
+  first[1:] = event_groups[1:] != event_groups[:-1]
+  alerted = first.copy()
+  alerted[1:] |= above[1:] != above[:-1]
+
+  # Suppressed alerts do not update the notified state, so interval groups are replayed one event at a time.
+  interval_events = np.nonzero(group_intervals[event_groups] > 0)[0]
+  interval_alerted = []
+  previous_group, notified_above, alerted_at, interval = -1, None, 0, 0
+  for group, now, side in zip(event_groups[interval_events].tolist(), timestamps[ticks[interval_events]].tolist(),
+                              above[interval_events].tolist()):
+    if group != previous_group:
+      previous_group, notified_above, alerted_at, interval = group, None, 0, int(group_intervals[group])
+    alert = side != notified_above and now - alerted_at >= interval
+    if alert:
+      notified_above, alerted_at = side, now
+    interval_alerted.append(alert)
+  alerted[interval_events] = interval_alerted
+
+  per_tick += np.bincount(ticks[alerted], weights=group_sizes[event_groups[alerted]],
+                          minlength=len(prices)).astype(np.int64)
+  per_user[stateful] = np.bincount(event_groups[alerted], minlength=len(group_sizes))[group_of_user.reshape(-1)]
+  return per_tick, per_user
+
+def summarize(timestamps, per_tick, per_user, send_rate, top=5):
+  """
+  Summarize backtest counts into the figures used to size rate limits and workers.
+
+  Args:
+    timestamps (np.ndarray): The UNIX timestamp of each tick.
+    per_tick (np.ndarray): Alerts produced by each tick.
+    per_user (np.ndarray): Alerts received by each user.
+    send_rate (float): Sustained deliveries per second, used to estimate how long bursts take to drain.
+    top (int, optional): Number of largest bursts to list. Defaults to 5.
+
+  Returns:
+    dict: The summary.
+  """
+  days = max((timestamps[-1] - timestamps[0]) / 86400, 1 / 288) if len(timestamps) else 0.0
+  active = per_tick[per_tick > 0]
+  per_user_day = per_user / days if days else per_user.astype(float)
+  bursts = np.argsort(per_tick, kind='stable')[::-1][:top]
+
+  def iso(index):
+    return datetime.fromtimestamp(int(timestamps[index]), timezone.utc).isoformat()
+
+  def quantiles(values):
+    if not len(values):
+      return {'mean': 0.0, 'p50': 0.0, 'p90': 0.0, 'p99': 0.0, 'max': 0.0}
+    p50, p90, p99 = np.percentile(values, [50, 90, 99])
+    return {'mean': float(values.mean()), 'p50': float(p50), 'p90': float(p90), 'p99': float(p99),
+            'max': float(values.max())}
+
+  return {
+    'ticks': int(len(per_tick)),
+    'days': float(days),
+    'subscribers': int(len(per_user)),
+    'alerts': int(per_tick.sum()),
+    'ticks_with_alerts': int(len(active)),
+    'alerts_per_active_tick': quantiles(active),
+    'peak_burst': {
+      'alerts': int(per_tick.max()) if len(per_tick) else 0,
+      'time': iso(bursts[0]) if len(per_tick) else None,
+      'drain_seconds': float(per_tick.max() / send_rate) if len(per_tick) else 0.0,
+    },
+    'top_bursts': [{'time': iso(index), 'alerts': int(per_tick[index])} for index in bursts if per_tick[index]],
+    'alerts_per_user_per_day': quantiles(per_user_day),
+    'silent_users': int((per_user == 0).sum()),
+  }
+
+def main():
+  """
+  Parse the command line, run the backtest and print the summary as JSON.
+  """
+  parser = argparse.ArgumentParser(description="Replay a price series through the alert rules of a bot.db snapshot.")
+  parser.add_argument('--db', default='data/bot.db', help="The bot database to read subscribers from.")
+  parser.add_argument('--csv', help="A CSV price series; defaults to the database's own price history.")
+  parser.add_argument('--days', type=float, default=365, help="Days of database history to replay.")
+  parser.add_argument('--price-to-compare', type=float, default=6.9,
+                      help="The default threshold for users without one.")
+  parser.add_argument('--send-rate', type=float, default=50.0,
+                      help="Sustained alerts delivered per second, to estimate burst drain time.")
+  parser.add_argument('--per-tick', action='store_true', help="Include the alert count of every tick.")
+  parser.add_argument('--output', help="Write results to this file instead of stdout.")
+  args = parser.parse_args()
+
+  started = time.perf_counter()
+  now = int(time.time())
+  if args.csv:
+    timestamps, prices = load_series_csv(args.csv)
+  else:
+    timestamps, prices = load_series_db(args.db, now - int(args.days * 86400))
+  thresholds, hysteresis, min_intervals = load_subscribers(args.db, now)
+  loaded = time.perf_counter()
+  per_tick, per_user = backtest(timestamps, prices, thresholds, hysteresis, min_intervals, args.price_to_compare)
+  finished = time.perf_counter()
+
+  report = summarize(timestamps, per_tick, per_user, args.send_rate)
+  report['load_seconds'] = loaded - started
+  report['backtest_seconds'] = finished - loaded
+  if args.per_tick:
+    report['per_tick'] = [[int(timestamp), int(count)] for timestamp, count in zip(timestamps, per_tick)]
+  output = json.dumps(report, indent=2)
+  if args.output:
+    with open(args.output, 'w', encoding='utf-8') as file:
+      file.write(output + '\n')
+  else:
+    print(output)
+
+if __name__ == '__main__':
+  main()
@@ -0,0 +1,211 @@
+import asyncio
+import random
+import time
+
+import discord
+from aiohttp import web
+from multidict import CIMultiDict
+
+from bot import Bot
+
+class FakeResponse:
+  """
+  A minimal stand-in for aiohttp.ClientResponse used to build discord.py HTTP errors.
+  """
+
+  def __init__(self, status, headers):
+    self.status = status
+    self.reason = 'Too Many Requests' if status == 429 else 'Error'
+    self.headers = CIMultiDict(headers)
+
+class FakeDiscord:
+  """
+  Record Discord REST calls made while delivering alerts, with configurable latency and 429s.
+  """
+
+  def __init__(self, latency=0.0, rate_limit_ratio=0.0, retry_after=0.05, seed=0):
+    """
+    Initialize the FakeDiscord backend.
+
+    Args:
+      latency (float, optional): Seconds each fake API call takes. Defaults to 0.0.
+      rate_limit_ratio (float, optional): Fraction of sends answered with a 429. Defaults to 0.0.
+      retry_after (float, optional): Retry-After seconds reported by 429s. Defaults to 0.05.
+      seed (int, optional): Seed for choosing which sends are rate limited. Defaults to 0.
+    """
+    self.latency = latency
+    self.rate_limit_ratio = rate_limit_ratio
+    self.retry_after = retry_after
+    self.random = random.Random(seed)
+    self.calls = {'fetch_user': 0, 'create_dm': 0, 'send': 0, 'rate_limited': 0}
+    self.send_times = []
+
+  async def call(self, name):
+    """
+    Record an API call and wait for the configured latency.
+
+    Args:
+      name (str): The name of the API call.
+    """
+    self.calls[name] += 1
+    if self.latency:
+      await asyncio.sleep(self.latency)
+
+  async def send(self, channel_id):
+    """
+    Record a message send, raising a 429 for the configured fraction of calls.
+
+    Args:
+      channel_id (int): The channel the message is sent to.
+    """
+    await self.call('send')
+    if self.rate_limit_ratio and self.random.random() < self.rate_limit_ratio:
+      self.calls['rate_limited'] += 1
+      response = FakeResponse(429, {
+        'Retry-After': str(self.retry_after),
+        'X-RateLimit-Bucket': f'fake-{channel_id}',
+        'X-RateLimit-Scope': 'user',
+      })
+      raise discord.HTTPException(response, {'message': 'You are being rate limited.', 'code': 0})
+    self.send_times.append(time.monotonic())
+
+class FakeChannel:
+  """
+  A fake DM channel that forwards sends to the FakeDiscord backend.
+  """
+
+  def __init__(self, backend, channel_id):
+    self.backend = backend
+    self.id = channel_id
+
+  async def send(self, content=None, **kwargs):
+    await self.backend.send(self.id)
+
+class FakeUser:
+  """
+  A fake user whose DM channel is created through the FakeDiscord backend.
+  """
+
+  def __init__(self, backend, user_id):
+    self.backend = backend
+    self.id = user_id
+    self.dm_channel = None
+
+  async def create_dm(self):
+    await self.backend.call('create_dm')
+    self.dm_channel = FakeChannel(self.backend, self.id)
+    return self.dm_channel
+
+class FakeDiscordBot(Bot):
+  """
+  A Bot whose Discord REST calls go to a FakeDiscord backend instead of the network.
+  """
+
+  def __init__(self, backend, data_dir):
+    """
+    Initialize the FakeDiscordBot.
+
+    Args:
+      backend (FakeDiscord): The backend recording API calls.
+      data_dir (str): The directory holding the benchmark database.
+    """
+    super().__init__(data_dir=data_dir)
+    self.backend = backend
+
+  def get_user(self, user_id):
+    return None
+
+  async def fetch_user(self, user_id):
+    await self.backend.call('fetch_user')
+    return FakeUser(self.backend, user_id)
+
+  def get_partial_messageable(self, id, **kwargs): # pylint: disable=redefined-builtin
+    return FakeChannel(self.backend, id)
+
+class FakeComEd:
+  """
+  A local HTTP server standing in for the ComEd price API and the price to compare page.
+  """
+
+  def __init__(self, price=5.0, price_to_compare=6.9, latency=0.0):
+    """
+    Initialize the FakeComEd server.
+
+    Args:
+      price (float, optional): The price returned by the API. Defaults to 5.0.
+      price_to_compare (float, optional): The price shown on the price to compare page. Defaults to 6.9.
+      latency (float, optional): Seconds each request takes. Defaults to 0.0.
+    """
+    self.price = price
+    self.price_to_compare = price_to_compare
+    self.latency = latency
+    self.requests = {'currenthouraverage': 0, '5minutefeed': 0, 'price_to_compare': 0}
+    self.runner = None
+    self.url = None
+
+  async def start(self):
+    """
+    Start serving on a free local port.
+    """
+    app = web.Application()
+    app.router.add_get('/api', self.api)
+    app.router.add_get('/price-to-compare', self.price_to_compare_page)
+    self.runner = web.AppRunner(app)
+    await self.runner.setup()
+    site = web.TCPSite(self.runner, '127.0.0.1', 0)
+    await site.start()
+    host, port = self.runner.addresses[0][:2]
+    self.url = f'http://{host}:{port}'
+
+  async def stop(self):
+    """
+    Stop the server.
+    """
+    if self.runner is not None:
+      await self.runner.cleanup()
+
+  async def api(self, request):
+    """
+    Serve the currenthouraverage and 5minutefeed endpoints.
+    """
+    feed_type = request.query.get('type', 'currenthouraverage')
+    self.requests[feed_type] = self.requests.get(feed_type, 0) + 1
+    if self.latency:
+      await asyncio.sleep(self.latency)
+    millis = int(time.time() * 1000)
+    return web.json_response([{'millisUTC': str(millis), 'price': f'{self.price:.1f}'}])
+
+  async def price_to_compare_page(self, request):
+    """
+    Serve a price to compare page with an ETag.
+    """
+    self.requests['price_to_compare'] += 1
+    etag = f'"{self.price_to_compare}"'
+    if request.headers.get('If-None-Match') == etag:
+      return web.Response(status=304)
+    body = (
+      '<html><body><table><tr><th>Price to Compare</th></tr>'
+      f'<tr><td>{self.price_to_compare} cents per kWh</td></tr></table></body></html>'
+    )
+    return web.Response(text=body, content_type='text/html', headers={'ETag': etag})
+
+class FakeInteraction:
+  """
+  A fake slash command interaction that records responses.
+  """
+
+  class _User:
+    def __init__(self, user_id):
+      self.id = user_id
+
+  class _Response:
+    def __init__(self):
+      self.messages = []
+
+    async def send_message(self, content=None, **kwargs):
+      self.messages.append((content, kwargs))
+
+  def __init__(self, client, user_id):
+    self.client = client
+    self.user = self._User(user_id)
+    self.response = self._Response()
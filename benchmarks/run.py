@@ -0,0 +1,227 @@
+"""
+Offline benchmarks for alert fan-out, /check and /toggle.
+
+Runs each subscriber count in a fresh process against a fake Discord backend and a
+local fake ComEd server, and prints machine-readable JSON results.
+
+Usage:
+  python -m benchmarks.run --subscribers 10000 100000 1000000 --output bench.json
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import resource
+import shutil
+import subprocess
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import get_context
+
+from benchmarks.seed import seeded_database
+from monitor import LoopLagMonitor
+
+def percentile(values, fraction):
+  """
+  Get a percentile of a list of values.
+
+  Args:
+    values (list): The values.
+    fraction (float): The percentile as a fraction, e.g. 0.99.
+
+  Returns:
+    float: The value at the percentile, or 0.0 if there are no values.
+  """
+  if not values:
+    return 0.0
+  ordered = sorted(values)
+  return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+def peak_rss_mb():
+  """
+  Get the peak resident set size of this process.
+
+  Returns:
+    float: The peak RSS in megabytes.
+  """
+  return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+async def time_commands(callback, interactions):
+  """
+  Invoke a command callback concurrently for many interactions.
+
+  Args:
+    callback (coroutine function): The command callback.
+    interactions (list): The fake interactions to invoke it with.
+
+  Returns:
+    dict: The wall time and latency percentiles in milliseconds.
+  """
+  latencies = []
+
+  async def invoke(interaction):
+    started = time.perf_counter()
+    await callback(interaction)
+    latencies.append(time.perf_counter() - started)
+
+  started = time.perf_counter()
+  await asyncio.gather(*(invoke(interaction) for interaction in interactions))
+  return {
+    'count': len(interactions),
+    'wall_ms': (time.perf_counter() - started) * 1000,
+    'p50_ms': percentile(latencies, 0.5) * 1000,
+    'p99_ms': percentile(latencies, 0.99) * 1000,
+  }
+
+async def run_scenario(subscribers, args):
+  """
+  Benchmark one alert tick plus bursts of /check and /toggle for a subscriber count.
+
+  Args:
+    subscribers (int): The number of seeded subscribers.
+    args (argparse.Namespace): The benchmark options.
+
+  Returns:
+    dict: The measured results.
+  """
+  data_dir = tempfile.mkdtemp(prefix='bench-')
+  shutil.copy(seeded_database(args.seed_dir, subscribers, args.seed), os.path.join(data_dir, 'bot.db'))
+
+  # pylint: disable=import-outside-toplevel
+  from benchmarks.fakes import FakeComEd, FakeDiscord, FakeDiscordBot, FakeInteraction
+  from commands.check import check
+  from commands.toggle import toggle
+
+  comed = FakeComEd(price=args.start_price, latency=args.upstream_latency)
+  await comed.start()
+  os.environ['COMED_API_URL'] = f'{comed.url}/api'
+  os.environ['PRICE_TO_COMPARE_URL'] = f'{comed.url}/price-to-compare'
+  os.environ['ALERT_WORKERS'] = str(args.workers)
+
+  backend = FakeDiscord(latency=args.discord_latency, rate_limit_ratio=args.rate_limit_ratio,
+                        retry_after=args.retry_after, seed=args.seed)
+  started = time.perf_counter()
+  bot = FakeDiscordBot(backend, data_dir)
+  load_ms = (time.perf_counter() - started) * 1000
+  bot.start_services()
+  # The bot resets its own monitor every tick, so measure lag independently.
+  lag_monitor = LoopLagMonitor(interval=0.01)
+  lag_monitor.start()
+  await bot.update_price_to_compare()
+  await bot.set_last_price(args.start_price)
+
+  comed.price = args.end_price
+  bot.price_cache.expires = 0
+  lag_monitor.reset()
+  started = time.perf_counter()
+  await bot.send_price_alerts()
+  tick_seconds = time.perf_counter() - started
+  tick_lag = lag_monitor.reset()
+  stats = bot.dispatcher.stats
+
+  bot.price_cache.expires = 0
+  requests_before = comed.requests['currenthouraverage']
+  check_result = await time_commands(check.callback,
+                                     [FakeInteraction(bot, user_id) for user_id in range(1, args.commands + 1)])
+  check_result['upstream_requests'] = comed.requests['currenthouraverage'] - requests_before
+  check_result['loop_lag_max_ms'] = lag_monitor.reset()['max'] * 1000
+
+  first_new_user = subscribers + 1
+  toggle_result = await time_commands(toggle.callback, [
+    FakeInteraction(bot, user_id) for user_id in range(first_new_user, first_new_user + args.commands)
+  ])
+  toggle_result['loop_lag_max_ms'] = lag_monitor.reset()['max'] * 1000
+
+  await lag_monitor.stop()
+  await bot.stop_services()
+  bot.db.close()
+  await comed.stop()
+  shutil.rmtree(data_dir, ignore_errors=True)
+
+  return {
+    'subscribers': subscribers,
+    'load_ms': load_ms,
+    'tick': {
+      'seconds': tick_seconds,
+      'alerts_queued': stats.queued,
+      'alerts_delivered': len(stats.delivered),
+      'alerts_failed': stats.failed,
+      'alerts_retried': stats.retried,
+      'dms_per_second': len(stats.delivered) / tick_seconds if tick_seconds else 0.0,
+      'mean_latency_ms': stats.mean_latency * 1000,
+      'max_latency_ms': stats.latency_max * 1000,
+      'loop_lag_max_ms': tick_lag['max'] * 1000,
+      'loop_lag_mean_ms': tick_lag['mean'] * 1000,
+    },
+    'discord_calls': dict(backend.calls),
+    'check': check_result,
+    'toggle': toggle_result,
+    'peak_rss_mb': peak_rss_mb(),
+  }
+
+def run_scenario_in_process(subscribers, args):
+  """
+  Run a scenario synchronously; used as the entry point of each benchmark process.
+
+  Args:
+    subscribers (int): The number of seeded subscribers.
+    args (argparse.Namespace): The benchmark options.
+
+  Returns:
+    dict: The measured results.
+  """
+  return asyncio.run(run_scenario(subscribers, args))
+
+def current_commit():
+  """
+  Get the current git commit, if available.
+
+  Returns:
+    str or None: The commit hash.
+  """
+  try:
+    return subprocess.run(['git', 'rev-parse', 'HEAD'], capture_output=True, text=True, check=True).stdout.strip()
+  except (OSError, subprocess.CalledProcessError):
+    return None
+
+def main():
+  """
+  Parse the command line, run every scenario in its own process and print the results as JSON.
+  """
+  parser = argparse.ArgumentParser(description="Benchmark alert fan-out, /check and /toggle offline.")
+  parser.add_argument('--subscribers', type=int, nargs='+', default=[10000, 100000, 1000000])
+  parser.add_argument('--seed', type=int, default=0)
+  parser.add_argument('--seed-dir', default='bench_data')
+  parser.add_argument('--start-price', type=float, default=3.0)
+  parser.add_argument('--end-price', type=float, default=12.0)
+  parser.add_argument('--workers', type=int, default=64)
+  parser.add_argument('--discord-latency', type=float, default=0.001)
+  parser.add_argument('--rate-limit-ratio', type=float, default=0.0)
+  parser.add_argument('--retry-after', type=float, default=0.05)
+  parser.add_argument('--upstream-latency', type=float, default=0.05)
+  parser.add_argument('--commands', type=int, default=1000)
+  parser.add_argument('--output', help="Write results to this file instead of stdout.")
+  args = parser.parse_args()
+
+  results = []
+  for subscribers in args.subscribers:
+    # A fresh process per scenario keeps peak RSS and caches independent.
+    with ProcessPoolExecutor(max_workers=1, mp_context=get_context('spawn')) as pool:
+      results.append(pool.submit(run_scenario_in_process, subscribers, args).result())
+
+  report = json.dumps({
+    'commit': current_commit(),
+    'python': platform.python_version(),
+    'options': vars(args),
+    'results': results,
+  }, indent=2)
+  if args.output:
+    with open(args.output, 'w', encoding='utf-8') as file:
+      file.write(report + '\n')
+  else:
+    print(report)
+
+if __name__ == '__main__':
+  main()
@@ -0,0 +1,46 @@
+import os
+import random
+
+from database import Database
+
+def seed_database(path, subscribers, seed=0, default_ratio=0.3, batch_size=50000):
+  """
+  Create a database with a reproducible set of subscribers.
+
+  Args:
+    path (str): The path of the database file to create.
+    subscribers (int): The number of subscribers to insert.
+    seed (int, optional): The random seed for thresholds. Defaults to 0.
+    default_ratio (float, optional): Fraction of users on the default threshold. Defaults to 0.3.
+    batch_size (int, optional): Rows inserted per transaction. Defaults to 50000.
+  """
+  if os.path.exists(path):
+    os.remove(path)
+  rng = random.Random(seed)
+  db = Database(path)
+  for start in range(0, subscribers, batch_size):
+    rows = [
+      (user_id, None if rng.random() < default_ratio else round(rng.uniform(2, 15) * 2) / 2)
+      for user_id in range(start + 1, min(start + batch_size, subscribers) + 1)
+    ]
+    with db.conn:
+      db.conn.executemany('INSERT INTO subscribed_users (user_id, threshold) VALUES (?, ?)', rows)
+  db.close()
+
+def seeded_database(directory, subscribers, seed=0):
+  """
+  Get the path of a seeded database, creating it on first use.
+
+  Args:
+    directory (str): The directory where seeded databases are kept.
+    subscribers (int): The number of subscribers.
+    seed (int, optional): The random seed for thresholds. Defaults to 0.
+
+  Returns:
+    str: The path of the seeded database.
+  """
+  os.makedirs(directory, exist_ok=True)
+  path = os.path.join(directory, f'seed-{subscribers}-{seed}.db')
+  if not os.path.exists(path):
+    seed_database(path, subscribers, seed=seed)
+  return path
@@ -1,15 +1,39 @@
+import asyncio
+import hashlib
+import json
+import math
 import os
 import importlib
+import time
 
 import discord
 from discord import app_commands
 from discord.ext import tasks
 import aiohttp
 
+from cache import PriceCache
 from database import Database
+from dispatcher import AlertDispatcher, Recipient
+from history import PriceRingBuffer, downsample_rollups, downsample_samples
 from logger import logger
+from metrics import COMMAND_INVOCATIONS, COOLDOWN_REJECTIONS, PRICE_POLLS, TICK_SECONDS, Counter, Gauge, registry
+from metrics import start_metrics_server
+from monitor import LoopLagMonitor
 from msg import Msg
-from utils import create_price_embed, fetch_comed_price_to_compare
+from price_sources import load_price_sources
+from ratelimit import CommandRateLimited
+from scheduler import PublishScheduler
+from scraper import DEFAULT_PRICE_TO_COMPARE, PriceToCompareScraper
+from utils import create_price_embeds
+
+# Range name: (length in seconds, bucket size in seconds)
+HISTORY_RANGES = {
+  'hour': (3600, 300),
+  'day': (86400, 3600),
+  'week': (604800, 86400),
+}
+# Alerts left pending by a previous run are only resent if their tick is this recent.
+OUTBOX_RESUME_AGE = 3600
 
 class Bot(discord.Client):
   """
@@ -17,38 +41,158 @@ class Bot(discord.Client):
   Handles price checks, alerts, and command loading.
   """
 
-  def __init__(self):
+  def __init__(self, data_dir='data', partition=None, started_at=None, price_sources=None, **options):
     """
     Initialize the Bot with necessary attributes and settings.
+
+    Args:
+      data_dir (str, optional): The directory holding the database and caches. Defaults to 'data'.
+      partition (tuple, optional): A tuple (index, count) restricting alerts to one share of the users.
+        Defaults to None, which handles every user.
+      started_at (float, optional): The time.perf_counter() value when the process started, used to
+        report the time to the first alert tick. Defaults to now.
+      price_sources (PriceSources, optional): Where prices are fetched from. Defaults to the sources
+        configured by the environment.
+      **options: Additional options passed to discord.Client, e.g. shard_id and shard_count.
     """
+    self.started_at = time.perf_counter() if started_at is None else started_at
+    self.startup_marks = {'imports': time.perf_counter() - self.started_at}
     intents = discord.Intents.default()
     intents.message_content = True
-    super().__init__(intents=intents)
+    # Long rate limits raise instead of sleeping so the dispatcher can back off per bucket.
+    super().__init__(intents=intents, max_ratelimit_timeout=30.0, **options)
 
     self.tree = app_commands.CommandTree(self)
-    self.comed_api_url = "https://hourlypricing.comed.com/api?type=currenthouraverage"
-    self.price_to_compare_url = "https://plugin.illinois.gov/understanding-the-price-to-compare/price-to-compare-comed.html"
+    self.tree.error(on_app_command_error)
+    os.makedirs(data_dir, exist_ok=True)
+    self.price_sources = price_sources if price_sources is not None else load_price_sources()
+    self.price_to_compare_url = os.environ.get(
+      'PRICE_TO_COMPARE_URL',
+      "https://plugin.illinois.gov/understanding-the-price-to-compare/price-to-compare-comed.html"
+    )
+    self.price_to_compare_scraper = PriceToCompareScraper(
+      self.price_to_compare_url, os.path.join(data_dir, 'price_to_compare.json'))
     self.price_to_compare = None
-    self.db = Database('data/bot.db')
-    self.last_price = None
+    self.price_to_compare_task = None
+    self.partition = partition
+    self.db = Database(os.path.join(data_dir, 'bot.db'), partition=partition)
+    self.last_price = self.db.get_state('last_price')
+    self.price_history = PriceRingBuffer(4096)
+    self.price_history.extend(self.db.get_price_samples(int(time.time()) - HISTORY_RANGES['week'][0]))
+    self.session = None
+    self.metrics_runner = None
+    self.price_cache = PriceCache(self.fetch_comed_price)
+    self.loop_monitor = LoopLagMonitor()
+    self.scheduler = PublishScheduler()
+    self.alert_task = None
+    self.tick_task = None
+    self.delivered_alerts = []
+    self.flush_lock = asyncio.Lock()
+    self.drain_seconds = float(os.environ.get('SHUTDOWN_DRAIN_SECONDS', 20))
+    # Stored DM channel IDs of the recipients being delivered to, and channels resolved since the last flush.
+    self.dm_channel_ids = {}
+    self.resolved_dm_channels = []
+    self.dm_channel_hits = 0
+    self.dm_channel_misses = 0
+    self.dispatcher = AlertDispatcher(self.deliver_alert, workers=int(os.environ.get('ALERT_WORKERS', 16)),
+                                      on_delivered=self.record_delivered)
+    self.mark_startup('init')
 
   async def setup_hook(self):
     """
     Perform setup tasks when the bot starts.
     """
+    self.start_services()
+    await self.start_metrics()
+    self.mark_startup('services')
     await self.load_commands()
+    self.mark_startup('commands')
+    await self.sync_commands()
+    self.mark_startup('sync')
+    if self.price_to_compare_scraper.price is not None:
+      # Start from the cached value and refresh in the background instead of waiting on the scrape.
+      self.price_to_compare = self.price_to_compare_scraper.price
+      logger.info("Loaded cached comparison price of %s", self.price_to_compare)
+      self.price_to_compare_task = asyncio.create_task(self.update_price_to_compare())
+    else:
+      await self.update_price_to_compare()
+    self.mark_startup('price_to_compare')
+
+  async def sync_commands(self):
+    """
+    Sync the command tree with Discord, skipping the sync when the commands have not changed since the last one.
+    """
+    payload = json.dumps({
+      'application_id': self.application_id,
+      'commands': [command.to_dict(self.tree) for command in self.tree.get_commands()],
+    }, sort_keys=True)
+    digest = hashlib.sha256(payload.encode()).hexdigest()
+    if digest == await self.db.run(self.db.get_state, 'command_tree_hash'):
+      logger.info("Command definitions are unchanged; skipping command tree sync")
+      return
     await self.tree.sync()
-    await self.update_price_to_compare()
+    await self.db.run(self.db.set_state, 'command_tree_hash', digest)
+    logger.info("Synced the command tree with Discord")
+
+  def mark_startup(self, phase):
+    """
+    Record how long after process start a startup phase finished, the first time it finishes.
+
+    Args:
+      phase (str): The name of the phase.
+    """
+    if phase not in self.startup_marks:
+      self.startup_marks[phase] = time.perf_counter() - self.started_at
+
+  def start_services(self):
+    """
+    Create the shared HTTP session and start the background services used by alerts.
+    """
+    self.session = aiohttp.ClientSession(
+      connector=aiohttp.TCPConnector(limit=20, ttl_dns_cache=300, keepalive_timeout=60),
+      timeout=aiohttp.ClientTimeout(total=20, connect=5, sock_read=10)
+    )
+    self.loop_monitor.start()
+    self.dispatcher.start()
+
+  async def start_metrics(self, port=None):
+    """
+    Register the bot's callback metrics and serve metrics on METRICS_HOST:METRICS_PORT, unless the port is 0.
+
+    Args:
+      port (int, optional): The port to serve on instead of METRICS_PORT. Defaults to None.
+    """
+    registry.register(Gauge('bot_subscribers', "Subscribed users in the threshold index.",
+                            function=lambda: {(): len(self.db.threshold_index)}))
+    registry.register(Counter('bot_dm_cache_lookups_total', "DM channel lookups by whether the channel ID was stored.",
+                              ('result',),
+                              function=lambda: {('hit',): self.dm_channel_hits, ('miss',): self.dm_channel_misses}))
+    registry.register(Gauge('bot_suspended_users', "Users whose alerts are suspended after delivery failures.",
+                            function=lambda: {(): len(self.db.suspended)}))
+    registry.register(Gauge('bot_suspended_channels', "Channels whose alerts are suspended after delivery failures.",
+                            function=lambda: {(): len(self.db.suspended_channels)}))
+    registry.register(Gauge('bot_startup_seconds', "Seconds from process start until each startup phase finished.",
+                            ('phase',), function=lambda: {(phase,): value for phase, value in self.startup_marks.items()}))
+    registry.register(Gauge('bot_price_source_circuit_open', "Whether calls to each price source are being refused.",
+                            ('source',), function=lambda: {
+                              (name,): int(state) for name, state in self.price_sources.circuit_states().items()}))
+    registry.register(Counter('bot_price_cache_lookups_total', "Price cache lookups by result.", ('result',),
+                              function=lambda: {('hit',): self.price_cache.hits, ('miss',): self.price_cache.misses}))
+    if port is None:
+      port = int(os.environ.get('METRICS_PORT', 9090))
+    if port:
+      self.metrics_runner = await start_metrics_server(os.environ.get('METRICS_HOST', '127.0.0.1'), port)
+      logger.info("Serving metrics on port %s", port)
 
   async def update_price_to_compare(self):
     """
     Update the price to compare from the ComEd website.
     """
-    price = await fetch_comed_price_to_compare(self.price_to_compare_url)
+    price = await self.price_to_compare_scraper.fetch(self.session)
     if price is None:
       if self.price_to_compare is None:
-        self.price_to_compare = 6.9
-        logger.error("Failed to fetch comparison price; defaulting to 6.9")
+        self.price_to_compare = DEFAULT_PRICE_TO_COMPARE
+        logger.error("Failed to fetch comparison price; defaulting to %s", DEFAULT_PRICE_TO_COMPARE)
       else:
         logger.error("Failed to fetch comparison price; keeping previous value of %s", self.price_to_compare)
     else:
@@ -57,96 +201,408 @@ class Bot(discord.Client):
 
   async def get_comed_price(self):
     """
-    Fetch the current ComEd price from the API.
+    Get the current ComEd price, served from the price cache when it is still current.
+
+    Returns:
+      float or None: The current price if successful, None otherwise.
+    """
+    return await self.price_cache.get()
+
+  async def fetch_comed_price(self):
+    """
+    Fetch the current ComEd price from the first price source to answer.
 
     Returns:
       float or None: The current price if successful, None otherwise.
     """
-    async with aiohttp.ClientSession() as session:
+    return await self.price_sources.fetch(self.session)
+
+  async def run_price_alerts(self):
+    """
+    Poll for new prices when the scheduler expects them and send alerts if necessary.
+    """
+    try:
+      await self.run_tick(self.resume_outbox())
+    # pylint: disable=broad-except
+    except Exception as e:
+      logger.error("Resuming pending alerts failed: %s", str(e))
+    while True:
       try:
-        async with session.get(self.comed_api_url) as response:
-          if response.status == 200:
-            data = await response.json()
-            if data:
-              return float(data[0]['price'])
-          logger.error("Error: HTTP %s", response.status)
-      except aiohttp.ClientError as e:
-        logger.error("Error fetching ComEd price %s", str(e))
-    return None
-
-  @tasks.loop(minutes=5)
+        outcome = await self.run_tick(self.send_price_alerts())
+      # pylint: disable=broad-except
+      except Exception as e:
+        logger.error("Price alert tick failed: %s", str(e))
+        outcome = 'failed'
+      delay = self.scheduler.next_delay(time.time(), outcome)
+      # Let /check reuse the polled price until the next expected publication.
+      self.price_cache.delay = self.scheduler.phase + self.scheduler.margin
+      await asyncio.sleep(delay)
+
+  async def run_tick(self, coro):
+    """
+    Run an alert tick in its own task, so that shutdown can let it finish delivering instead of cancelling it.
+
+    Args:
+      coro (coroutine): The tick to run.
+
+    Returns:
+      The tick's return value.
+    """
+    self.tick_task = asyncio.ensure_future(coro)
+    return await asyncio.shield(self.tick_task)
+
   async def send_price_alerts(self):
     """
-    Periodically check ComEd prices and send alerts if necessary.
+    Poll the current ComEd price and send alerts if necessary.
+
+    Returns:
+      str: 'changed', 'unchanged' or 'failed', for the scheduler.
+    """
+    with TICK_SECONDS.time():
+      current_price = await self.price_cache.get(refresh=True)
+      if current_price is None:
+        outcome = 'failed'
+      else:
+        outcome = 'unchanged' if current_price == self.last_price else 'changed'
+        await self.process_price(current_price)
+    PRICE_POLLS.inc(labels=(outcome,))
+    if 'first_tick' not in self.startup_marks:
+      self.mark_startup('first_tick')
+      logger.info("Time to first alert tick: %s", ', '.join(
+        f'{phase} {seconds * 1000:.0f} ms' for phase, seconds in self.startup_marks.items()))
+    return outcome
+
+  async def process_price(self, current_price):
+    """
+    Record a newly polled price and alert the users and channels whose threshold it crossed.
+
+    Args:
+      current_price (float): The polled price.
     """
-    current_price = await self.get_comed_price()
-    if current_price is not None and current_price == self.last_price:
+    await self.record_price(current_price)
+    if current_price == self.last_price:
       return
 
-    subscribed_users = self.db.get_subscribed_users()
-    for user_id, threshold in subscribed_users:
-      user_threshold = threshold if threshold is not None else self.price_to_compare
-      if user_threshold is not None and (
-        (self.last_price is None) or
-        (self.last_price <= user_threshold < current_price) or
-        (self.last_price > user_threshold >= current_price)
-      ):
-        await self.send_price_alert(user_id, current_price, user_threshold)
+    if self.last_price is None:
+      # Without a previous price there is no crossing to report, so record a baseline.
+      logger.info("No previous price recorded; using %s as the baseline", current_price)
+      await self.set_last_price(current_price)
+      return
+
+    now = int(time.time())
+    resumed = await self.db.run(self.db.resume_expired_suspensions, now)
+    if resumed:
+      logger.info("Retrying %s recipients whose delivery suspension ended", resumed)
+    crossed_users = await self.db.run(self.db.get_crossed_users, self.last_price, current_price, self.price_to_compare)
+    # Users already alerted for this crossing, or alerted too recently, are skipped.
+    alerted_users = self.db.filter_notified(crossed_users, current_price, now)
+    if len(alerted_users) < len(crossed_users):
+      logger.info("Suppressed %s of %s crossed alerts", len(crossed_users) - len(alerted_users), len(crossed_users))
+    alerted_channels = await self.db.run(
+      self.db.get_crossed_channels, self.last_price, current_price, self.price_to_compare)
+    thresholds = {Recipient(Recipient.USER, user_id): threshold for user_id, threshold in alerted_users}
+    thresholds.update((Recipient(Recipient.CHANNEL, channel_id), threshold) for channel_id, threshold in alerted_channels)
 
+    # The alerts and the new last price are committed together, so from here on a crash resends instead of losing them.
+    await self.db.run(self.db.enqueue_alerts, now, current_price,
+                      [(recipient.kind, recipient.id, threshold) for recipient, threshold in thresholds.items()])
     self.last_price = current_price
+    stats = await self.deliver_alerts(now, current_price, thresholds)
+    if stats.queued:
+      logger.info(
+        "Delivered %s of %s alerts in %.2fs (%.1f/s, mean latency %.2fs, max %.2fs, %s failed, %s retried)",
+        len(stats.delivered), stats.queued, stats.duration, stats.throughput,
+        stats.mean_latency, stats.latency_max, stats.failed, stats.retried
+      )
+      logger.info("DM channels: %s stored, %s resolved", self.dm_channel_hits, self.dm_channel_misses)
+    lag = self.loop_monitor.reset()
+    logger.info("Event loop lag since last tick: max %.1f ms, mean %.1f ms", lag['max'] * 1000, lag['mean'] * 1000)
+
+  async def deliver_alerts(self, tick, price, thresholds):
+    """
+    Deliver a tick's outbox entries and record the outcome of each.
+
+    Args:
+      tick (int): The UNIX timestamp identifying the tick.
+      price (float): The price of the tick.
+      thresholds (dict): A mapping of Recipient to the threshold it crossed.
+
+    Returns:
+      DeliveryStats: The delivery statistics of the tick.
+    """
+    # Recipients sharing a threshold share one rendered embed.
+    embeds = create_price_embeds(price, thresholds.values())
+    self.dm_channel_ids = await self.db.run(
+      self.db.get_dm_channels, [recipient.id for recipient in thresholds if recipient.kind == Recipient.USER])
+    self.dispatcher.begin_tick()
+    for recipient, threshold in thresholds.items():
+      self.dispatcher.enqueue(recipient, embeds[threshold], (tick, recipient.kind, recipient.id, threshold, price))
+    stats = await self.dispatcher.join()
+    self.dm_channel_ids = {}
+    await self.flush_delivered()
+
+    # Suspensions run from now, not from the tick, which is up to an hour old for resumed entries.
+    now = int(time.time())
+    delivered = set(stats.delivered)
+    failed = [(tick, recipient.kind, recipient.id) for recipient in thresholds if recipient not in delivered]
+    if failed:
+      await self.db.run(self.db.mark_failed, failed, now)
+    undeliverable = [(recipient.id, error) for recipient, error in stats.undeliverable
+                     if recipient.kind == Recipient.USER]
+    if undeliverable:
+      suspended = await self.db.run(self.db.record_delivery_failures, undeliverable, now)
+      logger.info("Suspended alerts for %s undeliverable users", len(suspended))
+    undeliverable_channels = [(recipient.id, error) for recipient, error in stats.undeliverable
+                              if recipient.kind == Recipient.CHANNEL]
+    if undeliverable_channels:
+      suspended = await self.db.run(self.db.record_channel_failures, undeliverable_channels, now)
+      logger.info("Suspended alerts for %s undeliverable channels", len(suspended))
+    return stats
+
+  async def resume_outbox(self):
+    """
+    Deliver the alerts a previous run enqueued but never finished sending.
+    """
+    pending = await self.db.run(self.db.get_pending_alerts, int(time.time()) - OUTBOX_RESUME_AGE)
+    ticks = {}
+    for tick, kind, target_id, threshold, price in pending:
+      ticks.setdefault((tick, price), {})[Recipient(kind, target_id)] = threshold
+    for (tick, price), thresholds in ticks.items():
+      stats = await self.deliver_alerts(tick, price, thresholds)
+      logger.info("Resumed %s pending alerts from tick %s; delivered %s", len(thresholds), tick, len(stats.delivered))
+
+  async def deliver_alert(self, recipient, embed, _entry):
+    """
+    Send one alert for the dispatcher.
+
+    Args:
+      recipient (Recipient): The user or channel to send the alert to.
+      embed (discord.Embed): The rendered price alert.
+      _entry (tuple): The outbox entry of the alert, which record_delivered marks once it is sent.
+    """
+    await self.send_price_alert(recipient, embed)
+
+  async def record_delivered(self, _recipient, _embed, entry):
+    """
+    Mark a sent alert as delivered in the outbox before the dispatcher worker takes the next one.
+
+    Args:
+      _recipient (Recipient): The user or channel the alert was sent to.
+      _embed (discord.Embed): The rendered price alert.
+      entry (tuple): The outbox entry (tick, kind, target_id, threshold, price) of the alert.
+    """
+    self.delivered_alerts.append(entry)
+    await self.flush_delivered()
+
+  async def flush_delivered(self):
+    """
+    Record the alerts delivered since the last flush in the outbox and as their recipients' last alert,
+    and store the DM channels resolved since then.
+
+    Flushes run one at a time. Alerts delivered while one is writing are written together by
+    the next, so a worker only waits for the transaction that covers its own alert. If the
+    write fails, the alerts are kept for the next flush.
+    """
+    async with self.flush_lock:
+      delivered, self.delivered_alerts = self.delivered_alerts, []
+      if delivered:
+        try:
+          await self.db.run(self.db.mark_delivered, delivered, int(time.time()))
+        except Exception:
+          self.delivered_alerts[:0] = delivered
+          raise
+      resolved, self.resolved_dm_channels = self.resolved_dm_channels, []
+      if resolved:
+        await self.db.run(self.db.set_dm_channels, resolved)
+
+  async def record_price(self, price):
+    """
+    Record a polled price in the in-memory history and the database.
+
+    Args:
+      price (float): The polled price.
+    """
+    timestamp = int(time.time())
+    newest = self.price_history.newest()
+    # Retried polls that found no new publication would only add duplicate samples.
+    if newest is not None and newest[1] == price and timestamp - newest[0] < self.scheduler.period:
+      return
+    self.price_history.append(timestamp, price)
+    # In sharded mode only the first partition writes the shared history.
+    if self.partition is None or self.partition[0] == 0:
+      await self.db.run(self.db.add_price_sample, timestamp, price)
+
+  async def get_price_history(self, range_name):
+    """
+    Get downsampled price history for a range.
+
+    Recent ranges are served from the in-memory ring buffer; older data comes from
+    the hourly rollups in the database.
+
+    Args:
+      range_name (str): One of the keys of HISTORY_RANGES.
+
+    Returns:
+      list: Tuples of (bucket_start, min, avg, max, count), oldest first.
+    """
+    length, bucket_size = HISTORY_RANGES[range_name]
+    now = int(time.time())
+    start = now - now % bucket_size + bucket_size - length
+    oldest = self.price_history.oldest()
+    if oldest is not None and oldest <= start:
+      return downsample_samples(self.price_history.since(start), start, bucket_size, length // bucket_size)
+    rollups = await self.db.run(self.db.get_hourly_rollups, start)
+    return downsample_rollups(rollups, start, bucket_size, length // bucket_size)
+
+  async def set_last_price(self, price):
+    """
+    Update the last observed price and persist it so it survives restarts.
+
+    Args:
+      price (float): The observed price.
+    """
+    self.last_price = price
+    await self.db.run(self.db.set_state, 'last_price', price)
 
   @tasks.loop(hours=168) # 168 hours = 1 week
   async def update_price_to_compare_weekly(self):
     """
     Update the price to compare on a weekly basis.
     """
+    # setup_hook has just refreshed the price, so the loop's immediate first run is skipped.
+    # pylint: disable=no-member
+    if self.update_price_to_compare_weekly.current_loop == 0:
+      return
     await self.update_price_to_compare()
 
-  async def send_price_alert(self, user_id, price, threshold):
+  async def send_price_alert(self, recipient, embed):
+    """
+    Send a price alert to a user's DMs or broadcast it to a subscribed channel.
+
+    Errors are raised to the dispatcher, which handles logging and rate limit backoff.
+
+    Args:
+      recipient (Recipient): The user or channel to send the alert to.
+      embed (discord.Embed): The rendered price alert.
+    """
+    if recipient.kind == Recipient.CHANNEL:
+      # A partial messageable sends straight to the channel ID without needing it in the cache.
+      channel = self.get_partial_messageable(recipient.id)
+      role_id = self.db.channel_roles.get(recipient.id)
+      if role_id is None:
+        await channel.send(embed=embed)
+      else:
+        await channel.send(content=f'<@&{role_id}>', embed=embed,
+                           allowed_mentions=discord.AllowedMentions(roles=[discord.Object(role_id)]))
+      return
+    channel = await self.get_dm_channel(recipient.id)
+    await channel.send(embed=embed)
+
+  async def get_dm_channel(self, user_id):
     """
-    Send a price alert to a specific user.
+    Get the DM channel for a user from its stored ID, resolving it only when none is stored.
+
+    Resolved channel IDs are stored with the next flush of delivered alerts, so each user
+    costs the extra fetch_user and create_dm calls once rather than once per restart.
 
     Args:
-      user_id (int): The Discord user ID to send the alert to.
-      price (float): The current ComEd price.
+      user_id (int): The Discord user ID.
+
+    Returns:
+      discord.abc.Messageable: The user's DM channel.
+    """
+    channel_id = self.dm_channel_ids.get(user_id)
+    if channel_id is not None:
+      self.dm_channel_hits += 1
+      return self.get_partial_messageable(channel_id, type=discord.ChannelType.private)
+    self.dm_channel_misses += 1
+    user = self.get_user(user_id) or await self.fetch_user(user_id)
+    channel = user.dm_channel or await user.create_dm()
+    self.dm_channel_ids[user_id] = channel.id
+    self.resolved_dm_channels.append((channel.id, user_id))
+    return channel
+
+  async def stop_services(self):
     """
+    Stop the background services and close the shared HTTP session.
+    """
+    await self.dispatcher.stop()
+    await self.loop_monitor.stop()
+    await self.price_sources.close()
+    if self.session is not None:
+      await self.session.close()
+
+  async def drain_alerts(self):
+    """
+    Give the alert tick in progress up to drain_seconds to finish delivering.
+
+    Alerts still queued at the deadline stay pending in the outbox and are resumed on the next start.
+    """
+    if self.tick_task is None or self.tick_task.done():
+      return
     try:
-      user = await self.fetch_user(user_id)
-      embed = create_price_embed(price, threshold)
-      await user.send(embed=embed)
-    except discord.errors.Forbidden:
-      logger.error("Unable to send DM to user %s. User might have DMs disabled.", user_id)
-    except discord.errors.HTTPException as e:
-      logger.error("Error sending DM to user %s: %s", user_id, str(e))
+      await asyncio.wait_for(self.tick_task, self.drain_seconds)
+    except asyncio.TimeoutError:
+      logger.warning("Stopped delivering alerts after %.1fs; %s queued alerts will be resumed on the next start",
+                     self.drain_seconds, self.dispatcher.queue.qsize())
+    # pylint: disable=broad-except
+    except Exception as e:
+      logger.error("Alert tick failed during shutdown: %s", str(e))
+
+  async def close(self):
+    """
+    Stop background work, close the HTTP session and database, and close the connection to Discord.
+    """
+    if self.alert_task is not None:
+      self.alert_task.cancel()
+      await asyncio.gather(self.alert_task, return_exceptions=True)
+    await self.drain_alerts()
+    await self.stop_services()
+    # Sends that finished after the drain deadline are still recorded, so they are not resumed.
+    await self.flush_delivered()
+    if self.metrics_runner is not None:
+      await self.metrics_runner.cleanup()
+    await super().close()
+    self.db.close()
+
+  async def on_app_command_completion(self, _interaction, command):
+    """
+    Count successful slash command invocations.
+
+    Args:
+      _interaction (discord.Interaction): The interaction that invoked the command.
+      command (app_commands.Command): The command that completed.
+    """
+    COMMAND_INVOCATIONS.inc(labels=(command.name, 'success'))
 
   async def on_ready(self):
     """
     Perform actions when the bot is ready and connected to Discord.
     """
     logger.info('Bot has successfully connected as %s.', {self.user.name})
+    self.mark_startup('gateway')
+    if self.alert_task is None:
+      self.alert_task = asyncio.create_task(self.run_price_alerts())
+    # on_ready fires again after every reconnect that could not resume the session.
     # pylint: disable=no-member
-    self.send_price_alerts.start()
-    self.update_price_to_compare_weekly.start()
+    if not self.update_price_to_compare_weekly.is_running():
+      self.update_price_to_compare_weekly.start()
 
   async def load_commands(self):
     """
     Load all command modules from the 'commands' directory.
     """
-    for filename in os.listdir('commands'):
+    for filename in sorted(os.listdir('commands')):
       if filename.endswith('.py') and not filename.startswith('__'):
         try:
           module_name = f'commands.{filename[:-3]}'
           module = importlib.import_module(module_name)
-          importlib.reload(module)
           if hasattr(module, 'setup') and callable(module.setup):
             module.setup(self)
           logger.info('The "%s" command has been loaded successfully', module_name)
         except ImportError as e:
           logger.error("Failed to load extension %s: %s", filename[:-3], str(e))
 
-bot = Bot()
-
-@bot.tree.error
 async def on_app_command_error(interaction: discord.Interaction, error: app_commands.AppCommandError):
   """
   Handle errors that occur during command execution.
@@ -155,6 +611,14 @@ async def on_app_command_error(interaction: discord.Interaction, error: app_comm
     interaction (discord.Interaction): The interaction that caused the error.
     error (app_commands.AppCommandError): The error that occurred.
   """
+  command_name = interaction.command.name if interaction.command else 'unknown'
+  if isinstance(error, CommandRateLimited):
+    COMMAND_INVOCATIONS.inc(labels=(command_name, 'rate_limited'))
+    COOLDOWN_REJECTIONS.inc(labels=(command_name,))
+    message = Msg.COMMAND_BUSY if error.is_global else Msg.COMMAND_COOLDOWN.format(retry_after=math.ceil(error.retry_after))
+    await interaction.response.send_message(message, ephemeral=True)
+    return
+  COMMAND_INVOCATIONS.inc(labels=(command_name, 'error'))
   if isinstance(error, app_commands.errors.CheckFailure):
     await interaction.response.send_message(Msg.PERM_ERR, ephemeral=True)
   else:
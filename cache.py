@@ -0,0 +1,98 @@
+import asyncio
+import time
+
+class PriceCache:
+  """
+  A cache for the current price that expires with ComEd's publication cadence.
+
+  Concurrent misses share a single in-flight fetch so a burst of requests
+  produces at most one upstream call.
+  """
+
+  def __init__(self, fetch, period=300, delay=30):
+    """
+    Initialize the PriceCache.
+
+    Args:
+      fetch (coroutine function): Fetches the price, returning None on failure.
+      period (int, optional): Seconds between upstream publications. Defaults to 300.
+      delay (int, optional): Seconds after each period boundary before a new price is expected. Defaults to 30.
+    """
+    self.fetch = fetch
+    self.period = period
+    self.delay = delay
+    self.value = None
+    self.expires = 0.0
+    self.hits = 0
+    self.misses = 0
+    self.fetches = 0
+    self._inflight = None
+
+  def next_expiry(self, now):
+    """
+    Get the time at which a value fetched now stops being current.
+
+    Args:
+      now (float): The current UNIX timestamp.
+
+    Returns:
+      float: The UNIX timestamp of the next expected publication.
+    """
+    return ((now - self.delay) // self.period + 1) * self.period + self.delay
+
+  async def get(self, refresh=False):
+    """
+    Get the current price from the cache, fetching it if it is missing or stale.
+
+    Args:
+      refresh (bool, optional): Bypass a cached value and fetch a new one. Defaults to False.
+
+    Returns:
+      float or None: The current price, or None if the fetch failed.
+    """
+    if not refresh and self.value is not None and time.time() < self.expires:
+      self.hits += 1
+      return self.value
+
+    self.misses += 1
+    if self._inflight is None:
+      self._inflight = asyncio.ensure_future(self._load())
+    # Shield the shared fetch so one cancelled caller does not cancel it for the others.
+    return await asyncio.shield(self._inflight)
+
+  async def _load(self):
+    """
+    Fetch the price from upstream and store it if successful.
+
+    Returns:
+      float or None: The fetched price, or None if the fetch failed.
+    """
+    self.fetches += 1
+    try:
+      value = await self.fetch()
+      if value is not None:
+        self.put(value)
+      return value
+    finally:
+      self._inflight = None
+
+  def put(self, value, expires=None):
+    """
+    Store a price as current, e.g. one fetched by another process.
+
+    Args:
+      value (float): The current price.
+      expires (float, optional): The UNIX timestamp at which it stops being current. Defaults to the next
+        expected publication.
+    """
+    self.value = value
+    self.expires = self.next_expiry(time.time()) if expires is None else expires
+
+  def stats(self):
+    """
+    Get the cache counters.
+
+    Returns:
+      dict: The number of hits, misses and upstream fetches.
+    """
+    return {'hits': self.hits, 'misses': self.misses, 'fetches': self.fetches}
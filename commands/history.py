@@ -0,0 +1,65 @@
+import discord
+from discord import app_commands
+from logger import logger
+from msg import Msg
+from utils import get_color
+
+@app_commands.command(name="history", description=Msg.CMD_DESC_HISTORY)
+@app_commands.rename(period="range")
+@app_commands.describe(period="The time range to summarize.")
+@app_commands.choices(period=[
+  app_commands.Choice(name="Hour", value="hour"),
+  app_commands.Choice(name="Day", value="day"),
+  app_commands.Choice(name="Week", value="week"),
+])
+async def history(interaction: discord.Interaction, period: app_commands.Choice[str]):
+  """
+  Show downsampled price history for a time range.
+
+  Each line of the response covers one interval of the range and shows its
+  minimum, average and maximum price.
+
+  Args:
+    interaction (discord.Interaction): The interaction object representing the command invocation.
+    period (app_commands.Choice[str]): The time range to summarize.
+  """
+  user_id = interaction.user.id
+
+  try:
+    buckets = await interaction.client.get_price_history(period.value)
+
+    if not buckets:
+      await interaction.response.send_message(Msg.HISTORY_EMPTY, ephemeral=True)
+      return
+
+    low = min(bucket[1] for bucket in buckets)
+    high = max(bucket[3] for bucket in buckets)
+    # Weight each bucket by its samples, so partial hours and gaps count for what they hold.
+    avg = sum(bucket[2] * bucket[4] for bucket in buckets) / sum(bucket[4] for bucket in buckets)
+    style = 'd' if period.value == 'week' else 't'
+    lines = [
+      Msg.HISTORY_LINE.format(start=int(start), style=style, low=b_low, avg=b_avg, high=b_high, cent=Msg.CENT_SYMBOL)
+      for start, b_low, b_avg, b_high, _ in buckets
+    ]
+
+    embed = discord.Embed(
+      title=Msg.HISTORY_TITLE.format(range=period.name),
+      description=Msg.HISTORY_SUMMARY.format(low=low, avg=avg, high=high, cent=Msg.CENT_SYMBOL) + "\n\n" + "\n".join(lines),
+      color=get_color(avg)
+    )
+    embed.set_footer(text=Msg.HISTORY_FOOTER)
+    await interaction.response.send_message(embed=embed, ephemeral=True)
+    logger.info('User %s used the "history" command.', user_id)
+  # pylint: disable=broad-except
+  except Exception as e:
+    logger.error('The "history" command failed for user %s: %s', user_id, str(e))
+    await interaction.response.send_message(Msg.CMD_ERR, ephemeral=True)
+
+def setup(bot):
+  """
+  Add the history command to the bot's command tree.
+
+  Args:
+    bot: The bot instance to add the command to.
+  """
+  bot.tree.add_command(history)
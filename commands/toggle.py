@@ -1,40 +1,70 @@
+import time
 import discord
 from discord import app_commands
 from logger import logger
 from msg import Msg
 
 @app_commands.command(name="toggle", description=Msg.CMD_DESC_TOGGLE)
-@app_commands.describe(threshold="The price threshold for alerts.")
-async def toggle(interaction: discord.Interaction, threshold: float = None):
+@app_commands.describe(
+  threshold="The price threshold for alerts.",
+  hysteresis="Only alert once the price moves this many cents past the threshold.",
+  min_interval="The minimum number of minutes between alerts."
+)
+async def toggle(
+  interaction: discord.Interaction,
+  threshold: float = None,
+  hysteresis: app_commands.Range[float, 0.0, 100.0] = None,
+  min_interval: app_commands.Range[int, 0, 1440] = None
+):
   """
   Toggle the price alert subscription for a user.
 
   This command allows users to subscribe or unsubscribe from price alerts.
-  Users can optionally set a price threshold for their alerts.
+  Users can optionally set a price threshold, a hysteresis dead band and a
+  minimum interval between alerts. Subscribed users who pass any option
+  update their settings instead of unsubscribing, and users whose alerts
+  were suspended after delivery failures have them resumed.
 
   Args:
     interaction (discord.Interaction): The interaction object representing the command invocation.
     threshold (float, optional): The price threshold for alerts. Defaults to None.
+    hysteresis (float, optional): The dead band around the threshold in cents. Defaults to None.
+    min_interval (int, optional): The minimum minutes between alerts. Defaults to None.
   """
   user_id = interaction.user.id
+  started = time.perf_counter()
+  db = interaction.client.db
+  min_interval_seconds = None if min_interval is None else min_interval * 60
 
   try:
-    subscribed_user = interaction.client.db.get_subscribed_user(user_id)
+    subscribed_user = await db.run(db.get_subscribed_user, user_id)
 
-    if subscribed_user:
-      interaction.client.db.remove_subscribed_user(user_id)
+    if subscribed_user and (threshold, hysteresis, min_interval) != (None, None, None):
+      await db.run(db.update_subscribed_user, user_id, threshold=threshold, hysteresis=hysteresis,
+                   min_interval=min_interval_seconds)
+      title = Msg.ALERTS_UPDATED_TITLE
+      description = Msg.ALERTS_UPDATED
+      color = 0x00ff00  # Green
+    elif subscribed_user and await db.run(db.reactivate_user, user_id, int(time.time())):
+      # Alerts paused after delivery failures resume instead of being turned off.
+      title = Msg.ALERTS_RESUMED_TITLE
+      description = Msg.ALERTS_RESUMED
+      color = 0x00ff00  # Green
+    elif subscribed_user:
+      await db.run(db.remove_subscribed_user, user_id)
       title = Msg.ALERTS_OFF_TITLE
       description = Msg.ALERTS_OFF
       color = 0xff0000  # Red
     else:
-      interaction.client.db.add_subscribed_user(user_id, threshold=threshold)
+      await db.run(db.add_subscribed_user, user_id, threshold=threshold, hysteresis=hysteresis or 0.0,
+                   min_interval=min_interval_seconds or 0)
       title = Msg.ALERTS_ON_TITLE
       description = Msg.ALERTS_ON
       color = 0x00ff00  # Green
 
     embed = discord.Embed(title=title, description=description, color=color)
     await interaction.response.send_message(embed=embed, ephemeral=True)
-    logger.info('User %s used the "toggle" command.', user_id)
+    logger.info('User %s used the "toggle" command in %.1f ms.', user_id, (time.perf_counter() - started) * 1000)
   # pylint: disable=broad-except
   except Exception as e:
     logger.error('The "toggle" command failed for user %s. %s', user_id, str(e))
@@ -0,0 +1,91 @@
+import time
+import discord
+from discord import app_commands
+from logger import logger
+from msg import Msg
+
+@app_commands.command(name="toggle-channel", description=Msg.CMD_DESC_TOGGLE_CHANNEL)
+@app_commands.describe(
+  channel="The channel to post alerts in. Defaults to this channel.",
+  threshold="The price threshold for alerts.",
+  role="A role to mention in each alert."
+)
+@app_commands.guild_only()
+@app_commands.default_permissions(manage_channels=True)
+async def toggle_channel(
+  interaction: discord.Interaction,
+  channel: discord.TextChannel = None,
+  threshold: float = None,
+  role: discord.Role = None
+):
+  """
+  Toggle price alert broadcasts for a guild channel.
+
+  One message per channel reaches all of its members, optionally mentioning a role.
+  Subscribed channels that are given a threshold or role update their settings
+  instead of unsubscribing. The member needs Manage Channels in the target channel,
+  which may not be the one the command was used in, and the bot needs to be able to
+  post alerts there.
+
+  Args:
+    interaction (discord.Interaction): The interaction object representing the command invocation.
+    channel (discord.TextChannel, optional): The channel to toggle. Defaults to the current channel.
+    threshold (float, optional): The price threshold for alerts. Defaults to None.
+    role (discord.Role, optional): A role to mention in each alert. Defaults to None.
+  """
+  user_id = interaction.user.id
+  started = time.perf_counter()
+  db = interaction.client.db
+  channel_id = channel.id if channel is not None else interaction.channel_id
+  role_id = role.id if role is not None else None
+  if channel is None:
+    # Discord computes both permission sets for the channel the command was used in.
+    permissions, bot_permissions = interaction.permissions, interaction.app_permissions
+  else:
+    permissions = channel.permissions_for(interaction.user)
+    bot_permissions = channel.permissions_for(interaction.guild.me)
+  if not permissions.manage_channels:
+    await interaction.response.send_message(Msg.PERM_ERR, ephemeral=True)
+    logger.warning('User %s tried to toggle alerts for channel %s without Manage Channels there.', user_id, channel_id)
+    return
+
+  try:
+    subscribed_channel = await db.run(db.get_subscribed_channel, channel_id)
+    unsubscribing = subscribed_channel is not None and (threshold, role_id) == (None, None)
+
+    if not unsubscribing and not (bot_permissions.send_messages and bot_permissions.embed_links):
+      await interaction.response.send_message(Msg.CHANNEL_SEND_ERR.format(channel=f'<#{channel_id}>'), ephemeral=True)
+      return
+    if unsubscribing:
+      await db.run(db.remove_subscribed_channel, channel_id)
+      title = Msg.ALERTS_OFF_TITLE
+      description = Msg.CHANNEL_ALERTS_OFF.format(channel=f'<#{channel_id}>')
+      color = 0xff0000  # Red
+    elif subscribed_channel:
+      await db.run(db.update_subscribed_channel, channel_id, threshold=threshold, role_id=role_id)
+      title = Msg.ALERTS_UPDATED_TITLE
+      description = Msg.CHANNEL_ALERTS_UPDATED.format(channel=f'<#{channel_id}>')
+      color = 0x00ff00  # Green
+    else:
+      await db.run(db.add_subscribed_channel, channel_id, interaction.guild_id, threshold=threshold, role_id=role_id)
+      title = Msg.ALERTS_ON_TITLE
+      description = Msg.CHANNEL_ALERTS_ON.format(channel=f'<#{channel_id}>')
+      color = 0x00ff00  # Green
+
+    embed = discord.Embed(title=title, description=description, color=color)
+    await interaction.response.send_message(embed=embed, ephemeral=True)
+    logger.info('User %s used the "toggle-channel" command for channel %s in %.1f ms.',
+                user_id, channel_id, (time.perf_counter() - started) * 1000)
+  # pylint: disable=broad-except
+  except Exception as e:
+    logger.error('The "toggle-channel" command failed for user %s. %s', user_id, str(e))
+    await interaction.response.send_message(Msg.CMD_ERR, ephemeral=True)
+
+def setup(bot):
+  """
+  Add the toggle-channel command to the bot's command tree.
+
+  Args:
+    bot: The bot instance to add the command to.
+  """
+  bot.tree.add_command(toggle_channel)
@@ -0,0 +1,330 @@
+import argparse
+import asyncio
+import os
+import signal
+import threading
+import time
+from multiprocessing import get_context
+
+import aiohttp
+import discord
+
+from bot import Bot
+from logger import logger
+from metrics import TICK_SECONDS
+from price_sources import load_price_sources
+from scheduler import PublishScheduler
+from scraper import DEFAULT_PRICE_TO_COMPARE, PriceToCompareScraper
+
+# Seconds between checks that every worker process is still running.
+WORKER_CHECK_INTERVAL = 10
+
+class WorkerBot(Bot):
+  """
+  A Bot that delivers alerts for one partition of the users with prices published by the coordinator.
+  """
+
+  def __init__(self, index, count, inbox, outbox, **options):
+    """
+    Initialize the WorkerBot.
+
+    Args:
+      index (int): The partition handled by this worker.
+      count (int): The total number of workers.
+      inbox (multiprocessing.Queue): Messages from the coordinator.
+      outbox (multiprocessing.Queue): Subscription changes owned by other workers.
+      **options: Additional options passed to discord.Client, e.g. shard_ids and shard_count.
+    """
+    super().__init__(partition=(index, count), **options)
+    self.inbox = inbox
+    self.outbox = outbox
+    self.consumer = None
+    self.stopping = asyncio.Event()
+    # Until the first published price, /check compares against the cached scrape like the coordinator does.
+    scraped = self.price_to_compare_scraper.price
+    self.price_to_compare = scraped if scraped is not None else DEFAULT_PRICE_TO_COMPARE
+    self.db.on_foreign_change = lambda kind, key, settings, removed: outbox.put((kind, key, settings, removed))
+
+  async def setup_hook(self):
+    """
+    Perform setup tasks when the worker starts.
+    """
+    self.start_services()
+    metrics_port = int(os.environ.get('METRICS_PORT', 9090))
+    await self.start_metrics(metrics_port + self.partition[0] if metrics_port else 0)
+    await self.load_commands()
+    if self.partition[0] == 0:
+      await self.sync_commands()
+    self.consumer = asyncio.create_task(self.consume())
+    self.consumer.add_done_callback(self.on_consumer_done)
+
+  def on_consumer_done(self, task):
+    """
+    Stop the worker if its consumer stopped unexpectedly, so the process exits and the coordinator restarts it
+    instead of leaving the partition connected but without alerts.
+
+    Args:
+      task (asyncio.Task): The finished consumer task.
+    """
+    if task.cancelled() or task.exception() is None:
+      return
+    logger.error("Worker %s stopped consuming prices: %s", self.partition[0], str(task.exception()))
+    self.stopping.set()
+
+  async def on_ready(self):
+    """
+    Record the gateway startup phase; alert ticks are driven by the coordinator instead of local loops.
+    """
+    logger.info('Worker %s has successfully connected as %s.', self.partition[0], {self.user.name})
+    self.mark_startup('gateway')
+
+  async def serve(self, token):
+    """
+    Connect to Discord and run until the coordinator says to stop, the consumer fails or the connection ends.
+
+    The caller closes the worker afterwards, so it is closed exactly once whichever of these happens first.
+
+    Args:
+      token (str): The Discord bot token.
+    """
+    gateway = asyncio.create_task(self.start(token))
+    stopping = asyncio.create_task(self.stopping.wait())
+    await asyncio.wait((gateway, stopping), return_when=asyncio.FIRST_COMPLETED)
+    stopping.cancel()
+    if gateway.done():
+      gateway.result()
+
+  def read_inbox(self, loop, messages):
+    """
+    Forward messages from the coordinator to the event loop until a None is received.
+
+    This blocks on the queue, so it runs on a daemon thread rather than the default executor,
+    which asyncio.run would wait for at shutdown even after the worker has stopped.
+
+    Args:
+      loop (asyncio.AbstractEventLoop): The worker's event loop.
+      messages (asyncio.Queue): The queue consume() reads from.
+    """
+    while True:
+      message = self.inbox.get()
+      try:
+        loop.call_soon_threadsafe(messages.put_nowait, message)
+      except RuntimeError:
+        # The event loop has closed; the process is exiting.
+        return
+      if message is None:
+        return
+
+  async def consume(self):
+    """
+    Process prices and subscription changes published by the coordinator.
+    """
+    messages = asyncio.Queue()
+    reader = threading.Thread(target=self.read_inbox, args=(asyncio.get_running_loop(), messages),
+                              name='inbox-reader', daemon=True)
+    reader.start()
+    try:
+      await self.run_tick(self.resume_outbox())
+    # pylint: disable=broad-except
+    except Exception as e:
+      logger.error("Worker %s failed to resume pending alerts: %s", self.partition[0], str(e))
+    while True:
+      message = await messages.get()
+      if message is None:
+        # Stop cleanly so the process exits normally and flushes its queued logs.
+        self.stopping.set()
+        return
+      kind, *payload = message
+      try:
+        if kind == 'price':
+          price, self.price_to_compare = payload
+          # Serve /check from the published price instead of each worker polling the sources itself. The
+          # coordinator polls at least once a period, so the price stays current until the next one arrives.
+          self.price_cache.put(price, time.time() + self.price_cache.period)
+          with TICK_SECONDS.time():
+            await self.run_tick(self.process_price(price))
+        elif kind == 'subscription':
+          await self.db.run(self.db.apply_index_change, *payload)
+      # pylint: disable=broad-except
+      except Exception as e:
+        logger.error("Worker %s failed to process a %s message: %s", self.partition[0], kind, str(e))
+
+def run_worker(index, count, inbox, outbox, token, shard_ids, shard_count):
+  """
+  Run a worker process until it is stopped.
+
+  Args:
+    index (int): The partition handled by this worker.
+    count (int): The total number of workers.
+    inbox (multiprocessing.Queue): Messages from the coordinator.
+    outbox (multiprocessing.Queue): Subscription changes owned by other workers.
+    token (str): The Discord bot token.
+    shard_ids (list or None): Gateway shards for an auto-sharded worker, or None for a single shard.
+    shard_count (int): The total number of gateway shards.
+  """
+  signal.signal(signal.SIGINT, signal.SIG_IGN)
+  if shard_ids is not None:
+    worker_class = type('AutoShardedWorkerBot', (WorkerBot, discord.AutoShardedClient), {})
+    worker = worker_class(index, count, inbox, outbox, shard_ids=shard_ids, shard_count=shard_count)
+  else:
+    worker = WorkerBot(index, count, inbox, outbox, shard_id=index, shard_count=count)
+
+  async def run():
+    try:
+      await worker.serve(token)
+    # pylint: disable=broad-except
+    except Exception as e:
+      logger.error("Worker %s stopped: %s", index, str(e))
+    finally:
+      await worker.close()
+
+  asyncio.run(run())
+
+class Coordinator:
+  """
+  Poll the price when the scheduler expects a publication and publish it to every worker process.
+  """
+
+  def __init__(self, inboxes, outbox, processes, start_worker):
+    """
+    Initialize the Coordinator.
+
+    Args:
+      inboxes (list): One multiprocessing.Queue per worker.
+      outbox (multiprocessing.Queue): Subscription changes reported by the workers.
+      processes (list): The worker processes, indexed by partition. Restarted workers replace their entry.
+      start_worker (callable): Called as start_worker(index) to start a worker process and return it.
+    """
+    self.inboxes = inboxes
+    self.outbox = outbox
+    self.processes = processes
+    self.start_worker = start_worker
+    self.scheduler = PublishScheduler()
+    self.last_price = None
+    self.price_sources = load_price_sources()
+    self.scraper = PriceToCompareScraper(
+      os.environ.get(
+        'PRICE_TO_COMPARE_URL',
+        "https://plugin.illinois.gov/understanding-the-price-to-compare/price-to-compare-comed.html"
+      ),
+      'data/price_to_compare.json'
+    )
+    self.price_to_compare = self.scraper.price if self.scraper.price is not None else DEFAULT_PRICE_TO_COMPARE
+
+  def publish(self, message):
+    """
+    Send a message to every worker.
+
+    Args:
+      message (tuple): The message to send.
+    """
+    for inbox in self.inboxes:
+      inbox.put(message)
+
+  def route_subscriptions(self):
+    """
+    Forward subscription changes to the worker that owns each user or channel until a None is received.
+
+    This blocks on the queue, so it runs on a daemon thread rather than the default executor,
+    which asyncio.run would wait for at shutdown.
+    """
+    while True:
+      change = self.outbox.get()
+      if change is None:
+        return
+      kind, key = change[:2]
+      # Users are partitioned by ID; channel broadcasts all belong to the first worker.
+      owner = key % len(self.inboxes) if kind == 'user' else 0
+      self.inboxes[owner].put(('subscription', *change))
+
+  async def supervise_workers(self):
+    """
+    Restart worker processes that have exited, until cancelled.
+
+    A restarted worker reads the messages queued while it was down and resumes its pending alerts.
+    """
+    while True:
+      await asyncio.sleep(WORKER_CHECK_INTERVAL)
+      for index, process in enumerate(self.processes):
+        if not process.is_alive():
+          logger.error("Worker %s exited with code %s; restarting it", index, process.exitcode)
+          self.processes[index] = self.start_worker(index)
+
+  async def run(self):
+    """
+    Poll the price and publish it to the workers until cancelled.
+    """
+    # Container runtimes stop with SIGTERM; treat it like Ctrl+C so the workers are told to drain and exit.
+    asyncio.get_running_loop().add_signal_handler(signal.SIGTERM, asyncio.current_task().cancel)
+    router = threading.Thread(target=self.route_subscriptions, name='subscription-router', daemon=True)
+    router.start()
+    supervisor = asyncio.create_task(self.supervise_workers())
+    timeout = aiohttp.ClientTimeout(total=20, connect=5, sock_read=10)
+    connector = aiohttp.TCPConnector(limit=4, ttl_dns_cache=300, keepalive_timeout=60)
+    async with aiohttp.ClientSession(connector=connector, timeout=timeout) as session:
+      next_scrape = 0
+      try:
+        while True:
+          # Refresh the comparison price weekly, matching the single-process bot.
+          if time.time() >= next_scrape:
+            price_to_compare = await self.scraper.fetch(session)
+            if price_to_compare is not None:
+              self.price_to_compare = price_to_compare
+            next_scrape = time.time() + 604800
+          price = await self.price_sources.fetch(session)
+          if price is None:
+            outcome = 'failed'
+          else:
+            outcome = 'unchanged' if price == self.last_price else 'changed'
+            self.last_price = price
+            self.publish(('price', price, self.price_to_compare))
+          await asyncio.sleep(self.scheduler.next_delay(time.time(), outcome))
+      finally:
+        supervisor.cancel()
+        self.outbox.put(None)
+        await asyncio.get_running_loop().run_in_executor(None, router.join, 5)
+        await self.price_sources.close()
+
+def main():
+  """
+  Start the worker processes and run the price coordinator.
+  """
+  parser = argparse.ArgumentParser(description="Run the bot as a price coordinator with sharded alert workers.")
+  parser.add_argument('--workers', type=int, default=os.cpu_count() or 1)
+  parser.add_argument('--auto-shard', action='store_true',
+                      help="Run each worker as an auto-sharded client over a share of --shard-count shards.")
+  parser.add_argument('--shard-count', type=int, help="Total gateway shards when auto-sharding. Defaults to --workers.")
+  args = parser.parse_args()
+
+  token = os.environ.get('DISCORD_BOT_TOKEN')
+  if not token:
+    raise ValueError("No token found. Set the DISCORD_BOT_TOKEN environment variable.")
+
+  context = get_context('spawn')
+  inboxes = [context.Queue() for _ in range(args.workers)]
+  outbox = context.Queue()
+  shard_count = args.shard_count or args.workers
+
+  def start_worker(index):
+    shard_ids = list(range(index, shard_count, args.workers)) if args.auto_shard else None
+    process = context.Process(target=run_worker, name=f'alert-worker-{index}',
+                              args=(index, args.workers, inboxes[index], outbox, token, shard_ids, shard_count))
+    process.start()
+    return process
+
+  processes = [start_worker(index) for index in range(args.workers)]
+  try:
+    asyncio.run(Coordinator(inboxes, outbox, processes, start_worker).run())
+  except (asyncio.CancelledError, KeyboardInterrupt):
+    pass
+  finally:
+    for inbox in inboxes:
+      inbox.put(None)
+    for process in processes:
+      process.join(timeout=30)
+      if process.is_alive():
+        process.terminate()
+        process.join()
+
+if __name__ == "__main__":
+  main()
@@ -1,70 +1,267 @@
+import asyncio
+import functools
+import heapq
+import json
 import sqlite3
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from logger import logger
+from metrics import ALERTS_SUPPRESSED, DB_QUERY_SECONDS, timed
+from migrations import migrate
+from threshold_index import ThresholdIndex
+
+# Undeliverable users are suspended for an hour, doubling with each further failure up to 30 days.
+SUSPEND_BASE = 3600
+SUSPEND_MAX = 30 * 86400
+# Outbox entries are kept for a day after their tick, for looking into deliveries.
+OUTBOX_RETENTION = 86400
 
 class Database:
   """
-  A class to handle database operations for subscribed users.
+  A class to handle database operations for subscribed users and channels.
+
+  A single persistent connection in WAL mode is shared by every query. The methods are
+  synchronous; async code should await them through run() so that disk I/O happens on
+  the database executor thread instead of the event loop.
   """
 
-  def __init__(self, db_path):
+  def __init__(self, db_path, partition=None):
     """
     Initialize the Database object.
 
     Args:
       db_path (str): The path to the SQLite database file.
+      partition (tuple, optional): A tuple (index, count); only users with user_id % count == index
+        are loaded into the threshold index. Defaults to None, which loads every user.
     """
     self.db_path = db_path
+    self.partition = partition
+    self.on_foreign_change = None
+    self.threshold_index = ThresholdIndex()
+    self.channel_index = ThresholdIndex()
+    self.channel_roles = {}
+    # Other processes may share the file in sharded mode, so wait on locks instead of failing.
+    self.conn = sqlite3.connect(db_path, check_same_thread=False, cached_statements=256, timeout=30)
+    self.conn.execute('PRAGMA journal_mode=WAL')
+    self.conn.execute('PRAGMA synchronous=NORMAL')
+    self._lock = threading.Lock()
+    self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='database')
     self.init_db()
+    now = int(time.time())
+    self.suspended = self.load_suspended(now)
+    self._suspension_heap = [(until, user_id) for user_id, until in self.suspended.items()]
+    heapq.heapify(self._suspension_heap)
+    self.threshold_index.load(self.get_alert_settings(now))
+    self.notified = self.load_notified()
+    self.last_alerted = self.load_last_alerted()
+    self.channel_notified = {}
+    self.suspended_channels = {}
+    if self.owns_channels():
+      self.load_channels(now)
+
+  async def run(self, method, *args, **kwargs):
+    """
+    Run a database method on the database executor thread.
+
+    Args:
+      method (callable): The synchronous method to run, e.g. db.get_subscribed_user.
+      *args: Positional arguments passed to the method.
+      **kwargs: Keyword arguments passed to the method.
+
+    Returns:
+      The method's return value.
+    """
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(self._executor, functools.partial(method, *args, **kwargs))
+
+  def close(self):
+    """
+    Wait for pending queries to finish and close the connection.
+    """
+    self._executor.shutdown(wait=True)
+    with self._lock:
+      self.conn.close()
 
   def init_db(self):
     """
-    Initialize the database by creating the necessary table if it doesn't exist.
+    Bring the database schema up to date by applying any pending migrations.
+    """
+    with self._lock:
+      applied = migrate(self.conn)
+    if applied:
+      logger.info("Migrated the database schema to version %s", applied[-1])
+
+  @timed(DB_QUERY_SECONDS, 'get_state')
+  def get_state(self, key):
+    """
+    Get a persisted bot state value.
+
+    Args:
+      key (str): The state key.
+
+    Returns:
+      The stored value, or None if it has not been set.
+    """
+    with self._lock:
+      result = self.conn.execute('SELECT value FROM bot_state WHERE key = ?', (key,)).fetchone()
+      return result[0] if result else None
+
+  @timed(DB_QUERY_SECONDS, 'set_state')
+  def set_state(self, key, value):
+    """
+    Persist a bot state value.
+
+    Args:
+      key (str): The state key.
+      value: The value to store.
+    """
+    with self._lock, self.conn:
+      self.conn.execute('INSERT OR REPLACE INTO bot_state (key, value) VALUES (?, ?)', (key, value))
+
+  def owns(self, user_id):
     """
-    with sqlite3.connect(self.db_path) as conn:
-      cursor = conn.cursor()
-      cursor.execute(
-        '''CREATE TABLE IF NOT EXISTS subscribed_users
-                    (user_id INTEGER PRIMARY KEY,
-                     threshold REAL)
-        ''')
-      conn.commit()
+    Check whether a user belongs to this database's partition.
 
+    Args:
+      user_id (int): The ID of the user.
+
+    Returns:
+      bool: True if the user's alerts are handled by this process.
+    """
+    return self.partition is None or user_id % self.partition[1] == self.partition[0]
+
+  def owns_channels(self):
+    """
+    Check whether channel broadcasts are handled by this database's partition.
+
+    Channels are few, so the first partition delivers all of them.
+
+    Returns:
+      bool: True if channel alerts are handled by this process.
+    """
+    return self.partition is None or self.partition[0] == 0
+
+  def _partition_filter(self):
+    """
+    Get the SQL condition and parameters restricting queries to this partition.
+
+    Returns:
+      tuple: A tuple (sql, params) where sql is empty when not partitioned.
+    """
+    if self.partition is None:
+      return '', ()
+    return ' AND user_id % ? = ?', (self.partition[1], self.partition[0])
+
+  @timed(DB_QUERY_SECONDS, 'get_subscribed_users')
   def get_subscribed_users(self):
     """
-    Retrieve all subscribed user IDs from the database.
+    Retrieve all subscribed user IDs in this partition from the database.
 
     Returns:
       list: A list of tuples (user_id, threshold) of subscribed users.
     """
-    with sqlite3.connect(self.db_path) as conn:
-      cursor = conn.cursor()
-      cursor.execute('SELECT user_id, threshold FROM subscribed_users')
-      return cursor.fetchall()
-    
+    condition, params = self._partition_filter()
+    with self._lock:
+      return self.conn.execute(f'SELECT user_id, threshold FROM subscribed_users WHERE 1{condition}', params).fetchall()
+
+  @timed(DB_QUERY_SECONDS, 'get_alert_settings')
+  def get_alert_settings(self, now):
+    """
+    Retrieve the alert settings of every subscribed user in this partition who is not suspended.
+
+    Args:
+      now (int): The current UNIX timestamp.
+
+    Returns:
+      list: A list of tuples (user_id, threshold, hysteresis, min_interval).
+    """
+    condition, params = self._partition_filter()
+    with self._lock:
+      return self.conn.execute(
+        'SELECT user_id, threshold, hysteresis, min_interval FROM subscribed_users '
+        f'WHERE (suspended_until IS NULL OR suspended_until <= ?){condition}', (now, *params)).fetchall()
+
+  def load_suspended(self, now):
+    """
+    Load the users in this partition whose alerts are suspended.
+
+    Args:
+      now (int): The current UNIX timestamp.
+
+    Returns:
+      dict: A mapping of user_id to the UNIX timestamp their suspension ends.
+    """
+    condition, params = self._partition_filter()
+    with self._lock:
+      cursor = self.conn.execute(
+        f'SELECT user_id, suspended_until FROM subscribed_users WHERE suspended_until > ?{condition}', (now, *params))
+      return dict(cursor.fetchall())
+
+  @timed(DB_QUERY_SECONDS, 'get_subscribed_user')
   def get_subscribed_user(self, user_id):
     """
-    Retrieve all subscribed user IDs from the database.
+    Retrieve a single subscribed user from the database.
+
+    Args:
+      user_id (int): The ID of the user.
 
     Returns:
-      list: A list of tuples (user_id, threshold) of subscribed users.
+      tuple or None: A tuple (user_id, threshold) if the user is subscribed, otherwise None.
     """
-    with sqlite3.connect(self.db_path) as conn:
-      cursor = conn.cursor()
-      cursor.execute('SELECT user_id, threshold FROM subscribed_users WHERE user_id = ?', (user_id,))
+    with self._lock:
+      cursor = self.conn.execute('SELECT user_id, threshold FROM subscribed_users WHERE user_id = ?', (user_id,))
       return cursor.fetchone()
 
-  def add_subscribed_user(self, user_id, threshold=None):
+  @timed(DB_QUERY_SECONDS, 'add_subscribed_user')
+  def add_subscribed_user(self, user_id, threshold=None, hysteresis=0.0, min_interval=0):
     """
     Add a new user to the subscribed users list.
 
     Args:
       user_id (int): The ID of the user to be added.
       threshold (float, optional): The price threshold for alerts. Defaults to None.
+      hysteresis (float, optional): The dead band around the threshold. Defaults to 0.0.
+      min_interval (int, optional): The minimum seconds between alerts. Defaults to 0.
+    """
+    with self._lock:
+      with self.conn:
+        cursor = self.conn.execute(
+          'INSERT OR IGNORE INTO subscribed_users (user_id, threshold, hysteresis, min_interval) VALUES (?, ?, ?, ?)',
+          (user_id, threshold, hysteresis, min_interval))
+      if cursor.rowcount:
+        self._index_change('user', user_id, (threshold, hysteresis, min_interval, None), False)
+
+  @timed(DB_QUERY_SECONDS, 'update_subscribed_user')
+  def update_subscribed_user(self, user_id, threshold=None, hysteresis=None, min_interval=None):
+    """
+    Change the alert settings of a subscribed user, keeping any setting that is not given.
+
+    Changing settings also lifts a delivery suspension.
+
+    Args:
+      user_id (int): The ID of the user.
+      threshold (float, optional): The new price threshold. Defaults to None.
+      hysteresis (float, optional): The new dead band around the threshold. Defaults to None.
+      min_interval (int, optional): The new minimum seconds between alerts. Defaults to None.
     """
-    with sqlite3.connect(self.db_path) as conn:
-      cursor = conn.cursor()
-      cursor.execute('INSERT OR IGNORE INTO subscribed_users (user_id, threshold) VALUES (?, ?)', (user_id, threshold))
-      conn.commit()
+    with self._lock:
+      with self.conn:
+        self.conn.execute(
+          '''UPDATE subscribed_users SET threshold = COALESCE(?, threshold),
+                                         hysteresis = COALESCE(?, hysteresis),
+                                         min_interval = COALESCE(?, min_interval),
+                                         failure_count = 0, suspended_until = NULL
+             WHERE user_id = ?
+          ''', (threshold, hysteresis, min_interval, user_id))
+        settings = self.conn.execute(
+          'SELECT threshold, hysteresis, min_interval, last_alert_at FROM subscribed_users WHERE user_id = ?',
+          (user_id,)).fetchone()
+      if settings is not None:
+        self._index_change('user', user_id, settings, False)
 
+  @timed(DB_QUERY_SECONDS, 'remove_subscribed_user')
   def remove_subscribed_user(self, user_id):
     """
     Remove a user from the subscribed users list.
@@ -72,11 +269,67 @@ class Database:
     Args:
       user_id (int): The ID of the user to be removed.
     """
-    with sqlite3.connect(self.db_path) as conn:
-      cursor = conn.cursor()
-      cursor.execute('DELETE FROM subscribed_users WHERE user_id = ?', (user_id,))
-      conn.commit()
+    with self._lock:
+      with self.conn:
+        self.conn.execute('DELETE FROM subscribed_users WHERE user_id = ?', (user_id,))
+      self._index_change('user', user_id, None, True)
+
+  def _index_change(self, kind, key, settings, removed):
+    """
+    Apply a subscription change to the matching index, or forward it to the owning partition.
+
+    Must be called with the lock held.
+
+    Args:
+      kind (str): 'user' or 'channel'.
+      key (int): The ID of the user or channel.
+      settings (tuple or None): The new settings, as passed to _user_change or _channel_change.
+      removed (bool): Whether the subscription was removed.
+    """
+    owned = self.owns(key) if kind == 'user' else self.owns_channels()
+    if not owned:
+      if self.on_foreign_change is not None:
+        self.on_foreign_change(kind, key, settings, removed)
+    elif kind == 'user':
+      self._user_change(key, settings, removed)
+    else:
+      self._channel_change(key, settings, removed)
+
+  def _user_change(self, user_id, settings, removed):
+    """
+    Apply a user subscription change to the threshold index.
 
+    Args:
+      user_id (int): The ID of the user.
+      settings (tuple or None): The user's (threshold, hysteresis, min_interval, last_alert_at).
+      removed (bool): Whether the user unsubscribed.
+    """
+    # Both removing and re-adding a user end any suspension; stale heap entries are skipped later.
+    self.suspended.pop(user_id, None)
+    if removed:
+      self.threshold_index.remove(user_id)
+      self.notified.pop(user_id, None)
+      self.last_alerted.pop(user_id, None)
+      return
+    threshold, hysteresis, min_interval, last_alert_at = settings
+    self.threshold_index.add(user_id, threshold, hysteresis, min_interval)
+    if min_interval and last_alert_at is not None:
+      self.last_alerted[user_id] = last_alert_at
+
+  def apply_index_change(self, kind, key, settings, removed):
+    """
+    Apply a subscription change made by another partition to the matching index.
+
+    Args:
+      kind (str): 'user' or 'channel'.
+      key (int): The ID of the user or channel.
+      settings (tuple or None): The new settings.
+      removed (bool): Whether the subscription was removed.
+    """
+    with self._lock:
+      self._index_change(kind, key, settings, removed)
+
+  @timed(DB_QUERY_SECONDS, 'get_user_threshold')
   def get_user_threshold(self, user_id):
     """
     Get the threshold for a specific user.
@@ -87,8 +340,516 @@ class Database:
     Returns:
       float or None: The user's threshold if set, otherwise None.
     """
-    with sqlite3.connect(self.db_path) as conn:
-      cursor = conn.cursor()
-      cursor.execute('SELECT threshold FROM subscribed_users WHERE user_id = ?', (user_id,))
-      result = cursor.fetchone()
+    with self._lock:
+      result = self.conn.execute('SELECT threshold FROM subscribed_users WHERE user_id = ?', (user_id,)).fetchone()
       return result[0] if result else None
+
+  @timed(DB_QUERY_SECONDS, 'get_crossed_users')
+  def get_crossed_users(self, last_price, current_price, default_threshold):
+    """
+    Get the subscribed users whose threshold was crossed between two prices.
+
+    Args:
+      last_price (float): The previously observed price.
+      current_price (float): The newly observed price.
+      default_threshold (float): The threshold used for users without one.
+
+    Returns:
+      list: A list of tuples (user_id, threshold) of users to alert.
+    """
+    with self._lock:
+      return self.threshold_index.crossed(last_price, current_price, default_threshold)
+
+  def load_notified(self):
+    """
+    Load the last alert each user was sent.
+
+    Returns:
+      dict: A mapping of user_id to a tuple (threshold, above) for notified users.
+    """
+    condition, params = self._partition_filter()
+    with self._lock:
+      cursor = self.conn.execute(
+        'SELECT user_id, notified_threshold, notified_above FROM subscribed_users '
+        f'WHERE notified_above IS NOT NULL{condition}', params)
+      return {user_id: (threshold, bool(above)) for user_id, threshold, above in cursor}
+
+  def load_last_alerted(self):
+    """
+    Load when users with a minimum alert interval were last alerted.
+
+    Returns:
+      dict: A mapping of user_id to the UNIX timestamp of their last alert.
+    """
+    condition, params = self._partition_filter()
+    with self._lock:
+      cursor = self.conn.execute(
+        'SELECT user_id, last_alert_at FROM subscribed_users '
+        f'WHERE min_interval > 0 AND last_alert_at IS NOT NULL{condition}', params)
+      return dict(cursor.fetchall())
+
+  def filter_notified(self, users, price, now):
+    """
+    Drop users whose last alert already reported the price on the same side of the same threshold,
+    or who were alerted more recently than their minimum interval allows.
+
+    Args:
+      users (list): Tuples of (user_id, threshold) to alert.
+      price (float): The current price.
+      now (int): The current UNIX timestamp.
+
+    Returns:
+      list: The tuples (user_id, threshold) that still need an alert.
+    """
+    fresh = [(user_id, threshold) for user_id, threshold in users
+             if self.notified.get(user_id) != (threshold, price > threshold)]
+    # Only the crossed users are checked, so the interval costs nothing for everyone else.
+    allowed = [(user_id, threshold) for user_id, threshold in fresh
+               if now - self.last_alerted.get(user_id, 0) >= self.threshold_index.min_interval(user_id)]
+    if len(fresh) < len(users):
+      ALERTS_SUPPRESSED.inc(len(users) - len(fresh), labels=('duplicate',))
+    if len(allowed) < len(fresh):
+      ALERTS_SUPPRESSED.inc(len(fresh) - len(allowed), labels=('min_interval',))
+    return allowed
+
+  @timed(DB_QUERY_SECONDS, 'mark_delivered')
+  def mark_delivered(self, alerts, now):
+    """
+    Record delivered alerts in the outbox and as their recipients' last alert, in one transaction.
+
+    Because both are written together, an alert resumed after a crash is never one the
+    recipient already received, and a delivered alert always counts for deduplication.
+
+    Args:
+      alerts (list): Tuples of (tick, kind, target_id, threshold, price) that were delivered.
+      now (int): The current UNIX timestamp.
+    """
+    users = [(threshold, price > threshold, tick, target_id)
+             for tick, kind, target_id, threshold, price in alerts if kind == 'user']
+    channels = [(threshold, price > threshold, target_id)
+                for _, kind, target_id, threshold, price in alerts if kind == 'channel']
+    with self._lock:
+      with self.conn:
+        self.conn.executemany(
+          '''UPDATE alert_outbox SET outcome = 'delivered', completed_at = ?
+             WHERE tick = ? AND kind = ? AND target_id = ?
+          ''', [(now, tick, kind, target_id) for tick, kind, target_id, _, _ in alerts])
+        self.conn.executemany(
+          '''UPDATE subscribed_users SET notified_threshold = ?, notified_above = ?, last_alert_at = ?,
+                                         failure_count = 0, last_error = NULL
+             WHERE user_id = ?
+          ''', users)
+        self.conn.executemany(
+          '''UPDATE subscribed_channels SET notified_threshold = ?, notified_above = ?, failure_count = 0, last_error = NULL
+             WHERE channel_id = ?
+          ''', channels)
+      for threshold, above, tick, user_id in users:
+        self.notified[user_id] = (threshold, above)
+        if self.threshold_index.min_interval(user_id):
+          self.last_alerted[user_id] = tick
+      for threshold, above, channel_id in channels:
+        self.channel_notified[channel_id] = (threshold, above)
+
+  @timed(DB_QUERY_SECONDS, 'get_dm_channels')
+  def get_dm_channels(self, user_ids):
+    """
+    Get the stored DM channel IDs of users.
+
+    Args:
+      user_ids (list): The IDs of the users.
+
+    Returns:
+      dict: A mapping of user_id to DM channel ID for the users that have one stored.
+    """
+    with self._lock:
+      # One query for the whole list; json_each avoids SQLite's limit on bound parameters.
+      return dict(self.conn.execute(
+        '''SELECT user_id, dm_channel_id FROM subscribed_users
+           WHERE user_id IN (SELECT value FROM json_each(?)) AND dm_channel_id IS NOT NULL
+        ''', (json.dumps(user_ids),)))
+
+  @timed(DB_QUERY_SECONDS, 'set_dm_channels')
+  def set_dm_channels(self, channels):
+    """
+    Store resolved DM channel IDs.
+
+    Args:
+      channels (list): Tuples of (dm_channel_id, user_id).
+    """
+    with self._lock:
+      with self.conn:
+        self.conn.executemany('UPDATE subscribed_users SET dm_channel_id = ? WHERE user_id = ?', channels)
+
+  @timed(DB_QUERY_SECONDS, 'record_delivery_failures')
+  def record_delivery_failures(self, failures, now):
+    """
+    Suspend users whose alerts could not be delivered, with exponential backoff.
+
+    Suspended users are removed from the threshold index, so the fan-out skips them
+    without checking each row, until the suspension ends or they use a command. Their
+    stored DM channel is forgotten, so the next attempt resolves it again.
+
+    Args:
+      failures (list): Tuples of (user_id, error) for undeliverable users.
+      now (int): The current UNIX timestamp.
+
+    Returns:
+      list: Tuples of (user_id, suspended_until) for the suspended users.
+    """
+    suspended = []
+    with self._lock:
+      with self.conn:
+        for user_id, error in failures:
+          row = self.conn.execute(
+            '''UPDATE subscribed_users SET failure_count = failure_count + 1, last_error = ?,
+                                           suspended_until = ? + MIN(?, ? << MIN(failure_count, 20)),
+                                           dm_channel_id = NULL
+               WHERE user_id = ? RETURNING suspended_until
+            ''', (error, now, SUSPEND_MAX, SUSPEND_BASE, user_id)).fetchone()
+          if row is not None:
+            suspended.append((user_id, row[0]))
+      for user_id, until in suspended:
+        self.threshold_index.remove(user_id)
+        self.suspended[user_id] = until
+        heapq.heappush(self._suspension_heap, (until, user_id))
+    return suspended
+
+  @timed(DB_QUERY_SECONDS, 'record_channel_failures')
+  def record_channel_failures(self, failures, now):
+    """
+    Suspend channels whose alerts could not be delivered, such as deleted channels or ones the
+    bot can no longer post in, with the same exponential backoff as users.
+
+    Args:
+      failures (list): Tuples of (channel_id, error) for undeliverable channels.
+      now (int): The current UNIX timestamp.
+
+    Returns:
+      list: Tuples of (channel_id, suspended_until) for the suspended channels.
+    """
+    suspended = []
+    with self._lock:
+      with self.conn:
+        for channel_id, error in failures:
+          row = self.conn.execute(
+            '''UPDATE subscribed_channels SET failure_count = failure_count + 1, last_error = ?,
+                                              suspended_until = ? + MIN(?, ? << MIN(failure_count, 20))
+               WHERE channel_id = ? RETURNING suspended_until
+            ''', (error, now, SUSPEND_MAX, SUSPEND_BASE, channel_id)).fetchone()
+          if row is not None:
+            suspended.append((channel_id, row[0]))
+      for channel_id, until in suspended:
+        self.channel_index.remove(channel_id)
+        self.suspended_channels[channel_id] = until
+    return suspended
+
+  @timed(DB_QUERY_SECONDS, 'resume_expired_suspensions')
+  def resume_expired_suspensions(self, now):
+    """
+    Put users and channels whose suspension has ended back into their index for another attempt.
+
+    Their failure count is kept, so another failure suspends them for twice as long.
+
+    Args:
+      now (int): The current UNIX timestamp.
+
+    Returns:
+      int: The number of users and channels resumed.
+    """
+    with self._lock:
+      expired = []
+      while self._suspension_heap and self._suspension_heap[0][0] <= now:
+        until, user_id = heapq.heappop(self._suspension_heap)
+        # Entries for users who were reactivated or suspended again since are stale.
+        if self.suspended.get(user_id) == until:
+          expired.append(user_id)
+      for user_id in expired:
+        settings = self.conn.execute(
+          'SELECT threshold, hysteresis, min_interval, last_alert_at FROM subscribed_users WHERE user_id = ?',
+          (user_id,)).fetchone()
+        self.suspended.pop(user_id, None)
+        if settings is not None:
+          self._user_change(user_id, settings, False)
+      # Only the few channels of the owning process are tracked, so they are scanned instead of kept in a heap.
+      expired_channels = [channel_id for channel_id, until in self.suspended_channels.items() if until <= now]
+      for channel_id in expired_channels:
+        settings = self.conn.execute(
+          'SELECT threshold, role_id FROM subscribed_channels WHERE channel_id = ?', (channel_id,)).fetchone()
+        self.suspended_channels.pop(channel_id, None)
+        if settings is not None:
+          self._channel_change(channel_id, settings, False)
+      return len(expired) + len(expired_channels)
+
+  def is_suspended(self, user_id):
+    """
+    Check whether a user might be suspended, without touching the database.
+
+    Users owned by another partition are not tracked here, so they always count as possibly suspended.
+
+    Args:
+      user_id (int): The ID of the user.
+
+    Returns:
+      bool: False if the user is known not to be suspended.
+    """
+    return user_id in self.suspended or not self.owns(user_id)
+
+  @timed(DB_QUERY_SECONDS, 'reactivate_user')
+  def reactivate_user(self, user_id, now):
+    """
+    Lift a user's delivery suspension and reset their failure count.
+
+    Args:
+      user_id (int): The ID of the user.
+      now (int): The current UNIX timestamp.
+
+    Returns:
+      bool: True if the user was suspended.
+    """
+    with self._lock:
+      with self.conn:
+        settings = self.conn.execute(
+          '''UPDATE subscribed_users SET failure_count = 0, last_error = NULL, suspended_until = NULL
+             WHERE user_id = ? AND suspended_until > ?
+             RETURNING threshold, hysteresis, min_interval, last_alert_at
+          ''', (user_id, now)).fetchone()
+      if settings is None:
+        return False
+      self._index_change('user', user_id, settings, False)
+      return True
+
+  def load_channels(self, now):
+    """
+    Load the subscribed channels into the channel index, role map, notified state and suspensions.
+
+    Channels that are suspended are left out of the channel index until their suspension ends.
+
+    Args:
+      now (int): The current UNIX timestamp.
+    """
+    with self._lock:
+      rows = self.conn.execute(
+        '''SELECT channel_id, threshold, role_id, notified_threshold, notified_above, suspended_until
+           FROM subscribed_channels
+        ''').fetchall()
+    self.suspended_channels = {channel_id: until for channel_id, _, _, _, _, until in rows
+                               if until is not None and until > now}
+    self.channel_index.load((channel_id, threshold, 0.0, 0) for channel_id, threshold, _, _, _, _ in rows
+                            if channel_id not in self.suspended_channels)
+    self.channel_roles = {channel_id: role_id for channel_id, _, role_id, _, _, _ in rows if role_id is not None}
+    self.channel_notified = {channel_id: (threshold, bool(above))
+                             for channel_id, _, _, threshold, above, _ in rows if above is not None}
+
+  @timed(DB_QUERY_SECONDS, 'get_subscribed_channel')
+  def get_subscribed_channel(self, channel_id):
+    """
+    Retrieve a single subscribed channel from the database.
+
+    Args:
+      channel_id (int): The ID of the channel.
+
+    Returns:
+      tuple or None: A tuple (channel_id, guild_id, threshold, role_id) if the channel is subscribed, otherwise None.
+    """
+    with self._lock:
+      return self.conn.execute(
+        'SELECT channel_id, guild_id, threshold, role_id FROM subscribed_channels WHERE channel_id = ?',
+        (channel_id,)).fetchone()
+
+  @timed(DB_QUERY_SECONDS, 'add_subscribed_channel')
+  def add_subscribed_channel(self, channel_id, guild_id, threshold=None, role_id=None):
+    """
+    Subscribe a guild channel to broadcast alerts.
+
+    Args:
+      channel_id (int): The ID of the channel.
+      guild_id (int): The ID of the guild the channel belongs to.
+      threshold (float, optional): The price threshold for alerts. Defaults to None.
+      role_id (int, optional): A role to mention in each alert. Defaults to None.
+    """
+    with self._lock:
+      with self.conn:
+        cursor = self.conn.execute(
+          'INSERT OR IGNORE INTO subscribed_channels (channel_id, guild_id, threshold, role_id) VALUES (?, ?, ?, ?)',
+          (channel_id, guild_id, threshold, role_id))
+      if cursor.rowcount:
+        self._index_change('channel', channel_id, (threshold, role_id), False)
+
+  @timed(DB_QUERY_SECONDS, 'update_subscribed_channel')
+  def update_subscribed_channel(self, channel_id, threshold=None, role_id=None):
+    """
+    Change the settings of a subscribed channel, keeping any setting that is not given.
+
+    Changing the settings also lifts a delivery suspension, so the channel is retried on the next crossing.
+
+    Args:
+      channel_id (int): The ID of the channel.
+      threshold (float, optional): The new price threshold. Defaults to None.
+      role_id (int, optional): The new role to mention. Defaults to None.
+    """
+    with self._lock:
+      with self.conn:
+        self.conn.execute(
+          '''UPDATE subscribed_channels SET threshold = COALESCE(?, threshold), role_id = COALESCE(?, role_id),
+                                            failure_count = 0, last_error = NULL, suspended_until = NULL
+             WHERE channel_id = ?
+          ''', (threshold, role_id, channel_id))
+        settings = self.conn.execute(
+          'SELECT threshold, role_id FROM subscribed_channels WHERE channel_id = ?', (channel_id,)).fetchone()
+      if settings is not None:
+        self._index_change('channel', channel_id, settings, False)
+
+  @timed(DB_QUERY_SECONDS, 'remove_subscribed_channel')
+  def remove_subscribed_channel(self, channel_id):
+    """
+    Stop broadcasting alerts to a channel.
+
+    Args:
+      channel_id (int): The ID of the channel.
+    """
+    with self._lock:
+      with self.conn:
+        self.conn.execute('DELETE FROM subscribed_channels WHERE channel_id = ?', (channel_id,))
+      self._index_change('channel', channel_id, None, True)
+
+  def _channel_change(self, channel_id, settings, removed):
+    """
+    Apply a channel subscription change to the channel index.
+
+    Args:
+      channel_id (int): The ID of the channel.
+      settings (tuple or None): The channel's (threshold, role_id).
+      removed (bool): Whether the channel was unsubscribed.
+    """
+    self.channel_roles.pop(channel_id, None)
+    self.suspended_channels.pop(channel_id, None)
+    if removed:
+      self.channel_index.remove(channel_id)
+      self.channel_notified.pop(channel_id, None)
+      return
+    threshold, role_id = settings
+    self.channel_index.add(channel_id, threshold)
+    if role_id is not None:
+      self.channel_roles[channel_id] = role_id
+
+  @timed(DB_QUERY_SECONDS, 'get_crossed_channels')
+  def get_crossed_channels(self, last_price, current_price, default_threshold):
+    """
+    Get the subscribed channels whose threshold was crossed between two prices, skipping
+    channels whose last alert already reported the price on the same side of the same threshold.
+
+    Args:
+      last_price (float): The previously observed price.
+      current_price (float): The newly observed price.
+      default_threshold (float): The threshold used for channels without one.
+
+    Returns:
+      list: A list of tuples (channel_id, threshold) of channels to alert.
+    """
+    with self._lock:
+      crossed = self.channel_index.crossed(last_price, current_price, default_threshold)
+      return [(channel_id, threshold) for channel_id, threshold in crossed
+              if self.channel_notified.get(channel_id) != (threshold, current_price > threshold)]
+
+  @timed(DB_QUERY_SECONDS, 'enqueue_alerts')
+  def enqueue_alerts(self, tick, price, alerts):
+    """
+    Queue a tick's alerts in the outbox and record its price as the last price in one transaction.
+
+    The last price only moves on together with the alerts it produced, so a crash after
+    this point leaves the alerts pending for the next start instead of losing them. Entries
+    are keyed by (tick, kind, target_id), so enqueueing the same tick twice adds nothing.
+
+    Args:
+      tick (int): The UNIX timestamp identifying the tick.
+      price (float): The price of the tick.
+      alerts (list): Tuples of (kind, target_id, threshold).
+    """
+    with self._lock, self.conn:
+      self.conn.executemany(
+        'INSERT OR IGNORE INTO alert_outbox (tick, kind, target_id, threshold, price) VALUES (?, ?, ?, ?, ?)',
+        [(tick, kind, target_id, threshold, price) for kind, target_id, threshold in alerts])
+      self.conn.execute('INSERT OR REPLACE INTO bot_state (key, value) VALUES (?, ?)', ('last_price', price))
+      self.conn.execute('DELETE FROM alert_outbox WHERE tick < ?', (tick - OUTBOX_RETENTION,))
+
+  @timed(DB_QUERY_SECONDS, 'mark_failed')
+  def mark_failed(self, alerts, now):
+    """
+    Record outbox entries that could not be delivered, so they are not resumed.
+
+    Args:
+      alerts (list): Tuples of (tick, kind, target_id).
+      now (int): The current UNIX timestamp.
+    """
+    with self._lock, self.conn:
+      self.conn.executemany(
+        '''UPDATE alert_outbox SET outcome = 'failed', completed_at = ?
+           WHERE tick = ? AND kind = ? AND target_id = ? AND outcome IS NULL
+        ''', [(now, tick, kind, target_id) for tick, kind, target_id in alerts])
+
+  @timed(DB_QUERY_SECONDS, 'get_pending_alerts')
+  def get_pending_alerts(self, since):
+    """
+    Get the outbox entries in this partition that were neither delivered nor given up on.
+
+    Args:
+      since (int): The earliest tick to include; older alerts are too stale to send.
+
+    Returns:
+      list: Tuples of (tick, kind, target_id, threshold, price), oldest first.
+    """
+    with self._lock:
+      rows = self.conn.execute(
+        '''SELECT tick, kind, target_id, threshold, price FROM alert_outbox
+           WHERE outcome IS NULL AND tick >= ? ORDER BY tick
+        ''', (since,)).fetchall()
+    return [row for row in rows if (self.owns(row[2]) if row[1] == 'user' else self.owns_channels())]
+
+  @timed(DB_QUERY_SECONDS, 'add_price_sample')
+  def add_price_sample(self, timestamp, price):
+    """
+    Store a polled price sample and fold it into its hourly rollup.
+
+    Args:
+      timestamp (int): The UNIX timestamp of the sample.
+      price (float): The sampled price.
+    """
+    with self._lock, self.conn:
+      cursor = self.conn.execute('INSERT OR IGNORE INTO price_history (ts, price) VALUES (?, ?)', (timestamp, price))
+      # A second sample in the same second is dropped, so it must not be counted in the rollup either.
+      if cursor.rowcount != 1:
+        return
+      self.conn.execute(
+        '''INSERT INTO price_rollups_hourly (hour, min, max, total, count) VALUES (?, ?, ?, ?, 1)
+           ON CONFLICT(hour) DO UPDATE SET min = MIN(min, excluded.min), max = MAX(max, excluded.max),
+                                           total = total + excluded.total, count = count + 1
+        ''', (timestamp - timestamp % 3600, price, price, price))
+
+  @timed(DB_QUERY_SECONDS, 'get_price_samples')
+  def get_price_samples(self, since):
+    """
+    Get the price samples at or after a timestamp.
+
+    Args:
+      since (int): The earliest UNIX timestamp to include.
+
+    Returns:
+      list: Tuples of (timestamp, price), oldest first.
+    """
+    with self._lock:
+      return self.conn.execute('SELECT ts, price FROM price_history WHERE ts >= ? ORDER BY ts', (since,)).fetchall()
+
+  @timed(DB_QUERY_SECONDS, 'get_hourly_rollups')
+  def get_hourly_rollups(self, since):
+    """
+    Get the hourly price rollups at or after a timestamp.
+
+    Args:
+      since (int): The earliest UNIX timestamp to include.
+
+    Returns:
+      list: Tuples of (hour, min, max, total, count), oldest first.
+    """
+    with self._lock:
+      return self.conn.execute(
+        'SELECT hour, min, max, total, count FROM price_rollups_hourly WHERE hour >= ? ORDER BY hour', (since,)).fetchall()
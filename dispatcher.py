@@ -0,0 +1,310 @@
+import asyncio
+import time
+from collections import namedtuple
+
+import discord
+
+from logger import logger
+from metrics import ALERTS_DELIVERED, DM_FAILURES, DM_SEND_SECONDS
+
+class Recipient(namedtuple('Recipient', ('kind', 'id'))):
+  """
+  The target of an alert: a user's DMs or a guild channel broadcast.
+  """
+
+  __slots__ = ()
+
+  USER = 'user'
+  CHANNEL = 'channel'
+
+  def __str__(self):
+    return f'{self.kind} {self.id}'
+
+class DeliveryStats:
+  """
+  Delivery statistics collected for a single alert tick.
+  """
+
+  def __init__(self):
+    """
+    Initialize an empty set of statistics starting now.
+    """
+    self.started = time.monotonic()
+    self.duration = 0.0
+    self.queued = 0
+    self.delivered = []
+    self.undeliverable = []
+    self.failed = 0
+    self.retried = 0
+    self.latency_total = 0.0
+    self.latency_max = 0.0
+
+  def record_delivery(self, key, latency):
+    """
+    Record a successful delivery.
+
+    Args:
+      key: The recipient the alert was delivered to.
+      latency (float): Seconds between enqueueing and delivering the alert.
+    """
+    self.delivered.append(key)
+    self.latency_total += latency
+    self.latency_max = max(self.latency_max, latency)
+
+  def record_undeliverable(self, key, error):
+    """
+    Record a recipient that cannot receive alerts until something changes on their side.
+
+    Args:
+      key: The recipient the alert was addressed to.
+      error (str): The error returned by Discord.
+    """
+    self.failed += 1
+    self.undeliverable.append((key, error))
+
+  def finish(self):
+    """
+    Mark the tick as finished and record its duration.
+    """
+    self.duration = time.monotonic() - self.started
+
+  @property
+  def mean_latency(self):
+    """
+    float: The mean delivery latency in seconds.
+    """
+    return self.latency_total / len(self.delivered) if self.delivered else 0.0
+
+  @property
+  def throughput(self):
+    """
+    float: The number of alerts delivered per second.
+    """
+    return len(self.delivered) / self.duration if self.duration > 0 else 0.0
+
+class _Job:
+  """
+  A queued alert along with its retry state.
+  """
+
+  __slots__ = ('key', 'args', 'enqueued_at', 'attempts', 'bucket', 'handle')
+
+  def __init__(self, key, args):
+    self.key = key
+    self.args = args
+    self.enqueued_at = time.monotonic()
+    self.attempts = 0
+    self.bucket = None
+    self.handle = None
+
+def parse_rate_limit(response):
+  """
+  Read Discord's rate limit headers from a 429 response.
+
+  Args:
+    response (aiohttp.ClientResponse): The rate limited response.
+
+  Returns:
+    tuple: A tuple (bucket, retry_after, is_global).
+  """
+  headers = response.headers
+  retry_after = float(headers.get('Retry-After') or headers.get('X-RateLimit-Reset-After') or 1.0)
+  is_global = headers.get('X-RateLimit-Global') == 'true' or headers.get('X-RateLimit-Scope') == 'global'
+  return headers.get('X-RateLimit-Bucket'), retry_after, is_global
+
+class AlertDispatcher:
+  """
+  Deliver queued price alerts concurrently through a pool of workers.
+
+  Rate limited alerts are requeued and their bucket, or every worker for a global
+  limit, is paused until Discord's retry window has passed.
+  """
+
+  def __init__(self, deliver, workers=16, max_attempts=5, on_delivered=None):
+    """
+    Initialize the AlertDispatcher.
+
+    Args:
+      deliver (coroutine function): Called as deliver(key, *args) to send one alert.
+      workers (int, optional): Number of concurrent workers. Defaults to 16.
+      max_attempts (int, optional): Attempts per alert before giving up. Defaults to 5.
+      on_delivered (coroutine function, optional): Called as on_delivered(key, *args) after an alert is sent,
+        before the worker takes the next one. It is not timed as part of the send, and its errors are
+        logged without counting the alert as failed. Defaults to None.
+    """
+    self.deliver = deliver
+    self.on_delivered = on_delivered
+    self.worker_count = workers
+    self.max_attempts = max_attempts
+    self.queue = None
+    self.workers = []
+    self.bucket_resume = {}
+    self.global_resume = 0.0
+    self.stats = DeliveryStats()
+    self._delayed = set()
+
+  def start(self):
+    """
+    Start the worker pool on the running event loop.
+    """
+    self.queue = asyncio.Queue()
+    self.workers = [asyncio.create_task(self._worker()) for _ in range(self.worker_count)]
+
+  async def stop(self):
+    """
+    Cancel the worker pool and wait for it to exit.
+    """
+    for handle in self._delayed:
+      handle.cancel()
+    self._delayed.clear()
+    for worker in self.workers:
+      worker.cancel()
+    await asyncio.gather(*self.workers, return_exceptions=True)
+    self.workers = []
+
+  def begin_tick(self):
+    """
+    Reset the statistics at the start of an alert tick.
+    """
+    self.stats = DeliveryStats()
+
+  def enqueue(self, key, *args):
+    """
+    Queue an alert for delivery.
+
+    Args:
+      key: The recipient of the alert, passed as the first argument to deliver.
+      *args: Remaining arguments passed to deliver.
+    """
+    self.stats.queued += 1
+    self.queue.put_nowait(_Job(key, args))
+
+  async def join(self):
+    """
+    Wait until every queued alert has been delivered or dropped.
+
+    Returns:
+      DeliveryStats: The statistics for the current tick.
+    """
+    await self.queue.join()
+    self.stats.finish()
+    return self.stats
+
+  async def _worker(self):
+    """
+    Deliver alerts from the queue until cancelled.
+    """
+    while True:
+      job = await self.queue.get()
+      requeued = False
+      try:
+        await self._wait_for_bucket(job.bucket)
+        requeued = await self._send(job)
+      # pylint: disable=broad-except
+      except Exception as e:
+        self.stats.failed += 1
+        DM_FAILURES.inc(labels=('unexpected',))
+        logger.error("Unexpected error delivering alert to %s: %s", job.key, str(e))
+      finally:
+        # A requeued job stays unfinished until it is put back, so join keeps waiting for it.
+        if not requeued:
+          self.queue.task_done()
+
+  async def _wait_for_bucket(self, bucket):
+    """
+    Sleep until neither the global limit nor the given bucket is paused.
+
+    Args:
+      bucket (str or None): The rate limit bucket of the job, if known.
+    """
+    now = time.monotonic()
+    bucket_resume = self.bucket_resume.get(bucket, 0.0)
+    if bucket_resume <= now:
+      self.bucket_resume.pop(bucket, None)
+    resume = max(self.global_resume, bucket_resume)
+    if resume > now:
+      await asyncio.sleep(resume - now)
+
+  async def _send(self, job):
+    """
+    Attempt to deliver a single job, requeueing it when rate limited.
+
+    Args:
+      job (_Job): The job to deliver.
+
+    Returns:
+      bool: True if the job was scheduled to be retried, False otherwise.
+    """
+    job.attempts += 1
+    try:
+      with DM_SEND_SECONDS.time():
+        await self.deliver(job.key, *job.args)
+    except discord.RateLimited as e:
+      DM_FAILURES.inc(labels=('rate_limited',))
+      # Message sends are bucketed per channel, so the recipient identifies the bucket.
+      return self._retry(job, job.bucket or job.key, e.retry_after, False)
+    except (discord.errors.Forbidden, discord.errors.NotFound) as e:
+      self.stats.record_undeliverable(job.key, str(e))
+      DM_FAILURES.inc(labels=('forbidden' if e.status == 403 else 'not_found',))
+      logger.error("Unable to send alert to %s. DMs might be disabled or channel permissions missing.", job.key)
+    except discord.errors.HTTPException as e:
+      if e.status == 429:
+        DM_FAILURES.inc(labels=('rate_limited',))
+        bucket, retry_after, is_global = parse_rate_limit(e.response)
+        return self._retry(job, bucket or job.key, retry_after, is_global)
+      self.stats.failed += 1
+      DM_FAILURES.inc(labels=('http_error',))
+      logger.error("Error sending alert to %s: %s", job.key, str(e))
+    else:
+      self.stats.record_delivery(job.key, time.monotonic() - job.enqueued_at)
+      ALERTS_DELIVERED.inc()
+      if self.on_delivered is not None:
+        try:
+          await self.on_delivered(job.key, *job.args)
+        # pylint: disable=broad-except
+        except Exception as e:
+          logger.error("Failed to record the alert delivered to %s: %s", job.key, str(e))
+    return False
+
+  def _retry(self, job, bucket, retry_after, is_global):
+    """
+    Pause the affected bucket and schedule a rate limited job to be requeued.
+
+    Args:
+      job (_Job): The rate limited job.
+      bucket (str): The rate limit bucket to pause.
+      retry_after (float): Seconds to wait before retrying.
+      is_global (bool): Whether the limit applies to every request.
+
+    Returns:
+      bool: True if the job will be retried, False if it was dropped.
+    """
+    resume = time.monotonic() + retry_after
+    if is_global:
+      self.global_resume = max(self.global_resume, resume)
+    else:
+      self.bucket_resume[bucket] = max(self.bucket_resume.get(bucket, 0.0), resume)
+
+    if job.attempts >= self.max_attempts:
+      self.stats.failed += 1
+      DM_FAILURES.inc(labels=('dropped',))
+      logger.error("Giving up on alert to %s after %s rate limited attempts", job.key, job.attempts)
+      return False
+
+    job.bucket = bucket
+    self.stats.retried += 1
+    handle = asyncio.get_running_loop().call_later(retry_after, self._requeue, job)
+    self._delayed.add(handle)
+    job.handle = handle
+    return True
+
+  def _requeue(self, job):
+    """
+    Put a rate limited job back on the queue once its retry window has passed.
+
+    Args:
+      job (_Job): The job to requeue.
+    """
+    self._delayed.discard(job.handle)
+    self.queue.put_nowait(job)
+    self.queue.task_done()
@@ -0,0 +1,141 @@
+import asyncio
+import time
+from datetime import datetime
+from zoneinfo import ZoneInfo
+
+import aiohttp
+
+from logger import logger
+
+# ComEd's datestart parameter is interpreted in Chicago local time.
+COMED_TIMEZONE = ZoneInfo('America/Chicago')
+HOUR_MILLIS = 3600000
+
+async def fetch_current_hour_average(session, url):
+  """
+  Fetch the current hour average price from the ComEd API.
+
+  Args:
+    session (aiohttp.ClientSession): The shared HTTP session to use.
+    url (str): The currenthouraverage API URL.
+
+  Returns:
+    float or None: The current price if successful, None otherwise.
+  """
+  try:
+    async with session.get(url) as response:
+      if response.status == 200:
+        data = await response.json()
+        if data:
+          return float(data[0]['price'])
+      logger.error("Error: HTTP %s", response.status)
+  except aiohttp.ClientError as e:
+    logger.error("Error fetching ComEd price %s", str(e))
+  except asyncio.TimeoutError:
+    logger.error("Timed out fetching ComEd price")
+  return None
+
+def format_comed_time(millis):
+  """
+  Format a UTC timestamp the way ComEd's datestart parameter expects it.
+
+  Args:
+    millis (int): Milliseconds since the UNIX epoch.
+
+  Returns:
+    str: The time as YYYYMMDDhhmm in Chicago local time.
+  """
+  return datetime.fromtimestamp(millis / 1000, COMED_TIMEZONE).strftime('%Y%m%d%H%M')
+
+class FiveMinuteFeed:
+  """
+  Incrementally ingest ComEd's 5-minute price feed.
+
+  A millisUTC cursor tracks the newest sample seen so each poll only asks for newer
+  samples, and the current hour's average is kept as a running sum.
+  """
+
+  def __init__(self, api_url):
+    """
+    Initialize the FiveMinuteFeed.
+
+    Args:
+      api_url (str): The base URL of the ComEd API, without query parameters.
+    """
+    self.api_url = api_url
+    self.cursor = None
+    self.latest_price = None
+    self.hour = None
+    self.hour_total = 0.0
+    self.hour_count = 0
+
+  async def poll(self, session):
+    """
+    Fetch samples newer than the cursor and update the running hour average.
+
+    Args:
+      session (aiohttp.ClientSession): The shared HTTP session to use.
+
+    Returns:
+      float or None: The running average for the current hour, or None if unavailable.
+    """
+    if self.cursor is None:
+      now = int(datetime.now().timestamp() * 1000)
+      since = now - now % HOUR_MILLIS
+    else:
+      since = self.cursor
+    params = {'type': '5minutefeed', 'datestart': format_comed_time(since)}
+
+    try:
+      async with session.get(self.api_url, params=params) as response:
+        if response.status != 200:
+          logger.error("Error: HTTP %s", response.status)
+          return None
+        data = await response.json(content_type=None)
+    except aiohttp.ClientError as e:
+      logger.error("Error fetching ComEd 5-minute feed %s", str(e))
+      return None
+    except asyncio.TimeoutError:
+      logger.error("Timed out fetching ComEd 5-minute feed")
+      return None
+
+    for millis, price in sorted((int(item['millisUTC']), float(item['price'])) for item in data):
+      if self.cursor is None or millis > self.cursor:
+        self.ingest(millis, price)
+    return self.hour_average()
+
+  def ingest(self, millis, price):
+    """
+    Add a sample newer than the cursor to the running hour average.
+
+    Args:
+      millis (int): The sample time in milliseconds since the UNIX epoch.
+      price (float): The sampled price.
+    """
+    hour = millis - millis % HOUR_MILLIS
+    if hour != self.hour:
+      self.hour = hour
+      self.hour_total = 0.0
+      self.hour_count = 0
+    self.hour_total += price
+    self.hour_count += 1
+    self.cursor = millis
+    self.latest_price = price
+
+  def hour_average(self, now=None):
+    """
+    Get the running average of the samples in the current hour.
+
+    Args:
+      now (float, optional): The current UNIX timestamp. Defaults to time.time().
+
+    Returns:
+      float or None: The average price, or None if no samples have been ingested for the current hour.
+    """
+    if now is None:
+      now = time.time()
+    current_hour = int(now * 1000) - int(now * 1000) % HOUR_MILLIS
+    # Until the new hour's first sample arrives, the last hour's average is not the current price.
+    if self.hour != current_hour or not self.hour_count:
+      return None
+    return round(self.hour_total / self.hour_count, 1)
@@ -0,0 +1,131 @@
+from array import array
+
+class PriceRingBuffer:
+  """
+  A fixed-size ring buffer of recent (timestamp, price) samples backed by flat arrays.
+  """
+
+  def __init__(self, capacity):
+    """
+    Initialize the PriceRingBuffer.
+
+    Args:
+      capacity (int): Maximum number of samples kept before the oldest are overwritten.
+    """
+    self.capacity = capacity
+    self.timestamps = array('d', bytes(8 * capacity))
+    self.prices = array('d', bytes(8 * capacity))
+    self.start = 0
+    self.size = 0
+
+  def __len__(self):
+    return self.size
+
+  def append(self, timestamp, price):
+    """
+    Add a sample, overwriting the oldest one if the buffer is full.
+
+    Args:
+      timestamp (float): The UNIX timestamp of the sample.
+      price (float): The sampled price.
+    """
+    position = (self.start + self.size) % self.capacity
+    self.timestamps[position] = timestamp
+    self.prices[position] = price
+    if self.size < self.capacity:
+      self.size += 1
+    else:
+      self.start = (self.start + 1) % self.capacity
+
+  def extend(self, samples):
+    """
+    Add samples in chronological order.
+
+    Args:
+      samples (iterable): Tuples of (timestamp, price).
+    """
+    for timestamp, price in samples:
+      self.append(timestamp, price)
+
+  def oldest(self):
+    """
+    Get the timestamp of the oldest sample.
+
+    Returns:
+      float or None: The oldest timestamp, or None if the buffer is empty.
+    """
+    return self.timestamps[self.start] if self.size else None
+
+  def newest(self):
+    """
+    Get the newest sample.
+
+    Returns:
+      tuple or None: The newest (timestamp, price), or None if the buffer is empty.
+    """
+    if not self.size:
+      return None
+    position = (self.start + self.size - 1) % self.capacity
+    return self.timestamps[position], self.prices[position]
+
+  def since(self, timestamp):
+    """
+    Get the samples at or after a timestamp, oldest first.
+
+    Args:
+      timestamp (float): The earliest timestamp to include.
+
+    Returns:
+      list: Tuples of (timestamp, price).
+    """
+    low, high = 0, self.size
+    while low < high:
+      middle = (low + high) // 2
+      if self.timestamps[(self.start + middle) % self.capacity] < timestamp:
+        low = middle + 1
+      else:
+        high = middle
+    positions = ((self.start + offset) % self.capacity for offset in range(low, self.size))
+    return [(self.timestamps[position], self.prices[position]) for position in positions]
+
+def downsample_samples(samples, start, bucket_size, buckets):
+  """
+  Downsample raw price samples into min/avg/max buckets.
+
+  Args:
+    samples (iterable): Tuples of (timestamp, price).
+    start (float): The start of the first bucket.
+    bucket_size (float): The length of each bucket in seconds.
+    buckets (int): The number of buckets.
+
+  Returns:
+    list: Tuples of (bucket_start, min, avg, max, count) for buckets that contain samples.
+  """
+  return downsample_rollups(((timestamp, price, price, price, 1) for timestamp, price in samples),
+                            start, bucket_size, buckets)
+
+def downsample_rollups(rollups, start, bucket_size, buckets):
+  """
+  Combine precomputed rollups into min/avg/max buckets.
+
+  Args:
+    rollups (iterable): Tuples of (timestamp, min, max, total, count).
+    start (float): The start of the first bucket.
+    bucket_size (float): The length of each bucket in seconds.
+    buckets (int): The number of buckets.
+
+  Returns:
+    list: Tuples of (bucket_start, min, avg, max, count) for buckets that contain samples.
+  """
+  combined = {}
+  for timestamp, low, high, total, count in rollups:
+    index = int((timestamp - start) // bucket_size)
+    if not 0 <= index < buckets:
+      continue
+    if index in combined:
+      bucket = combined[index]
+      combined[index] = (min(bucket[0], low), max(bucket[1], high), bucket[2] + total, bucket[3] + count)
+    else:
+      combined[index] = (low, high, total, count)
+  return [(start + index * bucket_size, low, total / count, high, count)
+          for index, (low, high, total, count) in sorted(combined.items())]
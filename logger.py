@@ -1,13 +1,106 @@
+import atexit
+import json
 import logging
-from logging.handlers import RotatingFileHandler
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
 import os
+import queue
+import time
+
+class DuplicateFilter(logging.Filter):
+  """
+  Rate limit warnings and errors that share a message template.
+
+  Each template may log burst records per interval seconds; the rest are dropped and
+  counted, and the count is appended to the next record let through for that template.
+  Templates are the format strings in the source, so the state stays small.
+  """
+
+  def __init__(self, burst=10, interval=60.0, level=logging.WARNING):
+    """
+    Initialize the DuplicateFilter.
+
+    Args:
+      burst (int, optional): Records allowed per template in each interval. Defaults to 10.
+      interval (float, optional): The length of an interval in seconds. Defaults to 60.0.
+      level (int, optional): Records below this level are never limited. Defaults to logging.WARNING.
+    """
+    super().__init__()
+    self.burst = burst
+    self.interval = interval
+    self.level = level
+    self.windows = {}
+
+  def filter(self, record):
+    if record.levelno < self.level:
+      return True
+    now = time.monotonic()
+    key = (record.levelno, record.msg)
+    window = self.windows.get(key)
+    if window is None or now - window[0] >= self.interval:
+      suppressed = window[2] if window is not None else 0
+      self.windows[key] = [now, 1, 0]
+    elif window[1] < self.burst:
+      window[1] += 1
+      suppressed = 0
+    else:
+      window[2] += 1
+      return False
+    record.suppressed = suppressed
+    return True
+
+class JsonFormatter(logging.Formatter):
+  """
+  Format records as one JSON object per line.
+  """
+
+  def format(self, record):
+    entry = {
+      'time': self.formatTime(record),
+      'level': record.levelname,
+      'message': record.getMessage(),
+      'template': str(getattr(record, 'template', record.msg)),
+    }
+    suppressed = getattr(record, 'suppressed', 0)
+    if suppressed:
+      entry['suppressed'] = suppressed
+    if record.exc_info:
+      entry['exception'] = self.formatException(record.exc_info)
+    return json.dumps(entry)
+
+class TextFormatter(logging.Formatter):
+  """
+  The plain text format, noting how many similar records were suppressed before this one.
+  """
+
+  def format(self, record):
+    text = super().format(record)
+    suppressed = getattr(record, 'suppressed', 0)
+    if suppressed:
+      text += f' ({suppressed} similar messages suppressed)'
+    return text
+
+class _QueueHandler(QueueHandler):
+  """
+  A QueueHandler that keeps the message template on the queued record.
+  """
+
+  def prepare(self, record):
+    # The base class replaces msg with the formatted message; keep the template for the JSON output.
+    template = record.msg
+    record = super().prepare(record)
+    record.template = template
+    return record
 
 def setup_logger():
   """
   Set up and configure the logger for the bot.
 
+  Records are put on an in-memory queue and written to the rotating log file by a
+  background thread, so logging never blocks the event loop on disk I/O. Set
+  LOG_FORMAT=json for one JSON object per line.
+
   Returns:
-    logging.Logger: Configured logger object.
+    tuple: The configured logging.Logger and the QueueListener writing its records.
   """
   bot_logger = logging.getLogger('bot')
   bot_logger.setLevel(logging.INFO)
@@ -16,11 +109,28 @@ def setup_logger():
   os.makedirs('data', exist_ok=True)
 
   handler = RotatingFileHandler('data/bot.log', maxBytes=1000000, backupCount=5)
-  formatter = logging.Formatter('%(asctime)s - %(levelname)s - %(message)s')
+  if os.environ.get('LOG_FORMAT') == 'json':
+    formatter = JsonFormatter()
+  else:
+    formatter = TextFormatter('%(asctime)s - %(levelname)s - %(message)s')
   handler.setFormatter(formatter)
 
-  bot_logger.addHandler(handler)
+  records = queue.SimpleQueue()
+  queue_handler = _QueueHandler(records)
+  queue_handler.addFilter(DuplicateFilter())
+  bot_logger.addHandler(queue_handler)
+
+  queue_listener = QueueListener(records, handler)
+  queue_listener.start()
 
-  return bot_logger
+  return bot_logger, queue_listener
+
+def stop_logging():
+  """
+  Write any queued records and stop the background listener. Safe to call more than once.
+  """
+  if listener._thread is not None: # pylint: disable=protected-access
+    listener.stop()
 
-logger = setup_logger()
+logger, listener = setup_logger()
+atexit.register(stop_logging)
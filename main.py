@@ -1,6 +1,13 @@
+import time
+
+# Captured before the heavy imports so the startup report covers them.
+STARTED_AT = time.perf_counter()
+
+# pylint: disable=wrong-import-position
 import asyncio
 import os
-from bot import bot
+import signal
+from bot import Bot
 from logger import logger
 
 async def main():
@@ -18,6 +25,10 @@ async def main():
   if not token:
     raise ValueError("No token found. Set the DISCORD_BOT_TOKEN environment variable.")
 
+  bot = Bot(started_at=STARTED_AT)
+  # Container runtimes stop with SIGTERM; treat it like Ctrl+C so close() drains in-flight alerts.
+  asyncio.get_running_loop().add_signal_handler(signal.SIGTERM, asyncio.current_task().cancel)
+
   try:
     await bot.start(token)
   # pylint: disable=broad-except
@@ -27,4 +38,7 @@ async def main():
     await bot.close()
 
 if __name__ == "__main__":
-  asyncio.run(main())
+  try:
+    asyncio.run(main())
+  except (asyncio.CancelledError, KeyboardInterrupt):
+    pass
@@ -0,0 +1,297 @@
+import functools
+import threading
+import time
+from bisect import bisect_left
+
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+def _format_labels(names, values, extra=''):
+  """
+  Format label names and values as a Prometheus label set.
+
+  Args:
+    names (tuple): The label names.
+    values (tuple): The label values.
+    extra (str, optional): An already formatted label to append. Defaults to ''.
+
+  Returns:
+    str: The label set including braces, or an empty string if there are no labels.
+  """
+  pairs = [f'{name}="{value}"' for name, value in zip(names, values)]
+  if extra:
+    pairs.append(extra)
+  return '{' + ','.join(pairs) + '}' if pairs else ''
+
+class Counter:
+  """
+  A monotonically increasing counter, optionally read from a callback at scrape time.
+  """
+
+  kind = 'counter'
+
+  def __init__(self, name, description, labels=(), function=None):
+    self.name = name
+    self.description = description
+    self.labels = labels
+    self.function = function
+    self.values = {}
+    self._lock = threading.Lock()
+
+  def inc(self, amount=1, labels=()):
+    """
+    Increase the counter.
+
+    Args:
+      amount (float, optional): The amount to add. Defaults to 1.
+      labels (tuple, optional): The label values. Defaults to ().
+    """
+    with self._lock:
+      self.values[labels] = self.values.get(labels, 0) + amount
+
+  def render(self):
+    """
+    Render the counter's samples in the Prometheus text format.
+
+    Returns:
+      list: The sample lines.
+    """
+    if self.function is not None:
+      values = list(self.function().items())
+    else:
+      # Other threads may add a series while a scrape formats the values, so format a copy.
+      with self._lock:
+        values = list(self.values.items())
+    return [f'{self.name}{_format_labels(self.labels, key)} {value}' for key, value in values]
+
+class Gauge:
+  """
+  A value that can go up and down, optionally read from a callback at scrape time.
+  """
+
+  kind = 'gauge'
+
+  def __init__(self, name, description, labels=(), function=None):
+    self.name = name
+    self.description = description
+    self.labels = labels
+    self.function = function
+    self.values = {}
+    self._lock = threading.Lock()
+
+  def set(self, value, labels=()):
+    """
+    Set the gauge.
+
+    Args:
+      value (float): The new value.
+      labels (tuple, optional): The label values. Defaults to ().
+    """
+    with self._lock:
+      self.values[labels] = value
+
+  def render(self):
+    """
+    Render the gauge's samples in the Prometheus text format.
+
+    Returns:
+      list: The sample lines.
+    """
+    if self.function is not None:
+      values = list(self.function().items())
+    else:
+      with self._lock:
+        values = list(self.values.items())
+    return [f'{self.name}{_format_labels(self.labels, key)} {value}' for key, value in values]
+
+class Histogram:
+  """
+  A histogram of observed values in fixed buckets.
+  """
+
+  kind = 'histogram'
+
+  def __init__(self, name, description, labels=(), buckets=DEFAULT_BUCKETS):
+    self.name = name
+    self.description = description
+    self.labels = labels
+    self.buckets = buckets
+    self.values = {}
+    self._lock = threading.Lock()
+
+  def observe(self, value, labels=()):
+    """
+    Record an observation.
+
+    Args:
+      value (float): The observed value.
+      labels (tuple, optional): The label values. Defaults to ().
+    """
+    index = bisect_left(self.buckets, value)
+    with self._lock:
+      series = self.values.get(labels)
+      if series is None:
+        series = self.values[labels] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+      series[0][index] += 1
+      series[1] += value
+      series[2] += 1
+
+  def time(self, labels=()):
+    """
+    Get a context manager that observes the duration of its block.
+
+    Args:
+      labels (tuple, optional): The label values. Defaults to ().
+
+    Returns:
+      _Timer: The context manager.
+    """
+    return _Timer(self, labels)
+
+  def render(self):
+    """
+    Render the histogram's bucket, sum and count samples in the Prometheus text format.
+
+    Returns:
+      list: The sample lines.
+    """
+    # Copy each series under the lock, so a concurrent observation cannot change the dict or a series mid-format.
+    with self._lock:
+      series = [(key, list(counts), total, count) for key, (counts, total, count) in self.values.items()]
+    lines = []
+    for key, counts, total, count in series:
+      cumulative = 0
+      for bound, bucket_count in zip(self.buckets + (float('inf'),), counts):
+        cumulative += bucket_count
+        le = '+Inf' if bound == float('inf') else repr(bound)
+        bucket_label = 'le="' + le + '"'
+        lines.append(f'{self.name}_bucket{_format_labels(self.labels, key, bucket_label)} {cumulative}')
+      lines.append(f'{self.name}_sum{_format_labels(self.labels, key)} {total}')
+      lines.append(f'{self.name}_count{_format_labels(self.labels, key)} {count}')
+    return lines
+
+class _Timer:
+  """
+  A context manager that observes elapsed time into a histogram.
+  """
+
+  __slots__ = ('histogram', 'labels', 'started')
+
+  def __init__(self, histogram, labels):
+    self.histogram = histogram
+    self.labels = labels
+    self.started = 0.0
+
+  def __enter__(self):
+    self.started = time.perf_counter()
+    return self
+
+  def __exit__(self, *exc_info):
+    self.histogram.observe(time.perf_counter() - self.started, self.labels)
+
+def timed(histogram, *labels):
+  """
+  Decorate a synchronous function so each call is observed in a histogram.
+
+  Args:
+    histogram (Histogram): The histogram to observe into.
+    *labels: The label values.
+
+  Returns:
+    callable: The decorator.
+  """
+  def decorator(function):
+    @functools.wraps(function)
+    def wrapper(*args, **kwargs):
+      with _Timer(histogram, labels):
+        return function(*args, **kwargs)
+    return wrapper
+  return decorator
+
+class Registry:
+  """
+  A collection of metrics rendered together in the Prometheus text format.
+  """
+
+  def __init__(self):
+    self.metrics = []
+
+  def register(self, metric):
+    """
+    Add a metric to the registry.
+
+    Args:
+      metric: The Counter, Gauge or Histogram to add.
+
+    Returns:
+      The registered metric.
+    """
+    self.metrics.append(metric)
+    return metric
+
+  def render(self):
+    """
+    Render every metric in the Prometheus text exposition format.
+
+    Returns:
+      str: The rendered metrics.
+    """
+    lines = []
+    for metric in self.metrics:
+      lines.append(f'# HELP {metric.name} {metric.description}')
+      lines.append(f'# TYPE {metric.name} {metric.kind}')
+      lines.extend(metric.render())
+    return '\n'.join(lines) + '\n'
+
+async def start_metrics_server(host, port):
+  """
+  Serve the registry at /metrics.
+
+  Args:
+    host (str): The interface to bind.
+    port (int): The port to bind.
+
+  Returns:
+    web.AppRunner: The running server, to be cleaned up on shutdown.
+  """
+  # The web server is imported on first use so importing metrics stays cheap.
+  # pylint: disable=import-outside-toplevel
+  from aiohttp import web
+
+  async def handle(_request):
+    return web.Response(text=registry.render(), content_type='text/plain', charset='utf-8',
+                        headers={'X-Content-Type-Options': 'nosniff'})
+
+  app = web.Application()
+  app.router.add_get('/metrics', handle)
+  runner = web.AppRunner(app, access_log=None)
+  await runner.setup()
+  await web.TCPSite(runner, host, port).start()
+  return runner
+
+registry = Registry()
+
+TICK_SECONDS = registry.register(Histogram(
+  'bot_alert_tick_seconds', "Duration of send_price_alerts ticks."))
+UPSTREAM_SECONDS = registry.register(Histogram(
+  'bot_upstream_request_seconds', "Latency of upstream price requests.", ('source',)))
+PRICE_POLLS = registry.register(Counter(
+  'bot_price_polls_total', "Scheduled price polls by outcome.", ('outcome',)))
+UPSTREAM_FAILURES = registry.register(Counter(
+  'bot_upstream_failures_total', "Upstream price requests that returned no price.", ('source',)))
+DM_SEND_SECONDS = registry.register(Histogram(
+  'bot_dm_send_seconds', "Latency of individual alert deliveries."))
+DM_FAILURES = registry.register(Counter(
+  'bot_dm_failures_total', "Alert deliveries that failed or were rate limited.", ('reason',)))
+ALERTS_DELIVERED = registry.register(Counter(
+  'bot_alerts_delivered_total', "Alerts delivered successfully."))
+ALERTS_SUPPRESSED = registry.register(Counter(
+  'bot_alerts_suppressed_total', "Crossed alerts that were not sent.", ('reason',)))
+DB_QUERY_SECONDS = registry.register(Histogram(
+  'bot_db_query_seconds', "Duration of Database queries.", ('query',)))
+COMMAND_INVOCATIONS = registry.register(Counter(
+  'bot_command_invocations_total', "Slash command invocations.", ('command', 'status')))
+COOLDOWN_REJECTIONS = registry.register(Counter(
+  'bot_cooldown_rejections_total', "Command invocations rejected by a cooldown.", ('command',)))
+LOOP_LAG_SECONDS = registry.register(Histogram(
+  'bot_event_loop_lag_seconds', "How late event loop lag probes woke up.",
+  buckets=(0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0)))
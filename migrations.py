@@ -0,0 +1,156 @@
+def _add_column(conn, table, column, column_type):
+  """
+  Add a column to an existing table if it is missing.
+
+  Args:
+    conn (sqlite3.Connection): The database connection.
+    table (str): The table name.
+    column (str): The column name.
+    column_type (str): The column declaration, e.g. 'REAL'.
+  """
+  columns = [row[1] for row in conn.execute(f'PRAGMA table_info({table})')]
+  if column not in columns:
+    conn.execute(f'ALTER TABLE {table} ADD COLUMN {column} {column_type}')
+
+def _initial_schema(conn):
+  """
+  Create the schema as it was before versioning.
+
+  Databases from before versioning may hold any earlier subset of it, so every
+  statement here is idempotent.
+
+  Args:
+    conn (sqlite3.Connection): The database connection.
+  """
+  conn.execute(
+    '''CREATE TABLE IF NOT EXISTS subscribed_users
+                (user_id INTEGER PRIMARY KEY,
+                 threshold REAL)
+    ''')
+  conn.execute(
+    '''CREATE TABLE IF NOT EXISTS bot_state
+                (key TEXT PRIMARY KEY,
+                 value)
+    ''')
+  conn.execute(
+    '''CREATE TABLE IF NOT EXISTS price_history
+                (ts INTEGER PRIMARY KEY,
+                 price REAL NOT NULL)
+    ''')
+  conn.execute(
+    '''CREATE TABLE IF NOT EXISTS price_rollups_hourly
+                (hour INTEGER PRIMARY KEY,
+                 min REAL NOT NULL,
+                 max REAL NOT NULL,
+                 total REAL NOT NULL,
+                 count INTEGER NOT NULL)
+    ''')
+  conn.execute(
+    '''CREATE TABLE IF NOT EXISTS subscribed_channels
+                (channel_id INTEGER PRIMARY KEY,
+                 guild_id INTEGER NOT NULL,
+                 threshold REAL,
+                 role_id INTEGER,
+                 notified_threshold REAL,
+                 notified_above INTEGER)
+    ''')
+  conn.execute(
+    '''CREATE TABLE IF NOT EXISTS alert_outbox
+                (tick INTEGER NOT NULL,
+                 kind TEXT NOT NULL,
+                 target_id INTEGER NOT NULL,
+                 threshold REAL NOT NULL,
+                 price REAL NOT NULL,
+                 outcome TEXT,
+                 completed_at INTEGER,
+                 PRIMARY KEY (tick, kind, target_id))
+    ''')
+  conn.execute('CREATE INDEX IF NOT EXISTS alert_outbox_pending ON alert_outbox (tick) WHERE outcome IS NULL')
+  _add_column(conn, 'subscribed_users', 'notified_threshold', 'REAL')
+  _add_column(conn, 'subscribed_users', 'notified_above', 'INTEGER')
+  _add_column(conn, 'subscribed_users', 'hysteresis', 'REAL NOT NULL DEFAULT 0')
+  _add_column(conn, 'subscribed_users', 'min_interval', 'INTEGER NOT NULL DEFAULT 0')
+  _add_column(conn, 'subscribed_users', 'last_alert_at', 'INTEGER')
+  _add_column(conn, 'subscribed_users', 'failure_count', 'INTEGER NOT NULL DEFAULT 0')
+  _add_column(conn, 'subscribed_users', 'last_error', 'TEXT')
+  _add_column(conn, 'subscribed_users', 'suspended_until', 'INTEGER')
+
+def _index_thresholds(conn):
+  """
+  Index subscribers by threshold, for range queries and exports by threshold.
+
+  Args:
+    conn (sqlite3.Connection): The database connection.
+  """
+  conn.execute('CREATE INDEX IF NOT EXISTS subscribed_users_threshold ON subscribed_users (threshold)')
+
+def _store_dm_channels(conn):
+  """
+  Store each subscriber's DM channel ID, so alerts after a restart are sent without resolving it again.
+
+  Args:
+    conn (sqlite3.Connection): The database connection.
+  """
+  _add_column(conn, 'subscribed_users', 'dm_channel_id', 'INTEGER')
+
+def _suspend_channels(conn):
+  """
+  Track delivery failures of subscribed channels, so undeliverable ones back off like users.
+
+  Args:
+    conn (sqlite3.Connection): The database connection.
+  """
+  _add_column(conn, 'subscribed_channels', 'failure_count', 'INTEGER NOT NULL DEFAULT 0')
+  _add_column(conn, 'subscribed_channels', 'last_error', 'TEXT')
+  _add_column(conn, 'subscribed_channels', 'suspended_until', 'INTEGER')
+
+# The schema version is PRAGMA user_version, the number of these applied. Append new
+# migrations to the end; never edit or reorder ones that have shipped.
+MIGRATIONS = [
+  _initial_schema,
+  _index_thresholds,
+  _store_dm_channels,
+  _suspend_channels,
+]
+
+def schema_version(conn):
+  """
+  Get the schema version of a database.
+
+  Args:
+    conn (sqlite3.Connection): The database connection.
+
+  Returns:
+    int: The number of migrations applied.
+  """
+  return conn.execute('PRAGMA user_version').fetchone()[0]
+
+def migrate(conn):
+  """
+  Apply the pending migrations in order.
+
+  Each migration and its version bump commit in one transaction, so an interrupted
+  upgrade resumes at the migration that failed. The write lock is taken before the
+  version is read, so processes sharing the file never apply a migration twice.
+
+  Args:
+    conn (sqlite3.Connection): The database connection.
+
+  Returns:
+    list: The versions that were applied.
+  """
+  applied = []
+  while True:
+    conn.execute('BEGIN IMMEDIATE')
+    try:
+      version = schema_version(conn)
+      if version >= len(MIGRATIONS):
+        conn.rollback()
+        return applied
+      MIGRATIONS[version](conn)
+      conn.execute(f'PRAGMA user_version = {version + 1}')
+      conn.commit()
+    except BaseException:
+      conn.rollback()
+      raise
+    applied.append(version + 1)
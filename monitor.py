@@ -0,0 +1,75 @@
+import asyncio
+
+from metrics import LOOP_LAG_SECONDS
+
+class LoopLagMonitor:
+  """
+  Measure how long the event loop is stalled by comparing scheduled and actual wake-ups.
+  """
+
+  def __init__(self, interval=0.1):
+    """
+    Initialize the LoopLagMonitor.
+
+    Args:
+      interval (float, optional): Seconds between probes. Defaults to 0.1.
+    """
+    self.interval = interval
+    self.task = None
+    self.samples = 0
+    self.total_lag = 0.0
+    self.max_lag = 0.0
+
+  def start(self):
+    """
+    Start probing the running event loop.
+    """
+    self.task = asyncio.create_task(self._run())
+
+  async def stop(self):
+    """
+    Stop probing the event loop.
+    """
+    if self.task is not None:
+      self.task.cancel()
+      await asyncio.gather(self.task, return_exceptions=True)
+      self.task = None
+
+  async def _run(self):
+    """
+    Sleep for the probe interval repeatedly and record how late each wake-up was.
+    """
+    loop = asyncio.get_running_loop()
+    while True:
+      started = loop.time()
+      await asyncio.sleep(self.interval)
+      self.record(max(0.0, loop.time() - started - self.interval))
+
+  def record(self, lag):
+    """
+    Record a single lag sample.
+
+    Args:
+      lag (float): Seconds the event loop was late.
+    """
+    LOOP_LAG_SECONDS.observe(lag)
+    self.samples += 1
+    self.total_lag += lag
+    self.max_lag = max(self.max_lag, lag)
+
+  def reset(self):
+    """
+    Get the lag observed since the last reset and start a new window.
+
+    Returns:
+      dict: The maximum and mean lag in seconds and the number of samples.
+    """
+    snapshot = {
+      'max': self.max_lag,
+      'mean': self.total_lag / self.samples if self.samples else 0.0,
+      'samples': self.samples,
+    }
+    self.samples = 0
+    self.total_lag = 0.0
+    self.max_lag = 0.0
+    return snapshot
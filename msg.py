@@ -13,7 +13,9 @@ class Msg:
   # Command descriptions
   CMD_DESC_HELP = "Shows a list of available commands for the bot."
   CMD_DESC_TOGGLE = "Toggle alerts when prices exceed the threshold. If none is set, the Illinois fixed rate is used."
+  CMD_DESC_TOGGLE_CHANNEL = "Toggle price alert broadcasts in a channel, optionally mentioning a role."
   CMD_DESC_CHECK = "Get the average price for the current hour."
+  CMD_DESC_HISTORY = "Show the minimum, average and maximum price over the past hour, day or week."
 
   # Help command messages
   HELP_TITLE = "{bot_name} Commands"
@@ -33,11 +35,28 @@ class Msg:
   PRICE_MODERATE_DETAIL = "Consider moderate usage of high-consumption devices."
   PRICE_HIGH_DETAIL = "It's advisable to limit use of non-essential electrical appliances."
 
+  # History command messages
+  HISTORY_TITLE = "Price History for the Past {range}"
+  HISTORY_SUMMARY = "Low {low:.1f}{cent} \u00b7 Average {avg:.1f}{cent} \u00b7 High {high:.1f}{cent}"
+  HISTORY_LINE = "<t:{start}:{style}> \u2014 {low:.1f}{cent} / {avg:.1f}{cent} / {high:.1f}{cent}"
+  HISTORY_FOOTER = "Low / Average / High per interval"
+  HISTORY_EMPTY = "No price history has been recorded for this range yet."
+
   # Toggle command messages
   ALERTS_OFF_TITLE = "Price Alerts Turned Off"
   ALERTS_OFF = "You will no longer receive notifications about electricity price changes."
   ALERTS_ON_TITLE = "Price Alerts Turned On"
   ALERTS_ON = "You'll be notified when electricity prices cross the threshold."
+  ALERTS_UPDATED_TITLE = "Price Alerts Updated"
+  ALERTS_UPDATED = "Your alert settings have been updated."
+  ALERTS_RESUMED_TITLE = "Price Alerts Resumed"
+  ALERTS_RESUMED = "Your alerts were paused because they could not be delivered. They have been turned back on."
+
+  # Channel toggle command messages
+  CHANNEL_ALERTS_ON = "Price alerts will be posted in {channel} when prices cross the threshold."
+  CHANNEL_ALERTS_OFF = "Price alerts will no longer be posted in {channel}."
+  CHANNEL_ALERTS_UPDATED = "The alert settings for {channel} have been updated."
+  CHANNEL_SEND_ERR = "I need permission to send messages and embed links in {channel} to post alerts there."
 
   # Error messages
   CMD_ERR = "An error occurred while processing the command."
@@ -45,4 +64,5 @@ class Msg:
   COMED_PRICE_ERR = "Failed to retrieve ComEd price."
 
   # Other messages
-  CHECK_COOLDOWN = "Please wait before checking the price again."
+  COMMAND_COOLDOWN = "Please wait {retry_after} seconds before using this command again."
+  COMMAND_BUSY = "This command is busy right now. Please try again in a few seconds."
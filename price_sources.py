@@ -0,0 +1,305 @@
+import asyncio
+import math
+import os
+import time
+
+from feed import FiveMinuteFeed, fetch_current_hour_average
+from logger import logger
+from metrics import UPSTREAM_FAILURES, UPSTREAM_SECONDS
+
+class PriceSource:
+  """
+  A source of the current hour's average price.
+
+  Subclasses set name and implement fetch; anything with the same shape, such as a
+  local stand-in in tests, can be passed to PriceSources.
+  """
+
+  name = 'source'
+
+  def __init__(self, budget=5.0):
+    """
+    Initialize the PriceSource.
+
+    Args:
+      budget (float, optional): Seconds a fetch may take before it counts as a failure. Defaults to 5.0.
+    """
+    self.budget = budget
+
+  async def fetch(self, session):
+    """
+    Fetch the current price.
+
+    Args:
+      session (aiohttp.ClientSession): The shared HTTP session to use.
+
+    Returns:
+      float or None: The current price if successful, None otherwise.
+    """
+    raise NotImplementedError
+
+class HourlyAverageSource(PriceSource):
+  """
+  The currenthouraverage endpoint of the ComEd API, or a mirror serving the same format.
+  """
+
+  def __init__(self, url, name='hourly', budget=5.0):
+    """
+    Initialize the HourlyAverageSource.
+
+    Args:
+      url (str): The currenthouraverage URL.
+      name (str, optional): The name used in logs and metrics. Defaults to 'hourly'.
+      budget (float, optional): Seconds a fetch may take before it counts as a failure. Defaults to 5.0.
+    """
+    super().__init__(budget)
+    self.url = url
+    self.name = name
+
+  async def fetch(self, session):
+    return await fetch_current_hour_average(session, self.url)
+
+class FiveMinuteSource(PriceSource):
+  """
+  The running hour average of ComEd's 5-minute feed.
+  """
+
+  name = '5minute'
+
+  def __init__(self, api_url, budget=5.0):
+    """
+    Initialize the FiveMinuteSource.
+
+    Args:
+      api_url (str): The base URL of the ComEd API, without query parameters.
+      budget (float, optional): Seconds a fetch may take before it counts as a failure. Defaults to 5.0.
+    """
+    super().__init__(budget)
+    self.feed = FiveMinuteFeed(api_url)
+
+  async def fetch(self, session):
+    return await self.feed.poll(session)
+
+class CircuitBreaker:
+  """
+  Stop calling a source after repeated failures, then let a single trial call through once a cooldown has passed.
+
+  A failed trial reopens the circuit with twice the cooldown, up to max_cooldown.
+  """
+
+  def __init__(self, threshold=3, cooldown=30.0, max_cooldown=600.0):
+    """
+    Initialize the CircuitBreaker.
+
+    Args:
+      threshold (int, optional): Consecutive failures that open the circuit. Defaults to 3.
+      cooldown (float, optional): Seconds the circuit first stays open. Defaults to 30.0.
+      max_cooldown (float, optional): The longest time the circuit stays open. Defaults to 600.0.
+    """
+    self.threshold = threshold
+    self.base_cooldown = cooldown
+    self.max_cooldown = max_cooldown
+    self.cooldown = cooldown
+    self.failures = 0
+    self.open_until = 0.0
+    self.trial = False
+
+  def is_open(self, now):
+    """
+    Check whether calls are currently being refused.
+
+    Args:
+      now (float): The current time.monotonic() value.
+
+    Returns:
+      bool: True if the circuit is open.
+    """
+    return now < self.open_until or self.trial
+
+  def allow(self, now):
+    """
+    Check whether a call may be made, claiming the trial call if the cooldown has passed.
+
+    Args:
+      now (float): The current time.monotonic() value.
+
+    Returns:
+      bool: True if the call may be made.
+    """
+    if self.failures < self.threshold:
+      return True
+    if self.trial or now < self.open_until:
+      return False
+    self.trial = True
+    return True
+
+  def record_success(self):
+    """
+    Close the circuit after a successful call.
+    """
+    self.failures = 0
+    self.cooldown = self.base_cooldown
+    self.open_until = 0.0
+    self.trial = False
+
+  def record_failure(self, now):
+    """
+    Count a failed call, opening the circuit when the threshold is reached or a trial fails.
+
+    Args:
+      now (float): The current time.monotonic() value.
+
+    Returns:
+      bool: True if this failure opened the circuit.
+    """
+    self.failures += 1
+    if self.trial:
+      self.trial = False
+      self.cooldown = min(self.max_cooldown, self.cooldown * 2)
+    elif self.failures != self.threshold:
+      return False
+    self.open_until = now + self.cooldown
+    return True
+
+class PriceSources:
+  """
+  Fetch the price from several sources and return the first valid answer.
+
+  Sources are tried in order as hedged requests: the next source starts when the ones
+  already running have failed, or have not answered within hedge_delay seconds. A healthy
+  primary answers alone, so the price does not flap between sources that round slightly
+  differently, while a slow or failing one costs at most hedge_delay. Each source has a
+  latency budget and a circuit breaker, and sources whose circuit is open are skipped.
+  Requests still running when an answer arrives finish in the background, so their
+  breakers and the 5-minute feed's cursor stay current.
+  """
+
+  def __init__(self, sources, hedge_delay=1.0):
+    """
+    Initialize the PriceSources.
+
+    Args:
+      sources (list): PriceSource objects, in order of preference.
+      hedge_delay (float, optional): Seconds to wait for a source before also asking the next. Defaults to 1.0.
+    """
+    self.sources = list(sources)
+    self.hedge_delay = hedge_delay
+    self.breakers = {source.name: CircuitBreaker() for source in self.sources}
+    self._background = set()
+
+  async def fetch(self, session):
+    """
+    Fetch the current price from the first source to return a valid one.
+
+    Args:
+      session (aiohttp.ClientSession): The shared HTTP session to use.
+
+    Returns:
+      float or None: The current price, or None if every source failed.
+    """
+    waiting = list(self.sources)
+    running = set()
+    started = 0
+    try:
+      while True:
+        # The breaker is only asked when a source is about to start, so a half-open trial is never claimed unused.
+        now = time.monotonic()
+        while waiting and not self.breakers[waiting[0].name].allow(now):
+          waiting.pop(0)
+        if waiting:
+          running.add(asyncio.ensure_future(self._fetch_source(waiting.pop(0), session)))
+          started += 1
+        if not running:
+          break
+        done, running = await asyncio.wait(running, timeout=self.hedge_delay if waiting else None,
+                                           return_when=asyncio.FIRST_COMPLETED)
+        for task in done:
+          price = task.result()
+          if price is not None:
+            return price
+      if not started:
+        logger.error("Every price source is unavailable; their circuits are open")
+      return None
+    finally:
+      for task in running:
+        self._background.add(task)
+        task.add_done_callback(self._background.discard)
+
+  async def _fetch_source(self, source, session):
+    """
+    Fetch from one source within its latency budget and update its circuit breaker.
+
+    Args:
+      source (PriceSource): The source to fetch from.
+      session (aiohttp.ClientSession): The shared HTTP session to use.
+
+    Returns:
+      float or None: The price if it is valid, None otherwise.
+    """
+    price = None
+    try:
+      with UPSTREAM_SECONDS.time((source.name,)):
+        price = await asyncio.wait_for(source.fetch(session), source.budget)
+    except asyncio.TimeoutError:
+      logger.error("Price source %s exceeded its %.1fs latency budget", source.name, source.budget)
+    # pylint: disable=broad-except
+    except Exception as e:
+      logger.error("Price source %s failed: %s", source.name, str(e))
+
+    breaker = self.breakers[source.name]
+    if price is not None and math.isfinite(price):
+      breaker.record_success()
+      return price
+    UPSTREAM_FAILURES.inc(labels=(source.name,))
+    if breaker.record_failure(time.monotonic()):
+      logger.warning("Skipping price source %s for %.0fs after %s consecutive failures",
+                     source.name, breaker.cooldown, breaker.failures)
+    return None
+
+  def circuit_states(self):
+    """
+    Get whether each source's circuit is open.
+
+    Returns:
+      dict: A mapping of source name to True if calls to it are being refused.
+    """
+    now = time.monotonic()
+    return {name: breaker.is_open(now) for name, breaker in self.breakers.items()}
+
+  async def close(self):
+    """
+    Cancel requests still running in the background.
+    """
+    for task in list(self._background):
+      task.cancel()
+    await asyncio.gather(*self._background, return_exceptions=True)
+
+def load_price_sources():
+  """
+  Build the price sources configured by the environment.
+
+  PRICE_SOURCES lists the sources in order of preference out of hourly, 5minute and
+  mirror (default "hourly,5minute,mirror"); the mirror is only used when
+  PRICE_MIRROR_URL points at an endpoint serving the currenthouraverage format.
+  PRICE_FEED=5minute still puts the 5-minute feed first when PRICE_SOURCES is unset.
+
+  Returns:
+    PriceSources: The configured sources.
+  """
+  api_base = os.environ.get('COMED_API_URL', "https://hourlypricing.comed.com/api")
+  mirror_url = os.environ.get('PRICE_MIRROR_URL')
+  available = {
+    'hourly': lambda: HourlyAverageSource(f"{api_base}?type=currenthouraverage"),
+    '5minute': lambda: FiveMinuteSource(api_base),
+  }
+  if mirror_url:
+    available['mirror'] = lambda: HourlyAverageSource(mirror_url, name='mirror')
+  default = '5minute,hourly,mirror' if os.environ.get('PRICE_FEED') == '5minute' else 'hourly,5minute,mirror'
+  sources = []
+  for name in os.environ.get('PRICE_SOURCES', default).split(','):
+    name = name.strip()
+    if name in available:
+      sources.append(available[name]())
+    elif name != 'mirror':
+      logger.error("Ignoring unknown price source %s", name)
+  return PriceSources(sources, hedge_delay=float(os.environ.get('PRICE_HEDGE_DELAY', 1.0)))
@@ -0,0 +1,182 @@
+import heapq
+import time
+
+from discord import app_commands
+
+class TokenBucket:
+  """
+  A token bucket holding up to rate tokens that refill evenly over per seconds.
+  """
+
+  __slots__ = ('rate', 'per', 'tokens', 'updated')
+
+  def __init__(self, rate, per, now):
+    """
+    Initialize a full TokenBucket.
+
+    Args:
+      rate (int): The bucket capacity and the number of tokens refilled per period.
+      per (float): The refill period in seconds.
+      now (float): The current monotonic time.
+    """
+    self.rate = rate
+    self.per = per
+    self.tokens = float(rate)
+    self.updated = now
+
+  def refill(self, now):
+    """
+    Add the tokens earned since the last update.
+
+    Args:
+      now (float): The current monotonic time.
+    """
+    self.tokens = min(self.rate, self.tokens + (now - self.updated) * self.rate / self.per)
+    self.updated = now
+
+  def retry_after(self, now):
+    """
+    Get how long until a token is available.
+
+    Args:
+      now (float): The current monotonic time.
+
+    Returns:
+      float: Seconds to wait, or 0.0 if a token is available now.
+    """
+    self.refill(now)
+    # Allow for rounding in the refill so a token that is due is not reported as a few ulps away.
+    return 0.0 if self.tokens >= 1 - 1e-9 else (1 - self.tokens) * self.per / self.rate
+
+  def consume(self):
+    """
+    Take one token; callers check retry_after first.
+    """
+    self.tokens -= 1
+
+  def full_at(self):
+    """
+    Get when the bucket will be full again, after which it is indistinguishable from a new one.
+
+    Returns:
+      float: The monotonic time the bucket refills completely.
+    """
+    return self.updated + (self.rate - self.tokens) * self.per / self.rate
+
+class RateLimiter:
+  """
+  Per-key token buckets with an optional global bucket shared by every key.
+
+  Idle buckets are evicted once they have refilled completely, tracked with a heap of
+  expiry times, so memory is bounded by the number of keys active within one period.
+  """
+
+  def __init__(self, rate, per, global_rate=None, global_per=None):
+    """
+    Initialize the RateLimiter.
+
+    Args:
+      rate (int): Uses allowed per key in each period.
+      per (float): The per-key period in seconds.
+      global_rate (int, optional): Uses allowed across all keys in each global period. Defaults to None.
+      global_per (float, optional): The global period in seconds. Defaults to per.
+    """
+    self.rate = rate
+    self.per = per
+    self.buckets = {}
+    self._expiry = []
+    self.global_rate = global_rate
+    self.global_per = global_per or per
+    self.global_bucket = None
+
+  def __len__(self):
+    return len(self.buckets)
+
+  def hit(self, key, now=None):
+    """
+    Try to use one token for a key.
+
+    Args:
+      key: The key to limit, e.g. a user ID.
+      now (float, optional): The current monotonic time. Defaults to time.monotonic().
+
+    Returns:
+      tuple: A tuple (retry_after, is_global); retry_after is 0.0 if the use was allowed.
+    """
+    if now is None:
+      now = time.monotonic()
+    self.expire(now)
+
+    bucket = self.buckets.get(key)
+    if bucket is None:
+      bucket = TokenBucket(self.rate, self.per, now)
+    retry_after = bucket.retry_after(now)
+    if retry_after:
+      return retry_after, False
+    if self.global_rate is not None:
+      if self.global_bucket is None:
+        self.global_bucket = TokenBucket(self.global_rate, self.global_per, now)
+      retry_after = self.global_bucket.retry_after(now)
+      if retry_after:
+        return retry_after, True
+      self.global_bucket.consume()
+
+    bucket.consume()
+    self.buckets[key] = bucket
+    heapq.heappush(self._expiry, (bucket.full_at(), key))
+    return 0.0, False
+
+  def expire(self, now):
+    """
+    Evict buckets that have been idle long enough to refill completely.
+
+    Args:
+      now (float): The current monotonic time.
+    """
+    expiry = self._expiry
+    while expiry and expiry[0][0] <= now:
+      _, key = heapq.heappop(expiry)
+      bucket = self.buckets.get(key)
+      # A bucket used again since this entry was pushed has a later entry of its own.
+      if bucket is not None and bucket.full_at() <= now:
+        del self.buckets[key]
+
+class CommandRateLimited(app_commands.CheckFailure):
+  """
+  Raised by the rate_limit check when a command invocation is over its limit.
+  """
+
+  def __init__(self, retry_after, is_global):
+    """
+    Initialize the CommandRateLimited error.
+
+    Args:
+      retry_after (float): Seconds until the command can be used again.
+      is_global (bool): Whether the global bucket, rather than the user's, is exhausted.
+    """
+    super().__init__(f'Rate limited, retry in {retry_after:.1f}s')
+    self.retry_after = retry_after
+    self.is_global = is_global
+
+def rate_limit(rate, per, global_rate=None, global_per=None):
+  """
+  Decorate an app command so each user may invoke it rate times per per seconds.
+
+  Args:
+    rate (int): Uses allowed per user in each period.
+    per (float): The per-user period in seconds.
+    global_rate (int, optional): Uses allowed across all users in each global period. Defaults to None.
+    global_per (float, optional): The global period in seconds. Defaults to per.
+
+  Returns:
+    callable: The app_commands check decorator.
+  """
+  limiter = RateLimiter(rate, per, global_rate, global_per)
+
+  def predicate(interaction):
+    retry_after, is_global = limiter.hit(interaction.user.id)
+    if retry_after:
+      raise CommandRateLimited(retry_after, is_global)
+    return True
+
+  return app_commands.check(predicate)
@@ -0,0 +1,126 @@
+import random
+from collections import deque
+from statistics import median
+
+class PublishScheduler:
+  """
+  Decide when to poll next so polls land shortly after each upstream publication.
+
+  The publish phase (seconds into each period) is learned from observed changes. A poll
+  that finds an unchanged price right after an expected publication retries shortly after,
+  and the time between that miss and the following change brackets the real publication.
+  A change found on the first poll nudges the estimate earlier, so the phase keeps being
+  probed instead of drifting later. Failures back off exponentially with jitter, and polls
+  are tighter early in each hour, when the hourly average moves the most.
+  """
+
+  def __init__(self, period=300, phase=30, margin=10, retry=20, boundary=900, boundary_margin=3,
+               boundary_retry=10, probe=2, backoff=5, max_backoff=300, window=12):
+    """
+    Initialize the PublishScheduler.
+
+    Args:
+      period (int, optional): Seconds between upstream publications. Defaults to 300.
+      phase (float, optional): The initial publish phase in seconds. Defaults to 30.
+      margin (float, optional): Seconds after the expected publication to poll. Defaults to 10.
+      retry (float, optional): Seconds between retries while a publication is late. Defaults to 20.
+      boundary (float, optional): Seconds after each hour treated as volatile. Defaults to 900.
+      boundary_margin (float, optional): The margin used near hour boundaries. Defaults to 3.
+      boundary_retry (float, optional): The retry interval used near hour boundaries. Defaults to 10.
+      probe (float, optional): Seconds the estimate moves earlier after a change found on time. Defaults to 2.
+      backoff (float, optional): The first backoff after a failure in seconds. Defaults to 5.
+      max_backoff (float, optional): The longest backoff in seconds. Defaults to 300.
+      window (int, optional): Number of recent phase estimates to keep. Defaults to 12.
+    """
+    self.period = period
+    self.phase = phase
+    self.margin = margin
+    self.retry = retry
+    self.boundary = boundary
+    self.boundary_margin = boundary_margin
+    self.boundary_retry = boundary_retry
+    self.probe = probe
+    self.backoff = backoff
+    self.max_backoff = max_backoff
+    self.estimates = deque(maxlen=window)
+    self.failures = 0
+    self.missed_at = None
+    self.streak = 0
+
+  def near_boundary(self, now):
+    """
+    Check whether a time falls in the volatile start of an hour.
+
+    Args:
+      now (float): The UNIX timestamp.
+
+    Returns:
+      bool: True if now is within boundary seconds after the top of an hour.
+    """
+    return now % 3600 < self.boundary
+
+  def next_delay(self, now, outcome):
+    """
+    Record the outcome of a poll and get how long to wait before the next one.
+
+    Args:
+      now (float): The UNIX timestamp of the poll.
+      outcome (str): 'changed', 'unchanged' or 'failed'.
+
+    Returns:
+      float: Seconds until the next poll.
+    """
+    if outcome == 'failed':
+      self.failures += 1
+      backoff = min(self.max_backoff, self.backoff * 2 ** (self.failures - 1))
+      return random.uniform(backoff / 2, backoff)
+    self.failures = 0
+
+    near_boundary = self.near_boundary(now)
+    retry = self.boundary_retry if near_boundary else self.retry
+    if outcome == 'changed':
+      if self.missed_at is not None and now - self.missed_at <= 2 * self.retry:
+        # The publication happened between the missed poll and this one.
+        self.learn((self.missed_at + now) / 2)
+      else:
+        # Consecutive on-time changes probe earlier and earlier until a poll misses.
+        margin = self.boundary_margin if near_boundary else self.margin
+        self.learn(now - margin - self.probe * 2 ** min(self.streak, 5))
+        self.streak += 1
+      self.missed_at = None
+      # Skip ahead half a period so a small margin cannot schedule another poll for the publication just seen.
+      return self.until_publication(now + self.period / 2) + self.period / 2
+
+    self.missed_at = now
+    self.streak = 0
+    since_publication = (now - self.phase) % self.period
+    if since_publication + retry < self.period / 2:
+      return retry
+    return self.until_publication(now)
+
+  def learn(self, published_at):
+    """
+    Add a publication time estimate and update the phase to the median of recent estimates.
+
+    Args:
+      published_at (float): The estimated UNIX timestamp of a publication.
+    """
+    self.estimates.append(published_at % self.period)
+    # Take the median of offsets from the current phase so estimates on either side of the period wrap agree.
+    half = self.period / 2
+    offsets = [(estimate - self.phase + half) % self.period - half for estimate in self.estimates]
+    self.phase = (self.phase + median(offsets)) % self.period
+
+  def until_publication(self, now):
+    """
+    Get the seconds until shortly after the next expected publication.
+
+    Args:
+      now (float): The current UNIX timestamp.
+
+    Returns:
+      float: Seconds to wait.
+    """
+    margin = self.boundary_margin if self.near_boundary(now) else self.margin
+    offset = self.phase + margin
+    return ((now - offset) // self.period + 1) * self.period + offset - now
@@ -0,0 +1,160 @@
+import asyncio
+import json
+import os
+import time
+
+from logger import logger
+
+# The comparison price used when it has never been scraped successfully.
+DEFAULT_PRICE_TO_COMPARE = float(os.environ.get('DEFAULT_PRICE_TO_COMPARE', 6.9))
+
+def parse_price_table(table_html):
+  """
+  Parse the price to compare out of the HTML of the first table on the page.
+
+  Args:
+    table_html (str): The HTML of the table.
+
+  Returns:
+    float or None: The parsed price, or None if the table has an unexpected layout.
+  """
+  # bs4 is only needed for the weekly scrape, so it is imported on first use to keep startup fast.
+  # pylint: disable=import-outside-toplevel
+  from bs4 import BeautifulSoup
+
+  table = BeautifulSoup(table_html, 'html.parser').find('table')
+  if table:
+    # Find the cell with the price (should be the second cell in the second row)
+    rows = table.find_all('tr')
+    if len(rows) >= 2:
+      price_cell = rows[1].find_all('td')
+      if len(price_cell) >= 1:
+        # Extract the price value
+        price_text = price_cell[0].text.strip()
+        # Remove 'cents per kWh' and convert to float
+        return float(price_text.split()[0])
+  return None
+
+async def read_first_table(response, chunk_size=16384):
+  """
+  Stream a response body until the end of its first table.
+
+  Args:
+    response (aiohttp.ClientResponse): The response to read.
+    chunk_size (int, optional): Bytes to read per chunk. Defaults to 16384.
+
+  Returns:
+    tuple: A tuple (table_html, bytes_read) where table_html is None if no complete table was found.
+  """
+  body = bytearray()
+  lowered = bytearray()
+  async for chunk in response.content.iter_chunked(chunk_size):
+    body += chunk
+    lowered += chunk.lower()
+    # Search from slightly before the new chunk in case the tag spans two chunks.
+    end = lowered.find(b'</table', max(0, len(lowered) - len(chunk) - 8))
+    if end != -1:
+      start = lowered.find(b'<table')
+      close = lowered.find(b'>', end)
+      table = body[start:close + 1 if close != -1 else len(body)]
+      return table.decode(response.charset or 'utf-8', errors='replace'), len(body)
+  return None, len(body)
+
+class PriceToCompareScraper:
+  """
+  Scrape the ComEd price to compare with conditional requests and an on-disk cache.
+  """
+
+  def __init__(self, url, cache_path):
+    """
+    Initialize the PriceToCompareScraper and load the cached value if there is one.
+
+    Args:
+      url (str): The URL of the price to compare page.
+      cache_path (str): The path of the JSON file caching the last scraped value.
+    """
+    self.url = url
+    self.cache_path = cache_path
+    self.price = None
+    self.etag = None
+    self.last_modified = None
+    self.bytes_transferred = 0
+    self.parse_time = 0.0
+    self.load_cache()
+
+  def load_cache(self):
+    """
+    Load the last scraped value and its validators from disk.
+    """
+    try:
+      with open(self.cache_path, encoding='utf-8') as file:
+        cached = json.load(file)
+      self.price = cached.get('price')
+      self.etag = cached.get('etag')
+      self.last_modified = cached.get('last_modified')
+    except FileNotFoundError:
+      pass
+    except (OSError, ValueError) as e:
+      logger.error("Failed to load cached price to compare: %s", str(e))
+
+  def save_cache(self):
+    """
+    Save the last scraped value and its validators to disk.
+    """
+    try:
+      os.makedirs(os.path.dirname(self.cache_path) or '.', exist_ok=True)
+      with open(self.cache_path, 'w', encoding='utf-8') as file:
+        json.dump({'price': self.price, 'etag': self.etag, 'last_modified': self.last_modified}, file)
+    except OSError as e:
+      logger.error("Failed to cache price to compare: %s", str(e))
+
+  async def fetch(self, session):
+    """
+    Fetch the price to compare, skipping the download and parse if the page is unchanged.
+
+    Args:
+      session (aiohttp.ClientSession): The shared HTTP session to use.
+
+    Returns:
+      float or None: The price to compare, or None if unsuccessful.
+    """
+    headers = {}
+    if self.price is not None:
+      if self.etag:
+        headers['If-None-Match'] = self.etag
+      if self.last_modified:
+        headers['If-Modified-Since'] = self.last_modified
+
+    try:
+      async with session.get(self.url, headers=headers) as response:
+        if response.status == 304:
+          logger.info("Price to compare page is unchanged; keeping %s", self.price)
+          return self.price
+        if response.status != 200:
+          logger.error("Error fetching ComEd price to compare: HTTP %s", response.status)
+          return None
+
+        table_html, received = await read_first_table(response)
+        self.bytes_transferred += received
+        if table_html is None:
+          logger.error("No price table found in %s bytes", received)
+          return None
+
+        started = time.perf_counter()
+        price = parse_price_table(table_html)
+        self.parse_time = time.perf_counter() - started
+        logger.info("Scraped price to compare %s from %s bytes, parsed in %.1f ms",
+                    price, received, self.parse_time * 1000)
+
+        if price is not None:
+          self.price = price
+          self.etag = response.headers.get('ETag')
+          self.last_modified = response.headers.get('Last-Modified')
+          self.save_cache()
+        return price
+    except asyncio.TimeoutError:
+      logger.error("Timed out fetching ComEd price to compare")
+    # pylint: disable=broad-except
+    except Exception as e:
+      logger.error("Error fetching ComEd price to compare: %s", str(e))
+    return None
@@ -0,0 +1,238 @@
+import argparse
+import csv
+import itertools
+import json
+import math
+import sqlite3
+import sys
+import time
+
+from logger import logger
+from migrations import migrate
+
+FIELDS = ('user_id', 'threshold', 'hysteresis', 'min_interval')
+# The ranges accepted by the toggle command; min_interval is stored in seconds.
+MAX_HYSTERESIS = 100.0
+MAX_MIN_INTERVAL = 1440 * 60
+# Thresholds are in cents per kWh. ComEd's hourly price has stayed well inside this range, including negative prices.
+MIN_THRESHOLD = -100.0
+MAX_THRESHOLD = 1000.0
+
+def connect(db_path):
+  """
+  Open the bot database for bulk work, migrating its schema first.
+
+  Args:
+    db_path (str): The path to the SQLite database file.
+
+  Returns:
+    sqlite3.Connection: The connection.
+  """
+  conn = sqlite3.connect(db_path, timeout=30)
+  conn.execute('PRAGMA journal_mode=WAL')
+  conn.execute('PRAGMA synchronous=NORMAL')
+  # A larger page cache keeps most of the primary key and threshold index in memory during bulk writes.
+  conn.execute('PRAGMA cache_size=-65536')
+  migrate(conn)
+  return conn
+
+def read_records(file, file_format):
+  """
+  Stream subscriber records from a CSV or JSONL file.
+
+  CSV files need a header row naming the columns; only user_id is required.
+
+  Args:
+    file (file): The open file.
+    file_format (str): 'csv' or 'jsonl'.
+
+  Yields:
+    tuple: Tuples of (line_number, values) where values holds the raw value of each of FIELDS,
+      or is None for a JSONL line that is not a JSON object, so it is rejected instead of ending the import.
+  """
+  if file_format == 'csv':
+    reader = csv.reader(file)
+    header = next(reader, [])
+    if 'user_id' not in header:
+      raise ValueError("The CSV header has no user_id column")
+    columns = [header.index(field) if field in header else None for field in FIELDS]
+    width = len(header)
+    for row in reader:
+      if len(row) != width:
+        yield reader.line_num, None
+      else:
+        yield reader.line_num, tuple(None if column is None else row[column] for column in columns)
+  else:
+    for line_number, line in enumerate(file, 1):
+      if line.strip():
+        try:
+          record = json.loads(line)
+        except ValueError:
+          record = None
+        yield line_number, tuple(record.get(field) for field in FIELDS) if isinstance(record, dict) else None
+
+def parse_record(values):
+  """
+  Validate a subscriber record and convert it to a database row.
+
+  Args:
+    values (tuple): The raw (user_id, threshold, hysteresis, min_interval); empty or missing settings use the defaults.
+
+  Returns:
+    tuple: A tuple (user_id, threshold, hysteresis, min_interval).
+
+  Raises:
+    ValueError: If the record is malformed or a value is out of range.
+  """
+  if values is None:
+    raise ValueError(f"expected the fields {', '.join(FIELDS)}")
+  user_id, threshold, hysteresis, min_interval = values
+  user_id = int(user_id)
+  threshold = None if threshold is None or threshold == '' else float(threshold)
+  hysteresis = float(hysteresis) if hysteresis else 0.0
+  min_interval = int(min_interval) if min_interval else 0
+  if user_id <= 0:
+    raise ValueError(f"invalid user_id {user_id}")
+  # SQLite stores NaN as NULL, which would silently switch the user to the default threshold.
+  if threshold is not None and not math.isfinite(threshold):
+    raise ValueError(f"threshold {threshold} is not a finite number")
+  if threshold is not None and not MIN_THRESHOLD <= threshold <= MAX_THRESHOLD:
+    raise ValueError(f"threshold {threshold} is outside {MIN_THRESHOLD:g}-{MAX_THRESHOLD:g}")
+  if not 0 <= hysteresis <= MAX_HYSTERESIS:
+    raise ValueError(f"hysteresis {hysteresis} is outside 0-{MAX_HYSTERESIS:g}")
+  if not 0 <= min_interval <= MAX_MIN_INTERVAL:
+    raise ValueError(f"min_interval {min_interval} is outside 0-{MAX_MIN_INTERVAL}")
+  return user_id, threshold, hysteresis, min_interval
+
+def import_subscribers(conn, records, batch_size=50000, skip_existing=False):
+  """
+  Insert or update subscribers from a stream of records in batches.
+
+  Each batch is one executemany in one transaction, so memory stays bounded by the
+  batch size and an interrupted import keeps the batches already committed.
+
+  Args:
+    conn (sqlite3.Connection): The database connection.
+    records (iterable): Tuples of (line_number, values) as yielded by read_records.
+    batch_size (int, optional): Records per transaction. Defaults to 50000.
+    skip_existing (bool, optional): Keep the settings of users who already exist. Defaults to False,
+      which overwrites them.
+
+  Returns:
+    tuple: A tuple (imported, rejected) with the number of records written and rejected.
+  """
+  if skip_existing:
+    sql = 'INSERT OR IGNORE INTO subscribed_users (user_id, threshold, hysteresis, min_interval) VALUES (?, ?, ?, ?)'
+  else:
+    sql = '''INSERT INTO subscribed_users (user_id, threshold, hysteresis, min_interval) VALUES (?, ?, ?, ?)
+             ON CONFLICT(user_id) DO UPDATE SET threshold = excluded.threshold, hysteresis = excluded.hysteresis,
+                                                min_interval = excluded.min_interval
+          '''
+  imported = rejected = 0
+  records = iter(records)
+  while True:
+    batch = list(itertools.islice(records, batch_size))
+    if not batch:
+      return imported, rejected
+    rows = []
+    for line_number, values in batch:
+      try:
+        rows.append(parse_record(values))
+      except (TypeError, ValueError) as e:
+        rejected += 1
+        logger.error("Skipping subscriber record on line %s: %s", line_number, str(e))
+    with conn:
+      conn.executemany(sql, rows)
+    imported += len(rows)
+
+def export_subscribers(conn, file, file_format, batch_size=50000):
+  """
+  Stream every subscriber's settings to a CSV or JSONL file, ordered by user ID.
+
+  Args:
+    conn (sqlite3.Connection): The database connection.
+    file (file): The open file to write to.
+    file_format (str): 'csv' or 'jsonl'.
+    batch_size (int, optional): Rows fetched at a time. Defaults to 50000.
+
+  Returns:
+    int: The number of subscribers exported.
+  """
+  if file_format == 'csv':
+    cursor = conn.execute(f'SELECT {", ".join(FIELDS)} FROM subscribed_users ORDER BY user_id')
+    writer = csv.writer(file)
+    writer.writerow(FIELDS)
+  else:
+    # SQLite renders the JSON objects, which is several times faster than json.dumps per row.
+    pairs = ', '.join(f"'{field}', {field}" for field in FIELDS)
+    cursor = conn.execute(f'SELECT json_object({pairs}) || char(10) FROM subscribed_users ORDER BY user_id')
+  exported = 0
+  while True:
+    rows = cursor.fetchmany(batch_size)
+    if not rows:
+      return exported
+    if file_format == 'csv':
+      writer.writerows(rows)
+    else:
+      file.writelines(row[0] for row in rows)
+    exported += len(rows)
+
+def guess_format(path):
+  """
+  Guess a file's format from its extension.
+
+  Args:
+    path (str): The file path.
+
+  Returns:
+    str: 'jsonl' for .jsonl and .ndjson files, 'csv' otherwise.
+  """
+  return 'jsonl' if path.endswith(('.jsonl', '.ndjson')) else 'csv'
+
+def main():
+  """
+  Parse the command line and run an import or export.
+  """
+  parser = argparse.ArgumentParser(description="Bulk import and export subscribers of the bot database.")
+  parser.add_argument('--db', default='data/bot.db', help="The bot database.")
+  commands = parser.add_subparsers(dest='command', required=True)
+  export_parser = commands.add_parser('export', help="Write every subscriber's settings to a file.")
+  export_parser.add_argument('output', nargs='?', default='-', help="The file to write, or - for stdout.")
+  export_parser.add_argument('--format', choices=('csv', 'jsonl'), help="Defaults to the file extension, else csv.")
+  import_parser = commands.add_parser('import', help="Add or update subscribers from a file.")
+  import_parser.add_argument('input', help="The file to read, or - for stdin.")
+  import_parser.add_argument('--format', choices=('csv', 'jsonl'), help="Defaults to the file extension, else csv.")
+  import_parser.add_argument('--batch-size', type=int, default=50000, help="Records per transaction.")
+  import_parser.add_argument('--skip-existing', action='store_true',
+                             help="Keep the settings of existing subscribers instead of overwriting them.")
+  args = parser.parse_args()
+
+  conn = connect(args.db)
+  started = time.perf_counter()
+  try:
+    if args.command == 'export':
+      file_format = args.format or guess_format(args.output)
+      if args.output == '-':
+        count = export_subscribers(conn, sys.stdout, file_format)
+      else:
+        with open(args.output, 'w', newline='', encoding='utf-8') as file:
+          count = export_subscribers(conn, file, file_format)
+      print(f"Exported {count} subscribers in {time.perf_counter() - started:.1f}s", file=sys.stderr)
+    else:
+      file_format = args.format or guess_format(args.input)
+      if args.input == '-':
+        imported, rejected = import_subscribers(conn, read_records(sys.stdin, file_format), args.batch_size,
+                                                args.skip_existing)
+      else:
+        with open(args.input, newline='', encoding='utf-8') as file:
+          imported, rejected = import_subscribers(conn, read_records(file, file_format), args.batch_size,
+                                                  args.skip_existing)
+      logger.info("Imported %s subscribers from %s; rejected %s", imported, args.input, rejected)
+      # The running bot keeps its threshold index in memory and only reads the table at startup.
+      print(f"Imported {imported} subscribers in {time.perf_counter() - started:.1f}s, rejected {rejected}. "
+            "Restart the bot to alert the imported subscribers.", file=sys.stderr)
+  finally:
+    conn.close()
+
+if __name__ == "__main__":
+  main()
@@ -0,0 +1,48 @@
+import random
+
+import numpy as np
+
+from benchmarks.backtest import backtest
+from threshold_index import ThresholdIndex
+
+def replay(timestamps, prices, rows, price_to_compare):
+  """
+  Count alerts tick by tick through ThresholdIndex and the notified and min_interval rules of process_price.
+  """
+  index = ThresholdIndex()
+  index.load(rows)
+  notified, last_alerted = {}, {}
+  per_tick = [0] * len(prices)
+  per_user = {user_id: 0 for user_id, *_ in rows}
+  for tick in range(1, len(prices)):
+    price, now = prices[tick], timestamps[tick]
+    for user_id, threshold in index.crossed(prices[tick - 1], price, price_to_compare):
+      if notified.get(user_id) == (threshold, price > threshold):
+        continue
+      if now - last_alerted.get(user_id, 0) < index.min_interval(user_id):
+        continue
+      notified[user_id] = (threshold, price > threshold)
+      last_alerted[user_id] = now
+      per_tick[tick] += 1
+      per_user[user_id] += 1
+  return per_tick, [per_user[user_id] for user_id, *_ in rows]
+
+def test_backtest_matches_a_per_tick_replay():
+  rng = random.Random(0)
+  for _ in range(20):
+    # Prices and thresholds on a coarse grid, so prices often land exactly on triggers.
+    prices = [5.0]
+    for _ in range(300):
+      prices.append(round(prices[-1] + rng.choice((-1.0, -0.5, 0.0, 0.5, 1.0)), 1))
+    timestamps = [1700000000 + 300 * tick for tick in range(len(prices))]
+    rows = [(user_id, rng.choice((None, 3.0, 4.5, 5.0, 6.5, 7.0)), rng.choice((0.0, 0.0, 0.5, 1.0)),
+             rng.choice((0, 0, 600, 1800))) for user_id in range(1, 201)]
+    expected_tick, expected_user = replay(timestamps, prices, rows, 6.0)
+
+    thresholds = np.array([np.nan if threshold is None else threshold for _, threshold, _, _ in rows])
+    hysteresis = np.array([row[2] for row in rows])
+    min_intervals = np.array([row[3] for row in rows], dtype=np.int64)
+    per_tick, per_user = backtest(np.array(timestamps, dtype=np.int64), np.array(prices), thresholds,
+                                  hysteresis, min_intervals, 6.0)
+    assert per_tick.tolist() == expected_tick
+    assert per_user.tolist() == expected_user
@@ -0,0 +1,57 @@
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+
+from bot import Bot
+
+@pytest.fixture
+def bot(tmp_path, monkeypatch):
+  monkeypatch.setenv('METRICS_PORT', '0')
+  bot = Bot(data_dir=str(tmp_path))
+  yield bot
+  bot.db.close()
+
+def test_flush_keeps_delivered_alerts_when_the_write_fails(bot):
+  written = []
+  attempts = []
+
+  def mark_delivered(alerts, now):
+    attempts.append(list(alerts))
+    if len(attempts) == 1:
+      raise RuntimeError('database is locked')
+    written.extend(alerts)
+
+  bot.db.mark_delivered = mark_delivered
+
+  async def run():
+    bot.delivered_alerts.append((1, 'user', 1, 5.0, 6.0))
+    with pytest.raises(RuntimeError):
+      await bot.flush_delivered()
+    bot.delivered_alerts.append((1, 'user', 2, 5.0, 6.0))
+    await bot.flush_delivered()
+
+  asyncio.run(run())
+  assert written == [(1, 'user', 1, 5.0, 6.0), (1, 'user', 2, 5.0, 6.0)]
+  assert bot.delivered_alerts == []
+
+def test_weekly_refresh_starts_once_and_skips_its_first_run(bot, monkeypatch):
+  scrapes = []
+
+  async def update_price_to_compare():
+    scrapes.append(True)
+
+  monkeypatch.setattr(Bot, 'user', SimpleNamespace(name='bot'))
+  bot.update_price_to_compare = update_price_to_compare
+  # Keep on_ready from starting the alert loop.
+  bot.alert_task = object()
+
+  async def run():
+    # on_ready fires again after a reconnect that could not resume the session.
+    await bot.on_ready()
+    await bot.on_ready()
+    await asyncio.sleep(0.01)
+    bot.update_price_to_compare_weekly.cancel()
+
+  asyncio.run(run())
+  assert not scrapes
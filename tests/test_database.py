@@ -0,0 +1,16 @@
+import pytest
+
+from database import Database
+
+@pytest.fixture
+def db(tmp_path):
+  db = Database(str(tmp_path / 'bot.db'))
+  yield db
+  db.close()
+
+def test_price_sample_at_an_existing_timestamp_leaves_the_rollup_alone(db):
+  db.add_price_sample(7200, 4.0)
+  db.add_price_sample(7200, 6.0)
+  db.add_price_sample(7500, 2.0)
+  assert db.get_price_samples(0) == [(7200, 4.0), (7500, 2.0)]
+  assert db.get_hourly_rollups(0) == [(7200, 2.0, 4.0, 6.0, 2)]
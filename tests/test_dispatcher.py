@@ -0,0 +1,31 @@
+import asyncio
+
+from dispatcher import AlertDispatcher
+
+def test_on_delivered_failures_do_not_fail_the_send():
+  sent, recorded = [], []
+
+  async def deliver(key, value):
+    sent.append((key, value))
+
+  async def on_delivered(key, value):
+    if key == 2:
+      raise RuntimeError('database is locked')
+    await asyncio.sleep(0.05)
+    recorded.append((key, value))
+
+  async def run():
+    dispatcher = AlertDispatcher(deliver, workers=2, on_delivered=on_delivered)
+    dispatcher.start()
+    for key in range(1, 4):
+      dispatcher.enqueue(key, key * 10)
+    stats = await dispatcher.join()
+    await dispatcher.stop()
+    return stats
+
+  stats = asyncio.run(run())
+  assert sorted(sent) == [(1, 10), (2, 20), (3, 30)]
+  assert sorted(recorded) == [(1, 10), (3, 30)]
+  assert sorted(stats.delivered) == [1, 2, 3] and stats.failed == 0
+  # Latency covers the send, not the time spent recording it.
+  assert stats.latency_max < 0.05
@@ -0,0 +1,13 @@
+from feed import HOUR_MILLIS, FiveMinuteFeed
+
+def test_hour_average_covers_only_the_current_hour():
+  feed = FiveMinuteFeed('http://comed.invalid/api')
+  hour = 1700000000000 - 1700000000000 % HOUR_MILLIS
+  assert feed.hour_average((hour + 60000) / 1000) is None
+  feed.ingest(hour + 300000, 4.0)
+  feed.ingest(hour + 600000, 5.0)
+  assert feed.hour_average((hour + 900000) / 1000) == 4.5
+  # After the hour rolls over, the previous hour's average is not reported as the current price.
+  assert feed.hour_average((hour + HOUR_MILLIS + 60000) / 1000) is None
+  feed.ingest(hour + HOUR_MILLIS + 300000, 7.0)
+  assert feed.hour_average((hour + HOUR_MILLIS + 360000) / 1000) == 7.0
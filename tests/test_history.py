@@ -0,0 +1,16 @@
+from history import PriceRingBuffer, downsample_rollups, downsample_samples
+
+def test_ring_buffer_keeps_the_newest_samples():
+  buffer = PriceRingBuffer(3)
+  buffer.extend((timestamp, timestamp / 10) for timestamp in range(5))
+  assert buffer.oldest() == 2
+  assert buffer.newest() == (4, 0.4)
+  assert buffer.since(3) == [(3, 0.3), (4, 0.4)]
+
+def test_downsample_reports_each_bucket_with_its_sample_count():
+  samples = [(0, 1.0), (10, 3.0), (20, 5.0), (60, 7.0)]
+  assert downsample_samples(samples, 0, 60, 2) == [(0, 1.0, 3.0, 5.0, 3), (60, 7.0, 7.0, 7.0, 1)]
+
+def test_downsample_rollups_combines_totals_and_counts():
+  rollups = [(0, 1.0, 5.0, 36.0, 12), (3600, 2.0, 4.0, 3.0, 1), (7200, 9.0, 9.0, 9.0, 1)]
+  assert downsample_rollups(rollups, 0, 7200, 1) == [(0, 1.0, 39.0 / 13, 5.0, 13)]
@@ -0,0 +1,31 @@
+from metrics import Counter, Gauge, Histogram, Registry
+
+def test_counter_reads_its_callback_at_scrape_time():
+  lookups = {'hit': 0}
+  registry = Registry()
+  registry.register(Counter('lookups_total', "Lookups.", ('result',), function=lambda: {('hit',): lookups['hit']}))
+  lookups['hit'] = 3
+  assert registry.render().splitlines() == [
+    '# HELP lookups_total Lookups.',
+    '# TYPE lookups_total counter',
+    'lookups_total{result="hit"} 3',
+  ]
+
+def test_render_formats_labels_and_cumulative_buckets():
+  counter = Counter('polls_total', "Polls.", ('outcome',))
+  counter.inc(labels=('changed',))
+  counter.inc(2, labels=('changed',))
+  gauge = Gauge('subscribers', "Subscribers.")
+  gauge.set(5)
+  histogram = Histogram('tick_seconds', "Ticks.", buckets=(0.1, 1.0))
+  histogram.observe(0.05)
+  histogram.observe(0.5)
+  assert counter.render() == ['polls_total{outcome="changed"} 3']
+  assert gauge.render() == ['subscribers 5']
+  assert histogram.render() == [
+    'tick_seconds_bucket{le="0.1"} 1',
+    'tick_seconds_bucket{le="1.0"} 2',
+    'tick_seconds_bucket{le="+Inf"} 2',
+    'tick_seconds_sum 0.55',
+    'tick_seconds_count 2',
+  ]
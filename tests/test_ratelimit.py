@@ -0,0 +1,52 @@
+import random
+
+import pytest
+
+from ratelimit import RateLimiter
+
+def test_limits_each_key_and_refills_evenly():
+  limiter = RateLimiter(2, 60)
+  assert limiter.hit('a', now=0) == (0.0, False)
+  assert limiter.hit('a', now=0) == (0.0, False)
+  retry_after, is_global = limiter.hit('a', now=0)
+  assert retry_after == pytest.approx(30) and not is_global
+  assert limiter.hit('b', now=0) == (0.0, False)
+  assert limiter.hit('a', now=30) == (0.0, False)
+
+def test_global_bucket_is_shared_by_every_key():
+  limiter = RateLimiter(5, 60, global_rate=2, global_per=1)
+  assert limiter.hit('a', now=0)[0] == 0.0
+  assert limiter.hit('b', now=0)[0] == 0.0
+  retry_after, is_global = limiter.hit('c', now=0)
+  assert retry_after == pytest.approx(0.5) and is_global
+  # A use refused by the global bucket does not take a token from the key.
+  assert 'c' not in limiter.buckets
+
+def test_buckets_expire_once_full_and_not_before():
+  limiter = RateLimiter(1, 60)
+  limiter.hit('a', now=0)
+  limiter.hit('b', now=30)
+  limiter.expire(59.9)
+  assert len(limiter) == 2
+  limiter.expire(60)
+  assert set(limiter.buckets) == {'b'}
+  # Using a bucket again pushes its expiry back, and the stale heap entry leaves it alone.
+  limiter.hit('b', now=90)
+  limiter.expire(120)
+  assert set(limiter.buckets) == {'b'}
+  limiter.expire(150)
+  assert len(limiter) == 0 and not limiter._expiry # pylint: disable=protected-access
+
+def test_expiry_does_not_change_decisions():
+  rng = random.Random(0)
+  events = sorted((rng.uniform(0, 3600), rng.randint(1, 1000)) for _ in range(5000))
+  expiring = RateLimiter(3, 60)
+  keeping = RateLimiter(3, 60)
+  keeping.expire = lambda now: None
+  peak = 0
+  for now, key in events:
+    assert expiring.hit(key, now) == pytest.approx(keeping.hit(key, now))
+    peak = max(peak, len(expiring))
+  # Memory follows the keys active within one period rather than every key ever seen.
+  assert len(keeping) > 950
+  assert peak < 100
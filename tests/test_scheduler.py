@@ -0,0 +1,58 @@
+import random
+from bisect import bisect_right
+
+import pytest
+
+from scheduler import PublishScheduler
+
+def simulate(phase, hours=48, jitter=5, seed=0):
+  """
+  Poll a feed that publishes every 300 s at phase +/- jitter, as run_price_alerts drives the scheduler.
+
+  Returns:
+    tuple: The mean seconds from each publication to the poll that saw it, and polls per publication.
+  """
+  rng = random.Random(seed)
+  start = 1700000000 - 1700000000 % 3600
+  published = [start + period * 300 + phase + rng.uniform(-jitter, jitter) for period in range(hours * 12)]
+  scheduler = PublishScheduler()
+  now, seen, polls, latencies = start, 0, 0, []
+  while now < published[-1]:
+    polls += 1
+    latest = bisect_right(published, now)
+    if latest > seen:
+      # Only the newest publication is visible, so any skipped ones count from their own time.
+      latencies.extend(now - published[index] for index in range(seen, latest))
+      seen = latest
+      outcome = 'changed'
+    else:
+      outcome = 'unchanged'
+    now += scheduler.next_delay(now, outcome)
+  return sum(latencies) / len(latencies), polls / len(published)
+
+@pytest.mark.parametrize('phase', [5, 30, 150, 290])
+def test_polls_follow_the_publish_phase(phase):
+  latency, polls = simulate(phase)
+  # A fixed 5-minute loop averages about half a period, 150 s, behind each publication.
+  assert latency < 12
+  assert polls < 1.6
+
+def test_failures_back_off_exponentially_up_to_the_maximum():
+  scheduler = PublishScheduler(backoff=5, max_backoff=60)
+  delays = [scheduler.next_delay(0, 'failed') for _ in range(6)]
+  for attempt, delay in enumerate(delays):
+    backoff = min(60, 5 * 2 ** attempt)
+    assert backoff / 2 <= delay <= backoff
+  scheduler.next_delay(0, 'unchanged')
+  assert scheduler.failures == 0
+
+def test_learn_takes_the_median_across_the_period_wrap():
+  scheduler = PublishScheduler(phase=298)
+  for published_at in (299, 1, 3):
+    scheduler.learn(published_at)
+  assert scheduler.phase == pytest.approx(1)
+
+def test_until_publication_waits_for_the_margin_after_the_phase():
+  scheduler = PublishScheduler(phase=30, margin=10, boundary=0)
+  assert scheduler.until_publication(3600 + 100) == pytest.approx(240)
+  assert scheduler.until_publication(3600 + 39) == pytest.approx(1)
@@ -0,0 +1,29 @@
+import io
+import sqlite3
+
+import pytest
+
+from migrations import migrate
+from subscribers import import_subscribers, parse_record, read_records
+
+def test_parse_record_uses_defaults_for_missing_settings():
+  assert parse_record(('7', '', None, None)) == (7, None, 0.0, 0)
+  assert parse_record(('7', '4.5', '0.5', '600')) == (7, 4.5, 0.5, 600)
+
+@pytest.mark.parametrize('threshold', ['nan', 'inf', '-inf', '1e9', '-150'])
+def test_parse_record_rejects_thresholds_out_of_range(threshold):
+  with pytest.raises(ValueError):
+    parse_record(('7', threshold, None, None))
+
+@pytest.mark.parametrize('values', [('0', '', '', ''), ('7', '', '-1', ''), ('7', '', 'nan', ''), ('7', '', '', '99999999')])
+def test_parse_record_rejects_invalid_settings(values):
+  with pytest.raises(ValueError):
+    parse_record(values)
+
+def test_import_skips_rejected_records():
+  conn = sqlite3.connect(':memory:')
+  migrate(conn)
+  file = io.StringIO('user_id,threshold\n1,4.5\n2,nan\n3,\n4,inf\n')
+  assert import_subscribers(conn, read_records(file, 'csv')) == (2, 2)
+  assert conn.execute('SELECT user_id, threshold FROM subscribed_users ORDER BY user_id').fetchall() == [
+    (1, 4.5), (3, None)]
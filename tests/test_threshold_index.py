@@ -0,0 +1,59 @@
+import random
+
+from threshold_index import ThresholdIndex
+
+# Quarter cents are exact in binary, so the offset searches and the direct comparisons agree at the boundaries.
+GRID = [value / 4 for value in range(0, 41)]
+
+def crossed(settings, last_price, current_price, default_threshold):
+  """
+  Apply the crossing rule to every user, as the bot did before the index existed, extended with hysteresis.
+  """
+  users = []
+  for user_id, (threshold, hysteresis) in settings.items():
+    threshold = default_threshold if threshold is None else threshold
+    if threshold is None:
+      continue
+    if last_price <= threshold + hysteresis < current_price or current_price <= threshold - hysteresis < last_price:
+      users.append((user_id, threshold))
+  return sorted(users)
+
+def test_crossed_matches_the_crossing_rule_under_adds_and_removes():
+  rng = random.Random(0)
+  for _ in range(300):
+    index = ThresholdIndex()
+    rows = [(user_id, rng.choice([None] + GRID), rng.choice((0.0, 0.25, 0.5, 1.0)), 0) for user_id in range(1, 41)]
+    index.load(rows)
+    settings = {user_id: (threshold, hysteresis) for user_id, threshold, hysteresis, _ in rows}
+    for _ in range(30):
+      user_id = rng.randint(1, 60)
+      if rng.random() < 0.3:
+        index.remove(user_id)
+        settings.pop(user_id, None)
+      else:
+        threshold, hysteresis = rng.choice([None] + GRID), rng.choice((0.0, 0.25, 0.5, 1.0))
+        index.add(user_id, threshold, hysteresis)
+        settings[user_id] = (threshold, hysteresis)
+      last_price, current_price = rng.choice(GRID), rng.choice(GRID)
+      default_threshold = rng.choice([None] + GRID)
+      assert len(index) == len(settings)
+      assert sorted(index.crossed(last_price, current_price, default_threshold)) == crossed(
+        settings, last_price, current_price, default_threshold)
+
+def test_remove_only_removes_the_given_user():
+  index = ThresholdIndex()
+  index.load([(1, 5.0, 0.0, 0), (2, 5.0, 0.0, 0), (3, None, 0.0, 600), (4, None, 0.0, 0)])
+  index.remove(1)
+  index.remove(3)
+  index.remove(99)
+  assert index.crossed(4.0, 6.0, 5.5) == [(2, 5.0), (4, 5.5)]
+  assert index.min_interval(3) == 0
+  assert 1 not in index and 2 in index
+
+def test_hysteresis_ignores_prices_inside_the_dead_band():
+  index = ThresholdIndex()
+  index.add(1, 5.0, 0.5)
+  index.add(2, None, 0.5)
+  assert index.crossed(4.75, 5.25, 5.0) == []
+  assert index.crossed(5.25, 5.75, 5.0) == [(1, 5.0), (2, 5.0)]
+  assert index.crossed(4.75, 4.25, 5.0) == [(1, 5.0), (2, 5.0)]
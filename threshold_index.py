@@ -0,0 +1,155 @@
+from bisect import bisect_left, insort
+
+class ThresholdIndex:
+  """
+  An in-memory index of subscriber thresholds used to find crossed alerts quickly.
+
+  Each user alerts when a rising price crosses threshold + hysteresis and when a falling
+  price crosses threshold - hysteresis, so prices chopping inside the dead band stay quiet.
+  Users with an explicit threshold are kept in two lists sorted by (trigger, user_id), one
+  per direction. Users on the default price to compare have triggers that move with it,
+  so they are kept in a single list sorted by (hysteresis, user_id) and searched by offset.
+  """
+
+  def __init__(self):
+    """
+    Initialize an empty ThresholdIndex.
+    """
+    self._rising = []
+    self._falling = []
+    self._defaults = []
+    self._settings = {}
+    self._min_intervals = {}
+
+  def __len__(self):
+    return len(self._settings)
+
+  def __contains__(self, user_id):
+    return user_id in self._settings
+
+  def load(self, rows):
+    """
+    Replace the index contents with the given rows.
+
+    Args:
+      rows (iterable): Tuples of (user_id, threshold, hysteresis, min_interval) where threshold may be None.
+    """
+    self._rising = []
+    self._falling = []
+    self._defaults = []
+    self._settings = {}
+    self._min_intervals = {}
+    for user_id, threshold, hysteresis, min_interval in rows:
+      hysteresis = hysteresis or 0.0
+      self._settings[user_id] = (threshold, hysteresis)
+      if min_interval:
+        self._min_intervals[user_id] = min_interval
+      if threshold is None:
+        self._defaults.append((hysteresis, user_id))
+      else:
+        self._rising.append((threshold + hysteresis, user_id))
+        self._falling.append((threshold - hysteresis, user_id))
+    self._rising.sort()
+    self._falling.sort()
+    self._defaults.sort()
+
+  def add(self, user_id, threshold=None, hysteresis=0.0, min_interval=0):
+    """
+    Add a user to the index, replacing any previous entry.
+
+    Args:
+      user_id (int): The ID of the user.
+      threshold (float, optional): The price threshold for alerts. Defaults to None.
+      hysteresis (float, optional): The dead band around the threshold. Defaults to 0.0.
+      min_interval (int, optional): The minimum seconds between alerts. Defaults to 0.
+    """
+    self.remove(user_id)
+    hysteresis = hysteresis or 0.0
+    self._settings[user_id] = (threshold, hysteresis)
+    if min_interval:
+      self._min_intervals[user_id] = min_interval
+    if threshold is None:
+      insort(self._defaults, (hysteresis, user_id))
+    else:
+      insort(self._rising, (threshold + hysteresis, user_id))
+      insort(self._falling, (threshold - hysteresis, user_id))
+
+  def remove(self, user_id):
+    """
+    Remove a user from the index if present.
+
+    Args:
+      user_id (int): The ID of the user.
+    """
+    self._min_intervals.pop(user_id, None)
+    settings = self._settings.pop(user_id, None)
+    if settings is None:
+      return
+    threshold, hysteresis = settings
+    if threshold is None:
+      del self._defaults[bisect_left(self._defaults, (hysteresis, user_id))]
+    else:
+      del self._rising[bisect_left(self._rising, (threshold + hysteresis, user_id))]
+      del self._falling[bisect_left(self._falling, (threshold - hysteresis, user_id))]
+
+  def min_interval(self, user_id):
+    """
+    Get the minimum number of seconds between alerts for a user.
+
+    Args:
+      user_id (int): The ID of the user.
+
+    Returns:
+      int: The minimum interval, or 0 if the user has none.
+    """
+    return self._min_intervals.get(user_id, 0)
+
+  def all(self, default_threshold):
+    """
+    Get every indexed user with their effective threshold.
+
+    Args:
+      default_threshold (float): The threshold used for users without one.
+
+    Returns:
+      list: A list of tuples (user_id, threshold).
+    """
+    return [(user_id, default_threshold if threshold is None else threshold)
+            for user_id, (threshold, _) in self._settings.items()
+            if threshold is not None or default_threshold is not None]
+
+  def crossed(self, last_price, current_price, default_threshold):
+    """
+    Find the users whose trigger lies between the last and current price.
+
+    A rising price alerts triggers where last_price <= threshold + hysteresis < current_price
+    and a falling price alerts triggers where current_price <= threshold - hysteresis < last_price.
+    With no hysteresis this is the plain half-open crossing test on the threshold.
+
+    Args:
+      last_price (float): The previously observed price.
+      current_price (float): The newly observed price.
+      default_threshold (float): The threshold used for users without one.
+
+    Returns:
+      list: A list of tuples (user_id, threshold) for users whose trigger was crossed.
+    """
+    rising = current_price > last_price
+    low, high = min(last_price, current_price), max(last_price, current_price)
+    entries = self._rising if rising else self._falling
+    start = bisect_left(entries, (low,))
+    end = bisect_left(entries, (high,), start)
+    users = [(user_id, self._settings[user_id][0]) for _, user_id in entries[start:end]]
+    if default_threshold is None:
+      return users
+
+    if rising:
+      # default + hysteresis in [last, current) <=> hysteresis in [last - default, current - default)
+      start = bisect_left(self._defaults, (last_price - default_threshold,))
+      end = bisect_left(self._defaults, (current_price - default_threshold,), start)
+    else:
+      # default - hysteresis in [current, last) <=> hysteresis in (default - last, default - current]
+      start = bisect_left(self._defaults, (default_threshold - last_price, float('inf')))
+      end = bisect_left(self._defaults, (default_threshold - current_price, float('inf')), start)
+    users.extend((user_id, default_threshold) for _, user_id in self._defaults[start:end])
+    return users
@@ -1,9 +1,6 @@
 import discord
-import aiohttp
-from bs4 import BeautifulSoup
 
 from msg import Msg
-from logger import logger
 
 def get_color(price):
   """
@@ -50,53 +47,38 @@ def create_price_embed(price, price_to_compare):
   Returns:
     discord.Embed: An embed containing formatted price information.
   """
-  price_status, price_detail = get_price_info(price)
-  price_difference = price - price_to_compare
-  direction = "higher" if price_difference > 0 else "lower"
-
-  embed = discord.Embed(
-    title=Msg.PRICE_TITLE.format(price=price, cent=Msg.CENT_SYMBOL),
-    description=Msg.PRICE_DESCRIPTION.format(status=price_status, detail=price_detail),
-    color=get_color(price)
-  )
-  embed.set_footer(text=Msg.PRICE_FOOTER.format(
-    difference=abs(price_difference),
-    cent=Msg.CENT_SYMBOL,
-    direction=direction,
-    threshold=price_to_compare
-  ))
-  return embed
-
-async def fetch_comed_price_to_compare(url):
+  return create_price_embeds(price, [price_to_compare])[price_to_compare]
+
+def create_price_embeds(price, thresholds):
   """
-  Fetch the ComEd basic electric service price from the provided URL.
+  Create one Discord embed per distinct threshold for a single price.
+
+  The title, description and color depend only on the price, so they are
+  computed once and shared by every embed.
 
   Args:
-    url (str): The URL to fetch the price from.
+    price (float): The current electricity price.
+    thresholds (iterable): The thresholds to render an embed for.
 
   Returns:
-    float or None: The fetched price, or None if unsuccessful.
+    dict: A mapping of threshold to its discord.Embed.
   """
-  async with aiohttp.ClientSession() as session:
-    try:
-      async with session.get(url) as response:
-        if response.status == 200:
-          html = await response.text()
-          soup = BeautifulSoup(html, 'html.parser')
-          
-          # Find the first table in the document
-          table = soup.find('table')
-          if table:
-            # Find the cell with the price (should be the second cell in the second row)
-            rows = table.find_all('tr')
-            if len(rows) >= 2:
-              price_cell = rows[1].find_all('td')
-              if len(price_cell) >= 1:
-                # Extract the price value
-                price_text = price_cell[0].text.strip()
-                # Remove 'cents per kWh' and convert to float
-                price_value = float(price_text.split()[0])
-                return price_value
-    except Exception as e:
-      logger.error("Error fetching ComEd price to compare: %s" % str(e))
-  return None
+  price_status, price_detail = get_price_info(price)
+  title = Msg.PRICE_TITLE.format(price=price, cent=Msg.CENT_SYMBOL)
+  description = Msg.PRICE_DESCRIPTION.format(status=price_status, detail=price_detail)
+  color = get_color(price)
+
+  embeds = {}
+  for threshold in set(thresholds):
+    price_difference = price - threshold
+    direction = "higher" if price_difference > 0 else "lower"
+
+    embed = discord.Embed(title=title, description=description, color=color)
+    embed.set_footer(text=Msg.PRICE_FOOTER.format(
+      difference=abs(price_difference),
+      cent=Msg.CENT_SYMBOL,
+      direction=direction,
+      threshold=threshold
+    ))
+    embeds[threshold] = embed
+  return embeds